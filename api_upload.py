@@ -2,18 +2,16 @@ from fastapi import FastAPI, Request, File, UploadFile, Form
 import pandas as pd
 from typing import List, Optional
 from fastapi import FastAPI, Query
-from dotenv import load_dotenv
 from datetime import date, time,datetime
 from fastapi.middleware.cors import CORSMiddleware
 from io import BytesIO
 from difflib import SequenceMatcher
 import traceback
-import os
-import pyodbc
 import re
-
-# Cargar variables de entorno
-load_dotenv()
+from db import get_db_connection, pool_stats
+from bitacora import obtener_logger, Muestreo, CorrelacionMiddleware
+from cache import invalidar_lecturas
+from versiones import incrementar_version
 
 # Configurar FastAPI
 app = FastAPI()
@@ -24,24 +22,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CorrelacionMiddleware)
+log = obtener_logger(__name__)
 
-def get_db_connection():
-    DB_HOST = os.getenv("DB_HOST")
-    DB_USER = os.getenv("DB_USERNAME")
-    DB_PASSWORD = os.getenv("DB_PASSWORD")
-    DB_DATABASE = os.getenv("DB_DATABASE")
-    DB_PORT_STR = os.getenv("DB_PORT")
-    DB_PORT = int(DB_PORT_STR)
-
-    connection_string = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={DB_HOST};DATABASE={DB_DATABASE};UID={DB_USER};PWD={DB_PASSWORD}'
-    try:
-        conn = pyodbc.connect(connection_string)
-        cursor = conn.cursor()
-        print("Conexión exitosa a SQL Server")
-        return conn
-    except Exception as e:
-        print("Error de conexión:", e)
-        return None
+@app.get("/diagnostico/pool")
+def estado_pool():
+    return {"status": 1, "pool": pool_stats()}
 
 @app.get('/')
 def prueba():
@@ -73,6 +59,7 @@ async def personal_excel(
         }
     session = get_db_connection()
     errores = []
+    muestreo = Muestreo(log)
     try:
         cursor = session.cursor()
         # Eliminar anterior de flujo
@@ -80,7 +67,7 @@ async def personal_excel(
         # Insertar cada fila del DataFrame
         for index, row in df.iterrows():
             try:
-                print("Ingreso aqui")
+                muestreo.debug("fila", "Insertando fila %d de Personal", index + 2)
                 valores = (
                     row['PICKUP'], row['TIPO'], row['PLACA'], row['NOMBRES'], row['DOCUMENTO'],row['CARGO'],
                     row['EMPRESA'], row['RUC'],fecha_carga, hora_carga, flujo
@@ -100,18 +87,19 @@ async def personal_excel(
                     "columna_problematica": columna_error,
                     "valor_problematico": valor_error
                 })
-                print("❌ Error en fila", index + 2, ":", mensaje_error)
+                log.warning("Error en fila %d: %s", index + 2, mensaje_error)
                 raise
         session.commit()
+        # La API principal lee con cachés, ETags e instantánea: sin esto seguiría sirviendo lo anterior
+        invalidar_lecturas("apl_imperio.APP_SALESFORCE_Personal")
+        incrementar_version("apl_imperio.APP_SALESFORCE_Personal")
         return {
             "status": 1,
             "message": "Todos los registros fueron insertados correctamente."
         }
     except Exception as e:
         session.rollback()
-        print("❌ Error general:", str(e))
-        print("📛 Traceback:")
-        print(traceback.format_exc())
+        log.exception("Error general en la carga")
         return {
             "status": 0,
             "message": "❌ Ocurrió un error y no se insertó nada.",
@@ -136,11 +124,11 @@ async def upload_excel(
     # Limpieza de columna Cita
     col_cita = encontrar_columna_similar(df, "Cita", 0.75)
     if col_cita:
-        print(f"Columna detectada similar a 'Cita': '{col_cita}'")
+        log.info("Columna detectada similar a 'Cita': '%s'", col_cita)
         # Renombrar la columna a "Cita" para trabajar con ella más fácil
         df.rename(columns={col_cita: "Cita"}, inplace=True)
     else:
-        print("No se encontró una columna similar a 'Cita'")
+        log.info("No se encontró una columna similar a 'Cita'")
     
     
     if 'Cita' in df.columns:
@@ -220,7 +208,7 @@ async def upload_excel(
                     "columna_problematica": columna_error,
                     "valor_problematico": valor_error
                 })
-                print("❌ Error en fila", index + 2, ":", mensaje_error)
+                log.warning("Error en fila %d: %s", index + 2, mensaje_error)
                 raise
 
         # Insertar en historial
@@ -235,6 +223,8 @@ async def upload_excel(
         """)
 
         session.commit()
+        invalidar_lecturas("apl_imperio.APP_SALESFORCE_Dataframe")
+        incrementar_version("apl_imperio.APP_SALESFORCE_Dataframe")
 
         return {
             "status": 1,
@@ -243,9 +233,7 @@ async def upload_excel(
 
     except Exception as e:
         session.rollback()
-        print("❌ Error general:", str(e))
-        print("📛 Traceback:")
-        print(traceback.format_exc())
+        log.exception("Error general en la carga")
         return {
             "status": 0,
             "message": "❌ Ocurrió un error y no se insertó nada.",
@@ -332,7 +320,7 @@ async def actualizarDatos(
                 return {"status": 0, "message": "No hay datos disponibles"}
 
             fecha_consulta = row[0]
-            print("Usando fecha:", fecha_consulta)
+            log.debug("Usando fecha: %s", fecha_consulta)
 
             # Query para contar el total de registros
             cursor.execute("""
@@ -394,7 +382,7 @@ async def actualizarDatos(
         
 @app.get("/datos")
 async def datos(flujos: Optional[List[str]] = Query(None)):
-    print("flujos recibidos:", flujos)
+    log.debug("Flujos recibidos: %s", flujos)
     placeholders = ','.join(['?'] * len(flujos))
     fecha_hoy = datetime.today().strftime('%Y-%m-%d') if flujos else ''
     session = get_db_connection()
@@ -404,7 +392,6 @@ async def datos(flujos: Optional[List[str]] = Query(None)):
                 query = f"""SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe where fecha_carga = ? AND Flujo IN ({placeholders})"""
                 fecha_hoy = date.today().isoformat()
                 params = [fecha_hoy] + flujos
-                print("params is: ", params)
             else:
                 query = f"""SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe where fecha_carga = ? """
                 params = [fecha_hoy]
@@ -454,7 +441,7 @@ async def actualizarDatos(id_carga:int):
             else:
                 return{"status":0,"message":"No hay datos"}
     except Exception as e:
-        print("Entro aqui")
+        log.warning("Error al consultar id_carga %s", id_carga, exc_info=True)
         return{"status":0,"error":str(e)}
     finally:
         session.close()
@@ -475,7 +462,7 @@ async def actualizarDatos(id_carga:int,RUC:str):
             else:
                 return{"status":0,"message":"No hay datos"}
     except Exception as e:
-        print("Entro aqui")
+        log.warning("Error al consultar id_carga %s", id_carga, exc_info=True)
         return{"status":0,"error":str(e)}
     finally:
         session.close()
@@ -493,7 +480,7 @@ async def actualizarDatos(
             fecha_hoy = datetime.today().strftime('%Y-%m-%d')
             
             # Query para contar el total de registros
-            print("El ruc es",RUC)
+            log.debug("Consultando personal del RUC %s", RUC)
             cursor.execute("""
                 SELECT COUNT(*) as total FROM apl_imperio.APP_SALESFORCE_Personal 
                 WHERE fecha_carga = ? and RUC = ?
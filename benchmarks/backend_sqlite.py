@@ -0,0 +1,197 @@
+"""
+Reemplazo local de SQL Server sobre SQLite para los benchmarks.
+
+Las tablas de apl_imperio se emulan en un archivo SQLite adjuntado con ese
+nombre de esquema, y las construcciones de T-SQL que usa la API se traducen
+al vuelo (TOP, DELETE TOP, OFFSET/FETCH, TRUNCATE, SWITCH, SAVE TRANSACTION,
+CONVERT).
+
+Los números sirven para comparar versiones de la API entre sí, no para
+estimar tiempos de SQL Server: por ejemplo ALTER TABLE ... SWITCH aquí copia
+las filas en lugar de cambiar metadatos.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import db
+
+ESQUEMA = "apl_imperio"
+
+_COLUMNAS_DATAFRAME = """
+    id_carga INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha DATE, Seller_ID TEXT, Seller TEXT, Placa TEXT, Flujo TEXT, Cita INTEGER,
+    nombre_flujo TEXT, fecha_carga DATE, hora_carga TEXT
+"""
+DDL = f"""
+CREATE TABLE IF NOT EXISTS {ESQUEMA}.APP_SALESFORCE_Dataframe ({_COLUMNAS_DATAFRAME});
+CREATE TABLE IF NOT EXISTS {ESQUEMA}.APP_SALESFORCE_Dataframe_Staging ({_COLUMNAS_DATAFRAME});
+CREATE TABLE IF NOT EXISTS {ESQUEMA}.APP_SALESFORCE_Dataframe_Anterior ({_COLUMNAS_DATAFRAME});
+CREATE INDEX IF NOT EXISTS {ESQUEMA}.ix_dataframe_fecha_flujo ON APP_SALESFORCE_Dataframe (fecha_carga, Flujo);
+CREATE TABLE IF NOT EXISTS {ESQUEMA}.APP_SALESFORCE_HISTORIAL (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha DATE, Seller_ID TEXT, Seller TEXT, Placa TEXT, Flujo TEXT, Cita INTEGER,
+    nombre_flujo TEXT, fecha_carga DATE, hora_carga TEXT, id_carga INTEGER,
+    fecha_backup DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS {ESQUEMA}.ix_historial_fecha_backup ON APP_SALESFORCE_HISTORIAL (fecha_backup);
+CREATE TABLE IF NOT EXISTS {ESQUEMA}.APP_SALESFORCE_Personal (
+    id_carga INTEGER PRIMARY KEY AUTOINCREMENT,
+    PICKUP TEXT, TIPO TEXT, placa TEXT, nombre TEXT, documento TEXT, cargo TEXT, empresa TEXT,
+    RUC TEXT, fecha_carga DATE, hora_carga TEXT, flujo TEXT
+);
+CREATE INDEX IF NOT EXISTS {ESQUEMA}.ix_personal_ruc_fecha ON APP_SALESFORCE_Personal (RUC, fecha_carga);
+"""
+
+sqlite3.register_adapter(datetime.date, lambda valor: valor.isoformat())
+# Con milisegundos, igual que GETDATE(): las fechas se comparan como texto
+sqlite3.register_adapter(datetime.datetime, lambda valor: valor.isoformat(" ", timespec="milliseconds"))
+sqlite3.register_adapter(datetime.time, lambda valor: valor.isoformat())
+# SELECT GETDATE() devuelve datetime, como el driver de SQL Server
+sqlite3.register_converter("fecha_hora", lambda valor: datetime.datetime.fromisoformat(valor.decode()))
+
+_CREAR_SI_NO_EXISTE = re.compile(r"^IF OBJECT_ID\(.*?\) IS NULL\s+SELECT TOP \(0\) \* INTO", re.S)
+_SWITCH = re.compile(r"^ALTER TABLE ([\w.]+) SWITCH TO ([\w.]+)$")
+_TOP = re.compile(r"\bSELECT TOP \(?(\d+|\?)\)?")
+_OFFSET = re.compile(r"OFFSET \? ROWS FETCH NEXT \? ROWS ONLY")
+_CONVERT_DATE = re.compile(r"CONVERT\(DATE,\s*(\w+)\)")
+_DELETE_TOP = re.compile(r"^DELETE TOP \(\?\) FROM ([\w.]+) WHERE (.*)$", re.S)
+# Con milisegundos, como datetime de SQL Server
+_AHORA = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+
+def traducir(sql, parametros):
+    """
+    Traduce una sentencia de T-SQL a una o más sentencias de SQLite.
+
+    Returns:
+        list: Pares (sql, parámetros)
+    """
+    sql = sql.strip()
+    parametros = list(parametros)
+    if _CREAR_SI_NO_EXISTE.match(sql):
+        # Las tablas de staging ya están en el DDL
+        return []
+    switch = _SWITCH.match(sql)
+    if switch:
+        origen, destino = switch.groups()
+        return [(f"INSERT INTO {destino} SELECT * FROM {origen}", []), (f"DELETE FROM {origen}", [])]
+    if sql.startswith("SAVE TRANSACTION"):
+        return [("SAVEPOINT " + sql.split()[-1], [])]
+    if sql.startswith("ROLLBACK TRANSACTION"):
+        return [("ROLLBACK TO " + sql.split()[-1], [])]
+
+    sql = sql.replace("TRUNCATE TABLE", "DELETE FROM")
+    delete_top = _DELETE_TOP.match(sql)
+    if delete_top:
+        tabla, condicion = delete_top.groups()
+        limite = parametros.pop(0)
+        return [(f"DELETE FROM {tabla} WHERE rowid IN (SELECT rowid FROM {tabla} WHERE {condicion} LIMIT ?)",
+                 parametros + [limite])]
+    if sql == "SELECT GETDATE()":
+        return [(f'SELECT {_AHORA} AS "ahora [fecha_hora]"', [])]
+    sql = sql.replace("GETDATE()", _AHORA)
+    sql = sql.replace("SYSDATETIME()", _AHORA)
+    sql = _CONVERT_DATE.sub(r"date(\1)", sql)
+    if _OFFSET.search(sql):
+        sql = _OFFSET.sub("LIMIT ? OFFSET ?", sql)
+        parametros[-2], parametros[-1] = parametros[-1], parametros[-2]
+    top = _TOP.search(sql)
+    if top:
+        sql = sql[:top.start()] + "SELECT" + sql[top.end():]
+        limite = parametros.pop(0) if top.group(1) == "?" else top.group(1)
+        sql = f"{sql} LIMIT {int(limite)}"
+    return [(sql, parametros)]
+
+
+class Cursor:
+    """Cursor con la interfaz de pyodbc que usa la API."""
+
+    def __init__(self, conexion):
+        self._cursor = conexion.cursor()
+        self.fast_executemany = False
+        self.rowcount = -1
+
+    def execute(self, sql, *parametros):
+        if len(parametros) == 1 and isinstance(parametros[0], (list, tuple)):
+            parametros = parametros[0]
+        for sentencia, valores in traducir(sql, parametros):
+            self._cursor.execute(sentencia, valores)
+        self.rowcount = self._cursor.rowcount
+        return self
+
+    def executemany(self, sql, filas):
+        (sentencia, _), = traducir(sql, [])
+        self._cursor.executemany(sentencia, filas)
+        self.rowcount = self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, cantidad=1):
+        return self._cursor.fetchmany(cantidad)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchval(self):
+        fila = self._cursor.fetchone()
+        return fila[0] if fila else None
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class Conexion:
+    def __init__(self, ruta):
+        self._conexion = sqlite3.connect(
+            ":memory:", check_same_thread=False, timeout=60, detect_types=sqlite3.PARSE_COLNAMES
+        )
+        self._conexion.execute(f"ATTACH DATABASE ? AS {ESQUEMA}", (ruta,))
+        self._conexion.execute(f"PRAGMA {ESQUEMA}.journal_mode=WAL")
+        self._conexion.execute(f"PRAGMA {ESQUEMA}.synchronous=NORMAL")
+
+    def cursor(self):
+        return Cursor(self._conexion)
+
+    def commit(self):
+        self._conexion.commit()
+
+    def rollback(self):
+        self._conexion.rollback()
+
+    def close(self):
+        self._conexion.close()
+
+
+def instalar(ruta):
+    """
+    Crea las tablas en el archivo SQLite y hace que get_db_connection() use
+    este backend en lugar de SQL Server.
+
+    Returns:
+        db.ConnectionPool: El pool instalado
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conexion = sqlite3.connect(":memory:")
+    conexion.execute(f"ATTACH DATABASE ? AS {ESQUEMA}", (ruta,))
+    conexion.executescript(DDL)
+    conexion.close()
+
+    if db._pool is not None:
+        db._pool.close()
+    db._pool = db.ConnectionPool(creador=lambda: Conexion(ruta))
+    return db._pool
@@ -0,0 +1,223 @@
+"""
+Benchmarks de carga y lectura contra el backend SQLite local.
+
+Genera planillas sintéticas, las sube con upload_excel y personal_excel y
+después mide los endpoints de lectura. El resultado es un JSON con filas
+por segundo, latencias p50/p99 y el pico de memoria (RSS) del proceso, para
+comparar entre versiones.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.correr --filas 1000,10000,100000 --salida resultados.json
+
+Requiere las dependencias de requirements.txt y las de benchmarks/requirements.txt.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RUC = "20100000001"
+FLUJO_PERSONAL = "PICKUP"
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    posicion = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[posicion]
+
+
+def rss_pico_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS; es el máximo del proceso hasta ahora
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _resumen(nombre, duraciones, filas=None, **extra):
+    resultado = {
+        "escenario": nombre,
+        "repeticiones": len(duraciones),
+        "p50_ms": round(percentil(duraciones, 50) * 1000, 3),
+        "p99_ms": round(percentil(duraciones, 99) * 1000, 3),
+        "media_ms": round(sum(duraciones) / len(duraciones) * 1000, 3),
+    }
+    if filas:
+        resultado["filas"] = filas
+        resultado["filas_por_segundo"] = round(filas / percentil(duraciones, 50), 1)
+    resultado.update(extra)
+    resultado["rss_pico_mb"] = rss_pico_mb()
+    return resultado
+
+
+def _medir(cliente, metodo, url, **kwargs):
+    inicio = time.perf_counter()
+    respuesta = cliente.request(metodo, url, **kwargs)
+    duracion = time.perf_counter() - inicio
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"{metodo} {url} respondió {respuesta.status_code}: {respuesta.text[:500]}")
+    return duracion, respuesta
+
+
+def _subir(cliente, url, ruta, formulario):
+    with open(ruta, "rb") as archivo:
+        duracion, respuesta = _medir(
+            cliente, "POST", url, files={"file": (os.path.basename(ruta), archivo)}, data=formulario
+        )
+    cuerpo = respuesta.json()
+    if cuerpo.get("status") != 1:
+        raise RuntimeError(f"La carga en {url} falló: {json.dumps(cuerpo, default=str)[:1000]}")
+    return duracion
+
+
+def benchmark_cargas(cliente, generar, directorio, tamanos, formato, repeticiones):
+    resultados = []
+    hoy = datetime.date.today().isoformat()
+    for filas in tamanos:
+        ruta = generar.escribir(generar.generar_dataframe(filas), os.path.join(directorio, f"dataframe_{filas}.{formato}"))
+        formulario = {"fecha_carga": hoy, "hora_carga": "08:00:00", "nombre_flujo": "benchmark"}
+        duraciones = [_subir(cliente, "/planificacion/upload_excel", ruta, formulario) for _ in range(repeticiones)]
+        resultados.append(_resumen(
+            "upload_excel", duraciones, filas, formato=formato, bytes_archivo=os.path.getsize(ruta)
+        ))
+
+        filas_personal = max(100, filas // 10)
+        ruta = generar.escribir(
+            generar.generar_personal(filas_personal, RUC), os.path.join(directorio, f"personal_{filas_personal}.{formato}")
+        )
+        formulario = {"fecha_carga": hoy, "hora_carga": "08:00:00", "flujo": FLUJO_PERSONAL, "ruc": RUC}
+        duraciones = [_subir(cliente, "/recoleccion/personal_excel", ruta, formulario) for _ in range(repeticiones)]
+        resultados.append(_resumen(
+            "personal_excel", duraciones, filas_personal, formato=formato, bytes_archivo=os.path.getsize(ruta)
+        ))
+    return resultados
+
+
+def _ids_cargados(tabla):
+    from db import get_db_connection
+    session = get_db_connection()
+    try:
+        cursor = session.cursor()
+        cursor.execute(f"SELECT id_carga FROM {tabla}")
+        return [fila[0] for fila in cursor.fetchall()]
+    finally:
+        session.close()
+
+
+def benchmark_lecturas(cliente, generar, lecturas, tamano_pagina, semilla=0):
+    """Mide las lecturas sobre lo que dejó la última carga de cada tabla."""
+    azar = random.Random(semilla)
+    ids_dataframe = _ids_cargados("apl_imperio.APP_SALESFORCE_Dataframe")
+    ids_personal = _ids_cargados("apl_imperio.APP_SALESFORCE_Personal")
+    paginas_dataframe = max(1, len(ids_dataframe) // tamano_pagina)
+    paginas_personal = max(1, len(ids_personal) // tamano_pagina)
+
+    escenarios = {
+        "GET /planificacion/datos": lambda: "/planificacion/datos?" + "&".join(
+            f"flujos={flujo}" for flujo in azar.sample(generar.FLUJOS, 2)
+        ),
+        "GET /planificacion/datos?format=ndjson": lambda: "/planificacion/datos?format=ndjson&" + "&".join(
+            f"flujos={flujo}" for flujo in azar.sample(generar.FLUJOS, 2)
+        ),
+        "GET /planificacion/datos_actualizados/{id_carga}": lambda: (
+            f"/planificacion/datos_actualizados/{azar.choice(ids_dataframe)}"
+        ),
+        "GET /planificacion/datos-actualizados (offset)": lambda: (
+            f"/planificacion/datos-actualizados?page={azar.randint(1, paginas_dataframe)}&size={tamano_pagina}"
+        ),
+        "GET /recoleccion/datosPersonal/{flujo}": lambda: f"/recoleccion/datosPersonal/{FLUJO_PERSONAL}",
+        "GET /recoleccion/datos-actualizados-personal/{RUC}": lambda: (
+            f"/recoleccion/datos-actualizados-personal/{RUC}?page={azar.randint(1, paginas_personal)}&size={tamano_pagina}"
+        ),
+    }
+    resultados = []
+    for nombre, url in escenarios.items():
+        duraciones = [_medir(cliente, "GET", url())[0] for _ in range(lecturas)]
+        resultados.append(_resumen(nombre, duraciones))
+
+    # Recorrido completo con cursor: cada página pide la siguiente con next_cursor
+    duraciones = []
+    url = f"/planificacion/datos-actualizados?size={tamano_pagina}&contar=false"
+    while url and len(duraciones) < lecturas:
+        duracion, respuesta = _medir(cliente, "GET", url)
+        duraciones.append(duracion)
+        siguiente = respuesta.json()["datos"]["next_cursor"]
+        url = f"/planificacion/datos-actualizados?size={tamano_pagina}&contar=false&cursor={siguiente}" if siguiente else None
+    resultados.append(_resumen("GET /planificacion/datos-actualizados (cursor)", duraciones))
+    return resultados
+
+
+def _entorno():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de carga y lectura con backend SQLite")
+    parser.add_argument("--filas", default="1000,10000,100000", help="Tamaños de la planilla, separados por coma")
+    parser.add_argument("--formato", default="xlsx", choices=["xlsx", "csv", "parquet"])
+    parser.add_argument("--repeticiones", type=int, default=3, help="Cargas por tamaño")
+    parser.add_argument("--lecturas", type=int, default=200, help="Requests por endpoint de lectura")
+    parser.add_argument("--tamano-pagina", type=int, default=50)
+    parser.add_argument("--sin-cache", action="store_true", help="Deshabilita el cache de lecturas")
+    parser.add_argument("--directorio", help="Carpeta de trabajo (por defecto una temporal)")
+    parser.add_argument("--salida", help="Archivo donde guardar el JSON (además de imprimirlo)")
+    args = parser.parse_args()
+
+    directorio = args.directorio or tempfile.mkdtemp(prefix="benchmark_apl_")
+    os.makedirs(directorio, exist_ok=True)
+    # La configuración se lee al importar los módulos, así que va antes de importarlos
+    os.environ["ESTADO_LOCAL_DB"] = os.path.join(directorio, "estado_local.db")
+    os.environ["ARCHIVO_HISTORIAL_DIR"] = ""
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+    # Las cargas se repiten con el mismo archivo: sin esto la deduplicación devolvería
+    # el resultado guardado y se mediría la búsqueda por huella, no la carga
+    os.environ["CARGA_DEDUP_HABILITADA"] = "0"
+    if args.sin_cache:
+        os.environ["CACHE_LECTURAS_MAX"] = "0"
+
+    from fastapi.testclient import TestClient
+    from benchmarks import backend_sqlite, generar
+    backend_sqlite.instalar(os.path.join(directorio, "apl_imperio.db"))
+    from main import app
+
+    tamanos = [int(valor) for valor in args.filas.split(",") if valor.strip()]
+    with TestClient(app) as cliente:
+        escenarios = benchmark_cargas(cliente, generar, directorio, tamanos, args.formato, args.repeticiones)
+        escenarios += benchmark_lecturas(cliente, generar, args.lecturas, args.tamano_pagina)
+
+    resultado = {
+        "entorno": _entorno(),
+        "parametros": {**vars(args), "directorio": directorio},
+        "escenarios": escenarios,
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Generador de planillas sintéticas de Dataframe y Personal.
+
+Las distribuciones imitan las de producción: pocos sellers concentran la
+mayoría de las filas, cada placa aparece en varias filas del mismo día, un
+tercio de las citas viene vacía o con "-" y las fechas caen en la semana.
+
+Uso:
+    python -m benchmarks.generar dataframe 100000 /tmp/dataframe.xlsx
+    python -m benchmarks.generar personal 5000 /tmp/personal.csv --ruc 20100000001
+"""
+import argparse
+import datetime
+import os
+import numpy as np
+import pandas as pd
+
+FLUJOS = ["PICKUP", "CROSSDOCK", "FULFILLMENT", "SAME_DAY", "DEVOLUCIONES"]
+PESOS_FLUJOS = [0.45, 0.25, 0.15, 0.1, 0.05]
+TIPOS_PERSONAL = ["CONDUCTOR", "AYUDANTE"]
+CARGOS = {"CONDUCTOR": "CHOFER", "AYUDANTE": "AUXILIAR DE REPARTO"}
+NOMBRES = ["JUAN", "MARIA", "CARLOS", "ROSA", "LUIS", "ANA", "JORGE", "CARMEN", "PEDRO", "LUCIA"]
+APELLIDOS = ["QUISPE", "FLORES", "SANCHEZ", "GARCIA", "ROJAS", "TORRES", "RAMOS", "CASTILLO", "MENDOZA", "VARGAS"]
+
+ENCABEZADOS_DATAFRAME = ["Fecha", "Seller_ID", "Seller", "Placa", "Flujo", "Cita"]
+ENCABEZADOS_PERSONAL = ["PICKUP", "TIPO", "PLACA", "NOMBRES", "DOCUMENTO", "CARGO", "EMPRESA", "RUC"]
+
+
+def _placas(generador, cantidad):
+    letras = generador.integers(0, 26, size=(cantidad, 3))
+    numeros = generador.integers(100, 1000, size=cantidad)
+    return np.array([
+        "".join(chr(65 + letra) for letra in fila) + f"-{numero}" for fila, numero in zip(letras, numeros)
+    ])
+
+
+def generar_dataframe(filas, semilla=0, inicio=None):
+    """
+    Planilla de planificación (columnas Fecha, Seller_ID, Seller, Placa, Flujo, Cita).
+
+    Args:
+        filas: Cantidad de filas
+        semilla: Semilla del generador, para que el archivo sea reproducible
+        inicio: Primer día de las fechas (por defecto hoy)
+    """
+    generador = np.random.default_rng(semilla)
+    inicio = inicio or datetime.date.today()
+
+    # Sellers con distribución de Zipf: unos pocos concentran la mayoría de las filas
+    cantidad_sellers = max(10, min(5000, filas // 20))
+    sellers = (generador.zipf(1.3, size=filas) - 1) % cantidad_sellers
+    seller_id = 100000 + sellers
+
+    # Cada placa hace varias paradas en el día
+    placas = _placas(generador, max(1, filas // 8))
+    placa = placas[generador.integers(0, len(placas), size=filas)]
+
+    flujo = generador.choice(FLUJOS, size=filas, p=PESOS_FLUJOS)
+    dias = generador.integers(0, 7, size=filas)
+    fecha = [(inicio + datetime.timedelta(days=int(dia))).strftime("%d/%m/%Y") for dia in dias]
+
+    # Un tercio de las citas viene vacía o con "-" como en las plantillas reales
+    cita = generador.integers(1, 500000, size=filas).astype(object)
+    sin_cita = generador.random(filas)
+    cita[sin_cita < 0.2] = "-"
+    cita[(sin_cita >= 0.2) & (sin_cita < 0.33)] = None
+
+    return pd.DataFrame({
+        "Fecha": fecha,
+        "Seller_ID": seller_id,
+        "Seller": [f"SELLER {numero:05d} SAC" for numero in sellers],
+        "Placa": placa,
+        "Flujo": flujo,
+        "Cita": cita,
+    }, columns=ENCABEZADOS_DATAFRAME)
+
+
+def generar_personal(filas, ruc="20100000001", semilla=0):
+    """Planilla de personal de un transportista (un RUC)."""
+    generador = np.random.default_rng(semilla)
+    tipo = generador.choice(TIPOS_PERSONAL, size=filas, p=[0.6, 0.4])
+    placas = _placas(generador, max(1, filas // 2))
+    nombres = [
+        f"{NOMBRES[a]} {APELLIDOS[b]} {APELLIDOS[c]}"
+        for a, b, c in generador.integers(0, len(NOMBRES), size=(filas, 3))
+    ]
+    # Documentos únicos de 8 dígitos: 7919 es coprimo con 90000000, así no se repiten
+    desplazamiento = int(generador.integers(0, 90000000))
+    documentos = 10000000 + (desplazamiento + np.arange(filas, dtype=np.int64) * 7919) % 90000000
+    return pd.DataFrame({
+        "PICKUP": [f"PK{numero:04d}" for numero in generador.integers(1, 200, size=filas)],
+        "TIPO": tipo,
+        "PLACA": placas[generador.integers(0, len(placas), size=filas)],
+        "NOMBRES": nombres,
+        "DOCUMENTO": [str(documento) for documento in documentos],
+        "CARGO": [CARGOS[valor] for valor in tipo],
+        "EMPRESA": f"TRANSPORTES {ruc[-4:]} SAC",
+        "RUC": ruc,
+    }, columns=ENCABEZADOS_PERSONAL)
+
+
+def escribir(df, ruta, formato=None):
+    """
+    Escribe la planilla en xlsx, csv o parquet según el formato o la extensión.
+
+    El xlsx se escribe con openpyxl en modo write_only, que mantiene la
+    memoria acotada aunque sea de un millón de filas.
+    """
+    formato = formato or os.path.splitext(ruta)[1].lstrip(".").lower()
+    if formato == "csv":
+        df.to_csv(ruta, index=False)
+    elif formato == "parquet":
+        # Todo como texto, igual que llega de una planilla exportada
+        df.apply(lambda columna: columna.map(lambda valor: None if pd.isna(valor) else str(valor))).to_parquet(
+            ruta, index=False
+        )
+    elif formato == "xlsx":
+        from openpyxl import Workbook
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet()
+        hoja.append(list(df.columns))
+        for fila in df.itertuples(index=False, name=None):
+            hoja.append([None if pd.isna(valor) else valor for valor in fila])
+        libro.save(ruta)
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera planillas sintéticas para los benchmarks")
+    parser.add_argument("tipo", choices=["dataframe", "personal"])
+    parser.add_argument("filas", type=int)
+    parser.add_argument("salida", help="Archivo .xlsx, .csv o .parquet")
+    parser.add_argument("--ruc", default="20100000001")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.tipo == "dataframe":
+        df = generar_dataframe(args.filas, args.semilla)
+    else:
+        df = generar_personal(args.filas, args.ruc, args.semilla)
+    escribir(df, args.salida)
+    print(f"{args.filas} filas escritas en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+# Nivel de los logs de la aplicación (DEBUG, INFO, WARNING, ERROR)
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+# "json" (una línea JSON por registro) o "texto"
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+# De los mensajes repetidos por fila se registra el primero y uno de cada N (0 = solo el primero)
+LOG_MUESTREO_FILAS = int(os.getenv("LOG_MUESTREO_FILAS", "1000"))
+
+ENCABEZADO_CORRELACION = "X-Request-ID"
+
+# Identificador del request HTTP y del trabajo de carga en curso; el executor los
+# copia a sus hilos, así los logs de una carga quedan ligados a su request
+id_correlacion = contextvars.ContextVar("id_correlacion", default=None)
+trabajo_en_curso = contextvars.ContextVar("trabajo_en_curso", default=None)
+
+# Atributos propios de LogRecord; el resto llegó por extra= y va al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "id_correlacion", "id_trabajo"
+}
+
+_configurado = False
+_lock = threading.Lock()
+
+
+class _FiltroContexto(logging.Filter):
+    # Corre en el hilo que emite el log, donde están los contextvars
+    def filter(self, record):
+        record.id_correlacion = id_correlacion.get()
+        record.id_trabajo = trabajo_en_curso.get()
+        return True
+
+
+class _ManejadorCola(logging.handlers.QueueHandler):
+    """
+    QueueHandler que deja el registro listo para otro hilo sin formatearlo.
+
+    El QueueHandler estándar arma el texto final en el hilo del request; aquí
+    solo se resuelven el mensaje y el traceback y el formato queda para el listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if getattr(record, "id_correlacion", None):
+            datos["id_correlacion"] = record.id_correlacion
+        if getattr(record, "id_trabajo", None):
+            datos["id_trabajo"] = record.id_trabajo
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_text:
+            datos["traceback"] = record.exc_text
+        return json.dumps(datos, default=str, ensure_ascii=False)
+
+
+def configurar_bitacora(nivel=LOG_NIVEL, formato=LOG_FORMATO, destino=None):
+    """
+    Configura el logger "apl": los registros pasan por una cola y un hilo aparte
+    los escribe, así el request o la carga no esperan a stdout.
+    """
+    global _configurado
+    with _lock:
+        if _configurado:
+            return
+        salida = logging.StreamHandler(destino or sys.stdout)
+        if formato == "texto":
+            salida.setFormatter(logging.Formatter(
+                "%(asctime)s %(levelname)s [%(id_correlacion)s %(id_trabajo)s] %(name)s: %(message)s"
+            ))
+        else:
+            salida.setFormatter(FormatoJSON())
+
+        cola = queue.SimpleQueue()
+        manejador = _ManejadorCola(cola)
+        manejador.addFilter(_FiltroContexto())
+        listener = logging.handlers.QueueListener(cola, salida)
+        listener.start()
+        # Al salir se vacía la cola antes de terminar el proceso
+        atexit.register(listener.stop)
+
+        raiz = logging.getLogger("apl")
+        raiz.setLevel(nivel)
+        raiz.addHandler(manejador)
+        raiz.propagate = False
+        _configurado = True
+
+
+def obtener_logger(nombre):
+    """Logger de un módulo, colgado del logger "apl"."""
+    configurar_bitacora()
+    return logging.getLogger(f"apl.{nombre}")
+
+
+class Muestreo:
+    """
+    Registra mensajes repetidos (p. ej. uno por fila) sin escribir uno por cada vez.
+
+    De cada clave se registra la primera ocurrencia y después una de cada
+    `cada`, indicando cuántas van. Se crea una instancia por carga.
+    """
+
+    def __init__(self, logger, cada=LOG_MUESTREO_FILAS):
+        self.logger = logger
+        self.cada = cada
+        self._ocurrencias = {}
+
+    def log(self, nivel, clave, mensaje, *args, **kwargs):
+        if not self.logger.isEnabledFor(nivel):
+            return
+        ocurrencias = self._ocurrencias.get(clave, 0) + 1
+        self._ocurrencias[clave] = ocurrencias
+        if ocurrencias == 1 or (self.cada > 0 and ocurrencias % self.cada == 0):
+            extra = {**kwargs.pop("extra", {}), "ocurrencias": ocurrencias}
+            self.logger.log(nivel, mensaje, *args, extra=extra, **kwargs)
+
+    def debug(self, clave, mensaje, *args, **kwargs):
+        self.log(logging.DEBUG, clave, mensaje, *args, **kwargs)
+
+    def warning(self, clave, mensaje, *args, **kwargs):
+        self.log(logging.WARNING, clave, mensaje, *args, **kwargs)
+
+    def ocurrencias(self, clave):
+        return self._ocurrencias.get(clave, 0)
+
+
+class CorrelacionMiddleware:
+    """
+    Middleware ASGI que asigna un id de correlación a cada request.
+
+    Se respeta el X-Request-ID que manda el cliente (o un proxy) y se devuelve
+    en la respuesta para poder buscar sus logs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        recibido = dict(scope.get("headers", [])).get(ENCABEZADO_CORRELACION.lower().encode())
+        valor = recibido.decode("latin-1")[:64] if recibido else uuid.uuid4().hex[:16]
+        token = id_correlacion.set(valor)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                encabezados = list(mensaje.get("headers", []))
+                encabezados.append((ENCABEZADO_CORRELACION.lower().encode(), valor.encode("latin-1")))
+                mensaje = {**mensaje, "headers": encabezados}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            id_correlacion.reset(token)
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from versiones import version_tabla
+
+# Segundos que vive una entrada; acota lo desactualizado ante escrituras que no pasan por las cargas
+CACHE_LECTURAS_TTL = float(os.getenv("CACHE_LECTURAS_TTL", "300"))
+# Entradas máximas; al llenarse se descarta la usada hace más tiempo
+CACHE_LECTURAS_MAX = int(os.getenv("CACHE_LECTURAS_MAX", "1024"))
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """
+    Cache en memoria con vencimiento por tiempo y descarte LRU.
+
+    Las claves son tuplas cuyo primer elemento es la tabla, así una carga puede
+    invalidar todo lo de su tabla con invalidar(tabla). Es seguro entre hilos.
+    Cada tabla lleva una generación que invalidar() incrementa, para no guardar
+    lo que se calculó antes de una carga.
+    """
+
+    def __init__(self, maximo=CACHE_LECTURAS_MAX, ttl=CACHE_LECTURAS_TTL):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._generaciones = {}
+        self._aciertos = 0
+        self._fallos = 0
+        self._vencidos = 0
+        self._descartados = 0
+        self._invalidados = 0
+        self._descartes_generacion = 0
+
+    def generacion(self, tabla):
+        with self._lock:
+            return self._generaciones.get(tabla, 0)
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is not _AUSENTE:
+                vence, valor = entrada
+                if vence > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self._aciertos += 1
+                    return valor
+                del self._datos[clave]
+                self._vencidos += 1
+            self._fallos += 1
+            return defecto
+
+    def guardar(self, clave, valor, generacion=None):
+        """
+        Guarda el valor; si se pasa la generación de la tabla leída antes de
+        calcularlo y una carga la cambió en el medio, no lo guarda.
+        """
+        with self._lock:
+            if generacion is not None and self._generaciones.get(clave[0], 0) != generacion:
+                self._descartes_generacion += 1
+                return False
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+                self._descartados += 1
+            return True
+
+    def obtener_o_calcular(self, clave, calcular):
+        """
+        Devuelve el valor guardado o lo calcula con calcular() y lo guarda.
+
+        calcular se ejecuta fuera del lock, así una consulta lenta no frena al resto.
+        Si mientras tanto se invalidó la tabla, el valor se devuelve pero no se guarda.
+        """
+        valor = self.obtener(clave, _AUSENTE)
+        if valor is _AUSENTE:
+            generacion = self.generacion(clave[0])
+            valor = calcular()
+            self.guardar(clave, valor, generacion)
+        return valor
+
+    def invalidar(self, tabla):
+        with self._lock:
+            self._generaciones[tabla] = self._generaciones.get(tabla, 0) + 1
+            claves = [clave for clave in self._datos if clave[0] == tabla]
+            for clave in claves:
+                del self._datos[clave]
+            self._invalidados += len(claves)
+        return len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            for tabla in self._generaciones:
+                self._generaciones[tabla] += 1
+            self._invalidados += len(self._datos)
+            self._datos.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                "entradas": len(self._datos),
+                "maximo": self.maximo,
+                "ttl_segundos": self.ttl,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else None,
+                "vencidos": self._vencidos,
+                "descartados": self._descartados,
+                "invalidados": self._invalidados,
+                "descartes_generacion": self._descartes_generacion,
+            }
+
+
+# Metadatos de lectura: última fecha_carga, totales por fecha y por RUC
+cache_lecturas = CacheTTL()
+
+
+def leer_cacheado(tabla, partes, calcular):
+    """
+    obtener_o_calcular de cache_lecturas con la versión de carga de la tabla en la clave.
+
+    Con la versión en la clave una carga confirmada en otro proceso deja de
+    usar lo guardado enseguida, igual que el ETag, y no hace falta esperar
+    a CACHE_LECTURAS_TTL. Se llama desde un hilo: puede leer el estado local.
+    """
+    return cache_lecturas.obtener_o_calcular((tabla, version_tabla(tabla), *partes), calcular)
+
+
+def invalidar_lecturas(tabla):
+    """Las cargas la llaman después del commit para que las lecturas vean los datos nuevos."""
+    return cache_lecturas.invalidar(tabla)
+
+
+def cache_stats():
+    return cache_lecturas.stats()
@@ -0,0 +1,148 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Modo de inserción: "fila" (una sentencia por fila), "lotes" (executemany) o "tvp"
+CARGA_MODO = os.getenv("CARGA_MODO", "lotes").lower()
+CARGA_TAMANO_LOTE = int(os.getenv("CARGA_TAMANO_LOTE", "1000"))
+
+
+class ErrorFilaCarga(Exception):
+    """
+    Error de inserción ubicado en una fila concreta de los parámetros.
+
+    Args:
+        posicion: Posición (base 0) de la fila que falló dentro de los parámetros
+        error: Excepción original del driver
+    """
+
+    def __init__(self, posicion, error):
+        super().__init__(str(error))
+        self.posicion = posicion
+        self.error = error
+
+
+def columnas_a_parametros(columnas, constantes=()):
+    """
+    Arma las tuplas de parámetros a partir de listas por columna.
+
+    Args:
+        columnas: Listas de valores ya convertidos, una por columna
+        constantes: Valores que se repiten en todas las filas (fecha_carga, etc.)
+
+    Returns:
+        list: Tuplas listas para executemany
+    """
+    constantes = tuple(constantes)
+    return [tuple(fila) + constantes for fila in zip(*columnas)]
+
+
+def fila_a_dict(fila):
+    """Convierte una fila de pandas a un dict serializable (tipos nativos, NaN -> None)."""
+    return {
+        columna: None if pd.isna(valor) else (valor.item() if isinstance(valor, np.generic) else valor)
+        for columna, valor in fila.items()
+    }
+
+
+def _savepoint(cursor, nombre):
+    cursor.execute(f"SAVE TRANSACTION {nombre}")
+
+
+def _deshacer_savepoint(cursor, nombre):
+    cursor.execute(f"ROLLBACK TRANSACTION {nombre}")
+
+
+def _biseccionar(cursor, sql, lote, inicio, error):
+    """
+    Ubica la primera fila inválida de un lote fallido partiéndolo a la mitad.
+
+    Cada intento se hace dentro de un savepoint y se deshace, así la transacción
+    queda igual que antes del lote.
+    """
+    cursor.fast_executemany = True
+    while len(lote) > 1:
+        mitad = len(lote) // 2
+        primera = lote[:mitad]
+        _savepoint(cursor, "carga_biseccion")
+        try:
+            cursor.executemany(sql, primera)
+        except Exception as e:
+            lote, error = primera, e
+        else:
+            lote, inicio = lote[mitad:], inicio + mitad
+        _deshacer_savepoint(cursor, "carga_biseccion")
+
+    _savepoint(cursor, "carga_biseccion")
+    try:
+        cursor.execute(sql, lote[0])
+    except Exception as e:
+        error = e
+    _deshacer_savepoint(cursor, "carga_biseccion")
+    return inicio, error
+
+
+def _insertar_filas(cursor, sql, parametros, desplazamiento):
+    for i, valores in enumerate(parametros):
+        try:
+            cursor.execute(sql, valores)
+        except Exception as e:
+            raise ErrorFilaCarga(desplazamiento + i, e)
+
+
+def _insertar_lote(cursor, sql, lote, inicio, sql_tvp=None, tipo_tvp=None):
+    _savepoint(cursor, "carga_lote")
+    try:
+        if sql_tvp and tipo_tvp:
+            esquema, _, tipo = tipo_tvp.rpartition(".")
+            cursor.execute(sql_tvp, [[tipo, esquema or "dbo"] + lote])
+        else:
+            cursor.executemany(sql, lote)
+    except Exception as e:
+        try:
+            _deshacer_savepoint(cursor, "carga_lote")
+        except Exception:
+            # La transacción quedó inutilizable: solo se puede informar el lote
+            raise ErrorFilaCarga(inicio, e)
+        posicion, error = _biseccionar(cursor, sql, lote, inicio, e)
+        raise ErrorFilaCarga(posicion, error)
+
+
+def insertar_en_lotes(cursor, sql, parametros, tamano_lote=None, modo=None, sql_tvp=None, tipo_tvp=None,
+                      desplazamiento=0, muestreo=None):
+    """
+    Inserta los parámetros en lotes con fast_executemany.
+
+    Debe llamarse con una transacción ya abierta (después del DELETE/TRUNCATE),
+    porque la bisección de errores usa savepoints.
+
+    Args:
+        cursor: Cursor de pyodbc
+        sql: INSERT parametrizado con una fila de placeholders
+        parametros: Lista de tuplas, una por fila
+        tamano_lote: Filas por envío (CARGA_TAMANO_LOTE por defecto)
+        modo: "fila", "lotes" o "tvp" (CARGA_MODO por defecto)
+        sql_tvp: INSERT ... SELECT ... FROM ? usado en modo "tvp"
+        tipo_tvp: Tipo de tabla definido en la base ("esquema.tipo")
+        desplazamiento: Posición de la primera fila, para reportar errores
+        muestreo: bitacora.Muestreo de la carga, para registrar los lotes sin uno por lote
+
+    Raises:
+        ErrorFilaCarga: Con la posición exacta de la fila que falló
+    """
+    modo = (modo or CARGA_MODO).lower()
+    if modo == "fila":
+        _insertar_filas(cursor, sql, parametros, desplazamiento)
+        return len(parametros)
+
+    if modo != "tvp" or not (sql_tvp and tipo_tvp):
+        sql_tvp = tipo_tvp = None
+        cursor.fast_executemany = True
+
+    tamano_lote = max(1, tamano_lote or CARGA_TAMANO_LOTE)
+    for inicio in range(0, len(parametros), tamano_lote):
+        lote = parametros[inicio:inicio + tamano_lote]
+        if muestreo:
+            muestreo.debug("lote", "Insertando lote de %d filas desde la posición %d", len(lote), desplazamiento + inicio)
+        _insertar_lote(cursor, sql, lote, desplazamiento + inicio, sql_tvp, tipo_tvp)
+    return len(parametros)
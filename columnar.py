@@ -0,0 +1,200 @@
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from db import get_db_connection
+from lectura import borrar_temporal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - sin pyarrow no hay exportación columnar
+    pa = pq = None
+
+# Carpeta del archivo local de Historial en Parquet; vacío lo deshabilita
+ARCHIVO_HISTORIAL_DIR = os.getenv("ARCHIVO_HISTORIAL_DIR", "")
+# Filas por fetchmany / record batch al exportar
+EXPORTACION_TAMANO_LOTE = int(os.getenv("EXPORTACION_TAMANO_LOTE", "50000"))
+
+PARQUET = "parquet"
+ARROW = "arrow"
+TIPOS_MEDIA = {
+    PARQUET: "application/vnd.apache.parquet",
+    ARROW: "application/vnd.apache.arrow.file",
+}
+
+SQL_HISTORIAL_RANGO = """
+    SELECT * FROM apl_imperio.APP_SALESFORCE_HISTORIAL
+    WHERE fecha_backup >= ? AND fecha_backup < ?
+    ORDER BY fecha_backup, id_carga
+"""
+
+
+def _tipo_arrow(tipo):
+    # El orden importa: datetime es subclase de date
+    if tipo is None:
+        return None
+    if issubclass(tipo, datetime):
+        return pa.timestamp("us")
+    if issubclass(tipo, date):
+        return pa.date32()
+    if issubclass(tipo, time):
+        return pa.time64("us")
+    if issubclass(tipo, bool):
+        return pa.bool_()
+    if issubclass(tipo, int):
+        return pa.int64()
+    if issubclass(tipo, float):
+        return pa.float64()
+    if issubclass(tipo, (bytes, bytearray)):
+        return pa.binary()
+    if issubclass(tipo, str):
+        return pa.string()
+    return None
+
+
+def esquema_desde_cursor(description, filas):
+    """
+    Arma el esquema Arrow a partir de cursor.description.
+
+    pyodbc informa el tipo de Python de cada columna y, para los DECIMAL, la
+    precisión y la escala. Si el driver no informa el tipo se toma del primer
+    valor no nulo del primer lote, y si no hay ninguno la columna queda como texto.
+    """
+    campos = []
+    for i, columna in enumerate(description):
+        nombre, tipo = columna[0], columna[1]
+        if isinstance(tipo, type) and issubclass(tipo, Decimal):
+            tipo_arrow = pa.decimal128(columna[4] or 38, columna[5] or 0)
+        else:
+            tipo_arrow = _tipo_arrow(tipo if isinstance(tipo, type) else None)
+        if tipo_arrow is None:
+            muestra = next((fila[i] for fila in filas if fila[i] is not None), None)
+            tipo_arrow = pa.decimal128(38, 10) if isinstance(muestra, Decimal) else _tipo_arrow(type(muestra))
+        campos.append(pa.field(nombre, tipo_arrow or pa.string()))
+    return pa.schema(campos)
+
+
+def _lote(esquema, filas):
+    columnas = list(zip(*filas))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)], schema=esquema
+    )
+
+
+def _abrir_escritor(ruta, esquema, formato):
+    if formato == ARROW:
+        return pa.ipc.new_file(ruta, esquema)
+    return pq.ParquetWriter(ruta, esquema, compression="zstd")
+
+
+def escribir_consulta(cursor, ruta, formato=PARQUET, tamano_lote=EXPORTACION_TAMANO_LOTE):
+    """
+    Escribe el resultado de una consulta ya ejecutada en Parquet o Arrow IPC.
+
+    Las filas se leen con fetchmany, así la memoria queda acotada a un lote.
+
+    Returns:
+        int: Filas escritas
+    """
+    filas = cursor.fetchmany(tamano_lote)
+    esquema = esquema_desde_cursor(cursor.description, filas)
+    total = 0
+    with _abrir_escritor(ruta, esquema, formato) as escritor:
+        while filas:
+            escritor.write_batch(_lote(esquema, filas))
+            total += len(filas)
+            filas = cursor.fetchmany(tamano_lote)
+    return total
+
+
+def _temporal(formato):
+    fd, ruta = tempfile.mkstemp(prefix="exportacion_", suffix=f".{formato}")
+    os.close(fd)
+    return ruta
+
+
+def exportar_consulta(sql, parametros, formato=PARQUET):
+    """
+    Exporta una consulta a un temporal en Parquet o Arrow IPC.
+
+    Returns:
+        tuple: (ruta del temporal, filas); quien llama debe borrar el temporal
+    """
+    ruta = _temporal(formato)
+    session = get_db_connection()
+    try:
+        cursor = session.cursor()
+        cursor.execute(sql, parametros)
+        return ruta, escribir_consulta(cursor, ruta, formato)
+    except BaseException:
+        borrar_temporal(ruta)
+        raise
+    finally:
+        session.close()
+
+
+def _carpeta_archivo(dia):
+    return os.path.join(ARCHIVO_HISTORIAL_DIR, "historial", f"fecha_backup={dia.isoformat()}")
+
+
+def archivar_historial(session, dia):
+    """
+    Guarda en el archivo local el Historial del día, que cada carga reemplaza.
+
+    Se escribe a un temporal en la misma carpeta y se renombra, así quien lee
+    el archivo nunca ve un Parquet a medias.
+
+    Returns:
+        int o None: Filas archivadas, None si el archivo está deshabilitado
+    """
+    if not ARCHIVO_HISTORIAL_DIR or pq is None:
+        return None
+    carpeta = _carpeta_archivo(dia)
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, "datos.parquet")
+    temporal = destino + ".tmp"
+    cursor = session.cursor()
+    cursor.execute(SQL_HISTORIAL_RANGO, (dia, dia + timedelta(days=1)))
+    try:
+        total = escribir_consulta(cursor, temporal, PARQUET)
+        os.replace(temporal, destino)
+    except BaseException:
+        borrar_temporal(temporal)
+        raise
+    return total
+
+
+def exportar_archivo(desde, hasta, formato=PARQUET):
+    """
+    Exporta el Historial entre desde y hasta (inclusive) leyendo el archivo local.
+
+    Returns:
+        tuple: (ruta del temporal, filas), o (None, 0) si no hay días archivados
+    """
+    archivos = []
+    dia = desde
+    while dia <= hasta:
+        ruta_dia = os.path.join(_carpeta_archivo(dia), "datos.parquet")
+        if os.path.exists(ruta_dia):
+            archivos.append(ruta_dia)
+        dia += timedelta(days=1)
+    if not archivos:
+        return None, 0
+
+    ruta = _temporal(formato)
+    total = 0
+    try:
+        esquema = pq.read_schema(archivos[0])
+        with _abrir_escritor(ruta, esquema, formato) as escritor:
+            for archivo in archivos:
+                for lote in pq.ParquetFile(archivo).iter_batches(batch_size=EXPORTACION_TAMANO_LOTE):
+                    escritor.write_batch(pa.RecordBatch.from_arrays(
+                        [lote.column(nombre).cast(campo.type) for nombre, campo in zip(esquema.names, esquema)],
+                        schema=esquema
+                    ))
+                    total += lote.num_rows
+    except BaseException:
+        borrar_temporal(ruta)
+        raise
+    return ruta, total
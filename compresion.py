@@ -0,0 +1,198 @@
+import gzip
+import os
+import zlib
+from cache import CacheTTL
+from ejecutor import run_cpu
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - sin brotli solo se ofrece gzip
+    brotli = None
+
+# Respuestas más chicas que esto se envían sin comprimir
+COMPRESION_MINIMO = int(os.getenv("COMPRESION_MINIMO", "1024"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+# Cuerpos comprimidos que se guardan por ETag (0 deshabilita el cache)
+COMPRESION_CACHE_MAX = int(os.getenv("COMPRESION_CACHE_MAX", "64"))
+COMPRESION_CACHE_TTL = float(os.getenv("COMPRESION_CACHE_TTL", "3600"))
+# Cuerpos más grandes que esto se comprimen en el executor de CPU, no en el event loop
+COMPRESION_EN_HILO = int(os.getenv("COMPRESION_EN_HILO", str(256 * 1024)))
+
+# Cuerpos ya comprimidos, compartidos por todas las instancias del middleware
+_comprimidos = CacheTTL(maximo=COMPRESION_CACHE_MAX, ttl=COMPRESION_CACHE_TTL) if COMPRESION_CACHE_MAX > 0 else None
+
+# Solo se comprimen formatos de texto; Parquet/Arrow ya vienen comprimidos
+_TIPOS_COMPRIMIBLES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _elegir_codificacion(accept_encoding):
+    """Elige br o gzip según Accept-Encoding, respetando q=0."""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                calidad = float(parametros.strip()[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[nombre.strip().lower()] = calidad
+    comodin = aceptadas.get("*", 0.0)
+    opciones = (["br"] if brotli is not None else []) + ["gzip"]
+    for codificacion in opciones:
+        if aceptadas.get(codificacion, comodin) > 0:
+            return codificacion
+    return None
+
+
+def _comprimir(cuerpo, codificacion):
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=COMPRESION_NIVEL_BROTLI)
+    return gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL_GZIP, mtime=0)
+
+
+class _CompresorIncremental:
+    """Comprime una respuesta que llega por partes, enviando cada parte apenas llega."""
+
+    def __init__(self, codificacion):
+        if codificacion == "br":
+            self._compresor = brotli.Compressor(quality=COMPRESION_NIVEL_BROTLI)
+            self._parte = lambda datos: self._compresor.process(datos) + self._compresor.flush()
+            self._fin = self._compresor.finish
+        else:
+            self._compresor = zlib.compressobj(COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 31)
+            self._parte = lambda datos: self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+            self._fin = self._compresor.flush
+
+    def parte(self, datos):
+        return self._parte(datos)
+
+    def fin(self):
+        return self._fin()
+
+
+def _encabezado(encabezados, nombre):
+    nombre = nombre.encode()
+    for clave, valor in encabezados:
+        if clave.lower() == nombre:
+            return valor.decode("latin-1")
+    return None
+
+
+def _sin(encabezados, *nombres):
+    nombres = {nombre.encode() for nombre in nombres}
+    return [(clave, valor) for clave, valor in encabezados if clave.lower() not in nombres]
+
+
+class CompresionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas con Brotli o gzip.
+
+    - Solo respuestas de texto/JSON de al menos COMPRESION_MINIMO bytes.
+    - Las respuestas transmitidas (NDJSON/stream) se comprimen por partes.
+    - Los cuerpos comprimidos de respuestas con ETag se guardan por
+      (ETag, ruta, codificación): el ETag cambia con cada carga, así que un
+      sondeo repetido no vuelve a comprimir el mismo contenido.
+    """
+
+    def __init__(self, app, minimo=COMPRESION_MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = _encabezado(scope.get("headers", []), "accept-encoding") or ""
+        codificacion = _elegir_codificacion(accept) if accept else None
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        ruta = scope.get("path", "") + "?" + scope.get("query_string", b"").decode("latin-1")
+        estado = {"inicio": None, "modo": None, "partes": [], "compresor": None}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["inicio"] = mensaje
+                return
+            if mensaje["type"] != "http.response.body":
+                return await send(mensaje)
+
+            inicio = estado["inicio"]
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+
+            if estado["modo"] is None:
+                estado["modo"] = self._decidir_modo(inicio, cuerpo, mas)
+                if estado["modo"] == "directo":
+                    await send(inicio)
+                elif estado["modo"] == "incremental":
+                    estado["compresor"] = _CompresorIncremental(codificacion)
+                    await send(self._inicio_comprimido(inicio, codificacion))
+
+            if estado["modo"] == "directo":
+                return await send(mensaje)
+            if estado["modo"] == "incremental":
+                datos = estado["compresor"].parte(cuerpo) if cuerpo else b""
+                if not mas:
+                    datos += estado["compresor"].fin()
+                return await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+            # Modo "completo": cuerpo en un solo mensaje (o varios, sin transmitir)
+            estado["partes"].append(cuerpo)
+            if mas:
+                return
+            completo = b"".join(estado["partes"])
+            comprimido = await self._comprimir_con_cache(inicio, completo, ruta, codificacion)
+            encabezados = self._inicio_comprimido(inicio, codificacion)
+            encabezados["headers"].append((b"content-length", str(len(comprimido)).encode()))
+            await send(encabezados)
+            await send({"type": "http.response.body", "body": comprimido})
+
+        await self.app(scope, receive, enviar)
+
+    def _decidir_modo(self, inicio, cuerpo, mas):
+        encabezados = inicio.get("headers", [])
+        tipo = _encabezado(encabezados, "content-type") or ""
+        if (inicio["status"] < 200 or inicio["status"] in (204, 304)
+                or _encabezado(encabezados, "content-encoding")
+                or not tipo.startswith(_TIPOS_COMPRIMIBLES)):
+            return "directo"
+        largo = _encabezado(encabezados, "content-length")
+        if largo is not None:
+            return "completo" if int(largo) >= self.minimo else "directo"
+        if mas:
+            return "incremental"
+        return "completo" if len(cuerpo) >= self.minimo else "directo"
+
+    def _inicio_comprimido(self, inicio, codificacion):
+        encabezados = _sin(inicio.get("headers", []), "content-length")
+        vary = _encabezado(encabezados, "vary")
+        encabezados = _sin(encabezados, "vary")
+        encabezados.append((b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode()))
+        encabezados.append((b"content-encoding", codificacion.encode()))
+        return {**inicio, "headers": encabezados}
+
+    async def _comprimir_con_cache(self, inicio, cuerpo, ruta, codificacion):
+        etag = _encabezado(inicio.get("headers", []), "etag")
+        clave = ("compresion", etag, ruta, codificacion)
+        if _comprimidos is not None and etag is not None:
+            comprimido = _comprimidos.obtener(clave)
+            if comprimido is not None:
+                return comprimido
+
+        if len(cuerpo) > COMPRESION_EN_HILO:
+            comprimido = await run_cpu(_comprimir, cuerpo, codificacion)
+        else:
+            comprimido = _comprimir(cuerpo, codificacion)
+        if _comprimidos is not None and etag is not None:
+            _comprimidos.guardar(clave, comprimido)
+        return comprimido
+
+
+def compresion_stats():
+    return {
+        "brotli": brotli is not None,
+        "minimo_bytes": COMPRESION_MINIMO,
+        "cache": _comprimidos.stats() if _comprimidos is not None else None,
+    }
@@ -1,23 +1,336 @@
 import os
+import threading
+import time
+from collections import deque
 import pyodbc
 from dotenv import load_dotenv
 # Cargar variables de entorno
 load_dotenv()
+from bitacora import obtener_logger
+from estadisticas_sql import CursorInstrumentado
 
-def get_db_connection():
+log = obtener_logger(__name__)
+
+# El pool propio reemplaza al pooling del Driver Manager de ODBC
+pyodbc.pooling = False
+
+# Configuración del pool
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "si", "yes")
+# Medir cada sentencia (estadísticas en /diagnostico/sql y log de consultas lentas)
+SQL_INSTRUMENTAR = os.getenv("SQL_INSTRUMENTAR", "1").lower() in ("1", "true", "si", "yes")
+# Segundos máximos por sentencia en el driver (0 = sin límite); es lo que corta una
+# carga trabada, porque las escrituras que ya arrancaron no se abandonan por reloj
+DB_TIMEOUT_SENTENCIA = int(os.getenv("DB_TIMEOUT_SENTENCIA", "900"))
+
+
+class ErrorConexion(Exception):
+    """No se pudo obtener una conexión a la base de datos."""
+
+
+class PoolTimeout(ErrorConexion):
+    """No se pudo obtener una conexión del pool dentro del tiempo de espera."""
+
+
+def crear_conexion():
     DB_HOST = os.getenv("DB_HOST")
     DB_USER = os.getenv("DB_USERNAME")
     DB_PASSWORD = os.getenv("DB_PASSWORD")
     DB_DATABASE = os.getenv("DB_DATABASE")
-    DB_PORT_STR = os.getenv("DB_PORT")
-    DB_PORT = int(DB_PORT_STR)
 
     connection_string = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={DB_HOST};DATABASE={DB_DATABASE};UID={DB_USER};PWD={DB_PASSWORD}'
+    conexion = pyodbc.connect(connection_string)
+    conexion.timeout = DB_TIMEOUT_SENTENCIA
+    return conexion
+
+
+class _ConexionFisica:
+    """Conexión real junto con su fecha de creación y último uso."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.creada = time.monotonic()
+        self.usada = self.creada
+
+
+class PooledConnection:
+    """
+    Envoltura de una conexión prestada por el pool.
+
+    Expone la misma interfaz que la conexión de pyodbc; close() la devuelve
+    al pool en lugar de cerrarla.
+    """
+
+    _pool = None
+    _fisica = None
+
+    def __init__(self, pool, fisica):
+        self._pool = pool
+        self._fisica = fisica
+
+    @property
+    def closed(self):
+        return self._fisica is None
+
+    def _raw(self):
+        if self._fisica is None:
+            raise pyodbc.ProgrammingError("La conexión ya fue devuelta al pool")
+        return self._fisica.raw
+
+    def cursor(self):
+        cursor = self._raw().cursor()
+        return CursorInstrumentado(cursor) if SQL_INSTRUMENTAR else cursor
+
+    def commit(self):
+        self._raw().commit()
+
+    def rollback(self):
+        self._raw().rollback()
+
+    def invalidate(self):
+        """Descarta la conexión física en lugar de devolverla al pool."""
+        if self._fisica is not None:
+            fisica, self._fisica = self._fisica, None
+            self._pool._descartar(fisica, "invalidadas")
+
+    def close(self):
+        if self._fisica is not None:
+            fisica, self._fisica = self._fisica, None
+            self._pool._devolver(fisica)
+
+    def __getattr__(self, nombre):
+        return getattr(self._raw(), nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Evita fugas si algún handler olvida cerrar la conexión
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones de proceso con tamaño mínimo/máximo.
+
+    Args:
+        creador: Función que abre una conexión nueva
+        minimo: Conexiones que se mantienen abiertas en reposo
+        maximo: Límite de conexiones abiertas a la vez
+        timeout: Segundos máximos de espera al pedir una conexión
+        reciclar: Vida máxima en segundos de una conexión física
+        pre_ping: Validar la conexión con SELECT 1 antes de entregarla
+    """
+
+    def __init__(self, creador, minimo=DB_POOL_MIN, maximo=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 reciclar=DB_POOL_RECYCLE, pre_ping=DB_POOL_PRE_PING):
+        self._creador = creador
+        self.minimo = max(0, minimo)
+        self.maximo = max(1, maximo, self.minimo)
+        self.timeout = timeout
+        self.reciclar = reciclar
+        self.pre_ping = pre_ping
+        self._libres = deque()
+        self._abiertas = 0
+        self._rellenando = False
+        self._cond = threading.Condition()
+        self._contadores = {
+            "prestamos": 0,
+            "creadas": 0,
+            "recicladas": 0,
+            "invalidadas": 0,
+            "timeouts": 0,
+            "espera_total_segundos": 0.0,
+        }
+
+    def _vencida(self, fisica):
+        return self.reciclar > 0 and time.monotonic() - fisica.creada > self.reciclar
+
+    def _validar(self, fisica):
+        if not self.pre_ping:
+            return True
+        try:
+            cursor = fisica.raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _cerrar_fisica(self, fisica):
+        try:
+            fisica.raw.close()
+        except Exception:
+            pass
+
+    def _descartar(self, fisica, motivo):
+        self._cerrar_fisica(fisica)
+        with self._cond:
+            self._abiertas -= 1
+            self._contadores[motivo] += 1
+            self._cond.notify()
+
+    def _abrir(self):
+        try:
+            fisica = _ConexionFisica(self._creador())
+        except Exception:
+            with self._cond:
+                self._abiertas -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._contadores["creadas"] += 1
+        return fisica
+
+    def _rellenar(self):
+        # Abre conexiones hasta tener el mínimo; corre en su propio hilo
+        try:
+            while True:
+                with self._cond:
+                    if self._abiertas >= self.minimo:
+                        return
+                    self._abiertas += 1
+                try:
+                    fisica = self._abrir()
+                except Exception:
+                    return
+                with self._cond:
+                    self._libres.append(fisica)
+                    self._cond.notify()
+        finally:
+            with self._cond:
+                self._rellenando = False
+
+    def rellenar_en_segundo_plano(self):
+        """Repone el mínimo de conexiones en reposo sin bloquear a quien pide."""
+        with self._cond:
+            if self._rellenando or self._abiertas >= self.minimo:
+                return
+            self._rellenando = True
+        threading.Thread(target=self._rellenar, name="pool-relleno", daemon=True).start()
+
+    def checkout(self, timeout=None):
+        espera = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + espera
+        while True:
+            fisica = None
+            crear = False
+            with self._cond:
+                while not self._libres and self._abiertas >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._contadores["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No hay conexiones libres tras {espera:.1f}s "
+                            f"({self._abiertas}/{self.maximo} en uso)"
+                        )
+                    self._cond.wait(restante)
+                if self._libres:
+                    fisica = self._libres.pop()
+                else:
+                    self._abiertas += 1
+                    crear = True
+
+            if crear:
+                fisica = self._abrir()
+            elif self._vencida(fisica):
+                self._descartar(fisica, "recicladas")
+                continue
+            elif not self._validar(fisica):
+                self._descartar(fisica, "invalidadas")
+                continue
+
+            fisica.usada = time.monotonic()
+            with self._cond:
+                self._contadores["prestamos"] += 1
+                self._contadores["espera_total_segundos"] += fisica.usada - inicio
+            return PooledConnection(self, fisica)
+
+    def _devolver(self, fisica):
+        # Se descarta cualquier transacción que el handler haya dejado abierta
+        try:
+            fisica.raw.rollback()
+        except Exception:
+            self._descartar(fisica, "invalidadas")
+            return
+        if self._vencida(fisica):
+            self._descartar(fisica, "recicladas")
+            return
+        fisica.usada = time.monotonic()
+        with self._cond:
+            self._libres.append(fisica)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            libres = list(self._libres)
+            self._libres.clear()
+            self._abiertas -= len(libres)
+            self._cond.notify_all()
+        for fisica in libres:
+            self._cerrar_fisica(fisica)
+
+    def stats(self):
+        with self._cond:
+            libres = len(self._libres)
+            datos = dict(self._contadores)
+            datos.update({
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "abiertas": self._abiertas,
+                "libres": libres,
+                "en_uso": self._abiertas - libres,
+            })
+        datos["espera_total_segundos"] = round(datos["espera_total_segundos"], 6)
+        return datos
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(crear_conexion)
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def get_db_connection():
+    """
+    Presta una conexión del pool; close() la devuelve.
+
+    Raises:
+        PoolTimeout: Si no hay conexiones libres dentro de DB_POOL_TIMEOUT
+        ErrorConexion: Si no se pudo abrir una conexión nueva
+    """
+    pool = get_pool()
     try:
-        conn = pyodbc.connect(connection_string)
-        cursor = conn.cursor()
-        print("Conexión exitosa a SQL Server")
-        return conn
+        conn = pool.checkout()
+    except ErrorConexion as e:
+        log.error("Error de conexión: %s", e)
+        raise
     except Exception as e:
-        print("Error de conexión:", e)
-        return None
\ No newline at end of file
+        log.error("Error de conexión: %s", e)
+        raise ErrorConexion(f"No se pudo conectar a la base de datos: {e}") from e
+    pool.rellenar_en_segundo_plano()
+    return conn
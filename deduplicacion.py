@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import time
+from estado_local import conexion_local, registrar_tabla
+
+# Si es 0 cada subida se procesa aunque sea idéntica a la anterior
+CARGA_DEDUP_HABILITADA = os.getenv("CARGA_DEDUP_HABILITADA", "1").lower() in ("1", "true", "si", "yes")
+# Segundos durante los que se devuelve el resultado guardado de una carga idéntica ya confirmada
+CARGA_DEDUP_VENTANA_SEGUNDOS = float(os.getenv("CARGA_DEDUP_VENTANA_SEGUNDOS", "3600"))
+
+# Una fila por alcance (la tabla del Dataframe, o un flujo y RUC de Personal) con la última carga confirmada
+registrar_tabla("""
+    CREATE TABLE IF NOT EXISTS cargas_confirmadas (
+        alcance TEXT PRIMARY KEY,
+        clave TEXT NOT NULL,
+        id_trabajo TEXT,
+        resultado TEXT NOT NULL,
+        confirmado REAL NOT NULL
+    );
+""")
+
+
+def nueva_huella():
+    """Hash que recibir_archivo va actualizando mientras copia el archivo."""
+    return hashlib.sha256()
+
+
+def clave_carga(tipo, huella, **campos):
+    """
+    Clave de una subida: el hash del contenido más los campos del formulario
+    que cambian lo que se escribe (hora_carga no entra, cambia en cada reintento).
+    """
+    texto = json.dumps([tipo, huella.hexdigest(), sorted(campos.items())], default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def resultado_confirmado(alcance, clave):
+    """
+    Resultado de la última carga confirmada del alcance si era esta misma subida.
+
+    Cualquier otra carga confirmada del alcance reemplaza la fila, así que si la
+    clave coincide los datos de la tabla siguen siendo los de esta subida.
+
+    Returns:
+        dict o None
+    """
+    if not CARGA_DEDUP_HABILITADA:
+        return None
+    with conexion_local() as conexion:
+        fila = conexion.execute(
+            "SELECT clave, id_trabajo, resultado, confirmado FROM cargas_confirmadas WHERE alcance = ?", (alcance,)
+        ).fetchone()
+    if fila is None or fila["clave"] != clave or time.time() - fila["confirmado"] > CARGA_DEDUP_VENTANA_SEGUNDOS:
+        return None
+    resultado = json.loads(fila["resultado"])
+    resultado["deduplicado"] = True
+    resultado["job_id"] = fila["id_trabajo"]
+    return resultado
+
+
+def guardar_confirmada(alcance, clave, id_trabajo, resultado):
+    """Registra la carga como la última confirmada del alcance."""
+    with conexion_local() as conexion:
+        conexion.execute("""
+            INSERT INTO cargas_confirmadas (alcance, clave, id_trabajo, resultado, confirmado)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (alcance) DO UPDATE SET
+                clave = excluded.clave, id_trabajo = excluded.id_trabajo,
+                resultado = excluded.resultado, confirmado = excluded.confirmado
+        """, (alcance, clave, id_trabajo, json.dumps(resultado, default=str), time.time()))
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Query
+from db import pool_stats
+from cache import cache_stats
+from compresion import compresion_stats
+from estadisticas_sql import sql_stats, reiniciar_sql_stats
+from planificacion.routes import instantanea_dataframe
+from planificador import planificador
+
+diag_router = APIRouter()
+
+@diag_router.get("/pool")
+def estado_pool():
+    return {"status": 1, "pool": pool_stats()}
+
+@diag_router.get("/cache")
+def estado_cache():
+    return {
+        "status": 1,
+        "cache": cache_stats(),
+        "compresion": compresion_stats(),
+        "instantanea": instantanea_dataframe.stats()
+    }
+
+@diag_router.get("/cargas")
+def estado_cargas():
+    return {"status": 1, "planificador": planificador.stats()}
+
+@diag_router.get("/sql")
+def estado_sql(
+    # total_segundos, p95_segundos, promedio_segundos, maximo_segundos, cantidad, errores o filas
+    orden: str = "total_segundos",
+    limite: int = Query(50, ge=1, le=500)
+):
+    return {"status": 1, "sql": sql_stats(orden, limite)}
+
+@diag_router.delete("/sql")
+def reiniciar_sql():
+    reiniciar_sql_stats()
+    return {"status": 1, "message": "Estadísticas de SQL reiniciadas"}
@@ -0,0 +1,128 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db import DB_POOL_MAX
+from lectura import procesos_excel_stats
+from metricas import registro, db_operacion_duracion
+from bitacora import obtener_logger
+
+# Hilos dedicados al driver (no tiene sentido tener más hilos que conexiones)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX)))
+# Hilos para trabajo de pandas (lectura y limpieza de archivos)
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Tiempos máximos por llamada, en segundos
+DB_TIMEOUT_LECTURA = float(os.getenv("DB_TIMEOUT_LECTURA", "30"))
+DB_TIMEOUT_CARGA = float(os.getenv("DB_TIMEOUT_CARGA", "900"))
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+
+log = obtener_logger(__name__)
+
+
+class TiempoAgotado(Exception):
+    """La operación en segundo plano superó su tiempo máximo."""
+
+
+def _medido(func, *args, **kwargs):
+    # Se mide dentro del hilo: solo el trabajo con el driver, sin la espera en la cola
+    inicio = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        db_operacion_duracion.observe(
+            time.perf_counter() - inicio, operacion=getattr(func, "__name__", type(func).__name__)
+        )
+
+
+async def _ejecutar(executor, timeout, func, *args, escritura=False, **kwargs):
+    loop = asyncio.get_running_loop()
+    # run_in_executor no pasa los contextvars al hilo (id de correlación de los logs)
+    contexto = contextvars.copy_context()
+    if executor is _db_executor:
+        llamada = functools.partial(contexto.run, _medido, func, *args, **kwargs)
+    else:
+        llamada = functools.partial(contexto.run, func, *args, **kwargs)
+    concurrente = executor.submit(llamada)
+    futuro = asyncio.wrap_future(concurrente, loop=loop)
+    nombre = getattr(func, "__name__", repr(func))
+    if not escritura:
+        try:
+            return await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            raise TiempoAgotado(f"'{nombre}' superó el tiempo máximo de {timeout:.0f}s")
+
+    # Una escritura que ya arrancó no se abandona: cortarla por reloj la dejaría corriendo
+    # (y confirmando) sin nadie que espere. El tiempo máximo solo cubre la espera en la cola;
+    # cada sentencia queda acotada por el timeout del driver (DB_TIMEOUT_SENTENCIA).
+    try:
+        await asyncio.wait_for(asyncio.shield(futuro), timeout)
+    except asyncio.TimeoutError:
+        if concurrente.cancel():
+            raise TiempoAgotado(f"'{nombre}' no empezó dentro del tiempo máximo de {timeout:.0f}s")
+        log.warning("'%s' superó %.0fs pero ya arrancó; se espera a que termine", nombre, timeout)
+    except asyncio.CancelledError:
+        if not concurrente.cancel():
+            # Quien espera se canceló, pero el hilo sigue usando la conexión y el archivo
+            await _esperar_sin_cancelar(futuro)
+        raise
+    return await _esperar_sin_cancelar(futuro)
+
+
+async def _esperar_sin_cancelar(futuro):
+    # Espera el resultado aunque cancelen a quien llama; la cancelación se propaga al final
+    cancelado = False
+    while not futuro.done():
+        try:
+            await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            if futuro.done():
+                break
+            cancelado = True
+    if cancelado:
+        raise asyncio.CancelledError()
+    return futuro.result()
+
+
+async def run_db(func, *args, timeout=DB_TIMEOUT_LECTURA, escritura=False, **kwargs):
+    """
+    Ejecuta trabajo bloqueante del driver (pyodbc) fuera del event loop.
+
+    Args:
+        func: Función síncrona que abre, usa y cierra su propia conexión
+        timeout: Segundos máximos, incluida la espera en la cola del executor
+        escritura: Si es True, timeout solo limita la espera en la cola: una vez
+            que func arrancó se espera a que termine (también si cancelan a quien
+            llama), así no confirma cambios ni usa archivos después de responder
+
+    Returns:
+        El valor devuelto por func
+    """
+    return await _ejecutar(_db_executor, timeout, func, *args, escritura=escritura, **kwargs)
+
+
+async def run_cpu(func, *args, timeout=DB_TIMEOUT_CARGA, **kwargs):
+    """Ejecuta trabajo de CPU (pandas, openpyxl) fuera del event loop."""
+    return await _ejecutar(_cpu_executor, timeout, func, *args, **kwargs)
+
+
+def executor_stats():
+    return {
+        "db": {"hilos": DB_EXECUTOR_WORKERS, "pendientes": _db_executor._work_queue.qsize()},
+        "cpu": {"hilos": CPU_EXECUTOR_WORKERS, "pendientes": _cpu_executor._work_queue.qsize()},
+        "excel": procesos_excel_stats(),
+    }
+
+
+executor_pendientes = registro.indicador(
+    "executor_tareas_pendientes", "Tareas esperando hilo en cada executor", ("executor",)
+)
+
+
+@registro.recolector
+def _recolectar_executors():
+    for nombre, datos in executor_stats().items():
+        executor_pendientes.set(datos["pendientes"], executor=nombre)
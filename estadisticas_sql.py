@@ -0,0 +1,262 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from bitacora import obtener_logger
+
+# Sentencias que tardan más que esto (segundos, incluida la lectura de filas) van al log de lentas;
+# un valor negativo lo deshabilita
+SQL_LENTA_SEGUNDOS = float(os.getenv("SQL_LENTA_SEGUNDOS", "1"))
+# Si es 1 el log de lentas y /diagnostico/sql incluyen los parámetros; por defecto no,
+# porque pueden tener datos personales (RUC, nombres)
+SQL_LENTA_PARAMETROS = os.getenv("SQL_LENTA_PARAMETROS", "0").lower() in ("1", "true", "si", "yes")
+# Últimas sentencias lentas que se guardan para /diagnostico/sql
+SQL_LENTAS_MAX = int(os.getenv("SQL_LENTAS_MAX", "100"))
+# Sentencias normalizadas distintas que se siguen; las que sobran se suman en "<otras>"
+SQL_ESTADISTICAS_MAX = int(os.getenv("SQL_ESTADISTICAS_MAX", "500"))
+# Duraciones recientes por sentencia con las que se calcula el p95
+SQL_MUESTRAS_P95 = int(os.getenv("SQL_MUESTRAS_P95", "1024"))
+
+log = obtener_logger(__name__)
+
+_OTRAS = "<otras>"
+_TEXTO = re.compile(r"N?'(?:[^']|'')*'")
+_NUMERO = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LISTA = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalizar_sentencia(sql):
+    """
+    Reduce una sentencia a su forma sin valores para agruparla.
+
+    Los literales de texto y números pasan a ?, las listas IN (?, ?, ...) a
+    IN (?...) y los espacios se colapsan, así "Flujo IN (?)" y
+    "Flujo IN (?, ?, ?)" cuentan como la misma sentencia.
+    """
+    sql = _TEXTO.sub("?", sql)
+    sql = _NUMERO.sub("?", sql)
+    sql = _LISTA.sub("IN (?...)", sql)
+    return _ESPACIOS.sub(" ", sql).strip()
+
+
+class _Estadistica:
+    __slots__ = ("cantidad", "total", "maximo", "filas", "errores", "muestras")
+
+    def __init__(self):
+        self.cantidad = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.filas = 0
+        self.errores = 0
+        self.muestras = deque(maxlen=SQL_MUESTRAS_P95)
+
+    def resumen(self, sentencia):
+        muestras = sorted(self.muestras)
+        p95 = muestras[min(len(muestras) - 1, int(len(muestras) * 0.95))] if muestras else 0.0
+        return {
+            "sentencia": sentencia,
+            "cantidad": self.cantidad,
+            "errores": self.errores,
+            "total_segundos": round(self.total, 6),
+            "promedio_segundos": round(self.total / self.cantidad, 6) if self.cantidad else 0.0,
+            "p95_segundos": round(p95, 6),
+            "maximo_segundos": round(self.maximo, 6),
+            "filas": self.filas,
+        }
+
+
+_estadisticas = {}
+_lentas = deque(maxlen=SQL_LENTAS_MAX)
+_lock = threading.Lock()
+_observadores = []
+
+
+def observador(funcion):
+    """
+    Registra funcion(sentencia, duracion, filas, error), que se llama en cada ejecución.
+
+    Es lo que usa metricas.py para exportar en /metrics; este módulo no lo
+    importa porque db.py depende de él y metricas.py de db.py.
+    """
+    _observadores.append(funcion)
+    return funcion
+
+
+def _parametros_log(parametros, varias):
+    if not SQL_LENTA_PARAMETROS:
+        return None
+    if varias:
+        return f"<{len(parametros[0])} filas>"
+    texto = repr(tuple(parametros) if isinstance(parametros, list) else parametros)
+    return texto if len(texto) <= 500 else texto[:500] + "..."
+
+
+def registrar_ejecucion(sql, parametros, duracion, filas, error=None, varias=False):
+    """Suma una ejecución a las estadísticas y, si fue lenta, al log de lentas."""
+    sentencia = normalizar_sentencia(sql)
+    with _lock:
+        estadistica = _estadisticas.get(sentencia)
+        if estadistica is None:
+            if len(_estadisticas) >= SQL_ESTADISTICAS_MAX:
+                sentencia = _OTRAS
+                estadistica = _estadisticas.get(_OTRAS)
+            if estadistica is None:
+                estadistica = _estadisticas[sentencia] = _Estadistica()
+        estadistica.cantidad += 1
+        estadistica.total += duracion
+        estadistica.maximo = max(estadistica.maximo, duracion)
+        estadistica.filas += max(filas or 0, 0)
+        estadistica.muestras.append(duracion)
+        if error is not None:
+            estadistica.errores += 1
+
+    for funcion in _observadores:
+        try:
+            funcion(sentencia, duracion, filas, error)
+        except Exception:
+            # Las métricas no pueden hacer fallar la consulta
+            log.warning("Error en observador de sentencias SQL", exc_info=True)
+
+    if 0 <= SQL_LENTA_SEGUNDOS <= duracion:
+        lenta = {
+            "sentencia": sentencia,
+            "duracion_segundos": round(duracion, 6),
+            "filas": filas,
+            "parametros": _parametros_log(parametros, varias),
+            "error": error,
+            "momento": time.time(),
+        }
+        with _lock:
+            _lentas.append(lenta)
+        log.warning("Consulta lenta (%.3fs): %s", duracion, sentencia, extra={
+            "duracion_segundos": lenta["duracion_segundos"], "filas": filas, "parametros": lenta["parametros"]
+        })
+
+
+class CursorInstrumentado:
+    """
+    Envoltura del cursor de pyodbc que mide cada sentencia.
+
+    El tiempo de una sentencia incluye el execute y los fetch que le siguen
+    (no la espera entre ellos); se registra al ejecutar la siguiente, al
+    cerrar el cursor o al salir del with. Las filas son las leídas con
+    fetch* o, para INSERT/UPDATE/DELETE, las que informa rowcount.
+    """
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_actual", None)
+
+    def _terminar(self):
+        actual = self._actual
+        if actual is None:
+            return
+        object.__setattr__(self, "_actual", None)
+        sql, parametros, duracion, filas, error, varias = actual
+        registrar_ejecucion(sql, parametros, duracion, filas, error, varias)
+
+    def _ejecutar(self, metodo, sql, parametros, varias):
+        self._terminar()
+        inicio = time.perf_counter()
+        try:
+            metodo(sql, *parametros)
+        except Exception as e:
+            registrar_ejecucion(sql, parametros, time.perf_counter() - inicio, None, str(e), varias)
+            raise
+        duracion = time.perf_counter() - inicio
+        if varias:
+            filas = len(parametros[0]) if parametros else 0
+        else:
+            filas = self._cursor.rowcount if self._cursor.rowcount >= 0 else None
+        object.__setattr__(self, "_actual", [sql, parametros, duracion, filas, None, varias])
+        return self
+
+    def execute(self, sql, *parametros):
+        return self._ejecutar(self._cursor.execute, sql, parametros, False)
+
+    def executemany(self, sql, parametros):
+        return self._ejecutar(self._cursor.executemany, sql, (parametros,), True)
+
+    def _leer(self, metodo, *args):
+        inicio = time.perf_counter()
+        resultado = metodo(*args)
+        actual = self._actual
+        if actual is not None:
+            actual[2] += time.perf_counter() - inicio
+            if resultado is not None:
+                cantidad = len(resultado) if isinstance(resultado, list) else 1
+                actual[3] = (actual[3] or 0) + cantidad
+        return resultado
+
+    def fetchone(self):
+        return self._leer(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._leer(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._leer(self._cursor.fetchall)
+
+    def fetchval(self):
+        return self._leer(self._cursor.fetchval)
+
+    def __iter__(self):
+        fila = self.fetchone()
+        while fila is not None:
+            yield fila
+            fila = self.fetchone()
+
+    def close(self):
+        self._terminar()
+        self._cursor.close()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __setattr__(self, nombre, valor):
+        # fast_executemany y similares van al cursor real
+        setattr(self._cursor, nombre, valor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._terminar()
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def __del__(self):
+        try:
+            self._terminar()
+        except Exception:
+            pass
+
+
+def sql_stats(orden="total_segundos", limite=50):
+    """
+    Estadísticas por sentencia normalizada y últimas consultas lentas.
+
+    Args:
+        orden: Campo del resumen por el que se ordena (descendente)
+        limite: Cantidad máxima de sentencias devueltas
+    """
+    with _lock:
+        resumenes = [estadistica.resumen(sentencia) for sentencia, estadistica in _estadisticas.items()]
+        lentas = list(_lentas)
+    resumenes.sort(key=lambda resumen: resumen.get(orden, 0), reverse=True)
+    return {
+        "umbral_lenta_segundos": SQL_LENTA_SEGUNDOS,
+        "sentencias_distintas": len(resumenes),
+        "sentencias": resumenes[:limite],
+        "lentas": lentas[::-1],
+    }
+
+
+def reiniciar_sql_stats():
+    with _lock:
+        _estadisticas.clear()
+        _lentas.clear()
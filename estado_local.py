@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Archivo SQLite con el estado que la API guarda localmente (trabajos de carga, etc.)
+ESTADO_LOCAL_DB = os.getenv("ESTADO_LOCAL_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "estado_local.db"))
+
+_tablas = []
+_columnas = []
+_tablas_lock = threading.Lock()
+_inicializado = False
+
+
+def registrar_tabla(ddl):
+    """
+    Registra el CREATE TABLE IF NOT EXISTS de un módulo que usa el estado local.
+
+    Las tablas se crean la primera vez que alguien abre una conexión.
+    """
+    global _inicializado
+    with _tablas_lock:
+        _tablas.append(ddl)
+        _inicializado = False
+
+
+def registrar_columna(tabla, columna, tipo):
+    """
+    Registra una columna agregada después de crear la tabla.
+
+    CREATE TABLE IF NOT EXISTS no toca las tablas que ya existen en el archivo,
+    así que la columna se agrega con ALTER TABLE si le falta.
+    """
+    global _inicializado
+    with _tablas_lock:
+        _columnas.append((tabla, columna, tipo))
+        _inicializado = False
+
+
+def _inicializar(conexion):
+    global _inicializado
+    with _tablas_lock:
+        if _inicializado:
+            return
+        conexion.execute("PRAGMA journal_mode=WAL")
+        for ddl in _tablas:
+            conexion.executescript(ddl)
+        for tabla, columna, tipo in _columnas:
+            existentes = {fila[1] for fila in conexion.execute(f"PRAGMA table_info({tabla})")}
+            if columna not in existentes:
+                conexion.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+        _inicializado = True
+
+
+@contextmanager
+def conexion_local():
+    """
+    Abre una conexión al estado local, confirma al salir y la cierra.
+
+    Cada llamada usa su propia conexión, así puede usarse desde cualquier hilo.
+    """
+    conexion = sqlite3.connect(ESTADO_LOCAL_DB, timeout=30)
+    conexion.row_factory = sqlite3.Row
+    try:
+        _inicializar(conexion)
+        yield conexion
+        conexion.commit()
+    except BaseException:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.close()
@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from ejecutor import run_db, DB_TIMEOUT_CARGA
+from lectura import borrar_temporal
+from columnar import exportar_consulta, exportar_archivo, SQL_HISTORIAL_RANGO, TIPOS_MEDIA, PARQUET, pa
+
+expo_router = APIRouter()
+
+
+def _validar(desde, hasta, formato):
+    if pa is None:
+        return "El servidor no tiene soporte para Parquet/Arrow (falta pyarrow)"
+    if formato not in TIPOS_MEDIA:
+        return f"Formato no soportado: {formato}. Use {' o '.join(TIPOS_MEDIA)}"
+    if hasta < desde:
+        return "La fecha 'hasta' no puede ser anterior a 'desde'"
+    return None
+
+
+def _archivo(ruta, total, nombre, formato):
+    return FileResponse(
+        ruta,
+        media_type=TIPOS_MEDIA[formato],
+        filename=f"{nombre}.{formato}",
+        headers={"X-Total-Filas": str(total)},
+        background=BackgroundTask(borrar_temporal, ruta)
+    )
+
+
+@expo_router.get("/historial")
+async def exportar_historial(
+    desde: date,
+    hasta: date,
+    formato: str = PARQUET,  # "parquet" o "arrow" (Arrow IPC)
+    origen: str = "db"  # "archivo" lee el archivo local en lugar de SQL Server
+):
+    error = _validar(desde, hasta, formato)
+    if error:
+        return {"status": 0, "message": error}
+
+    try:
+        if origen == "archivo":
+            ruta, total = await run_db(exportar_archivo, desde, hasta, formato, timeout=DB_TIMEOUT_CARGA)
+            if ruta is None:
+                return {"status": 0, "message": "No hay días archivados en el rango pedido"}
+        else:
+            # Rango semiabierto: incluye todo el día 'hasta'
+            ruta, total = await run_db(
+                exportar_consulta, SQL_HISTORIAL_RANGO, (desde, hasta + timedelta(days=1)), formato,
+                timeout=DB_TIMEOUT_CARGA
+            )
+    except Exception as e:
+        return {"status": 0, "error": str(e)}
+    return _archivo(ruta, total, f"historial_{desde}_{hasta}", formato)
+
+
+@expo_router.get("/personal")
+async def exportar_personal(
+    desde: date,
+    hasta: date,
+    formato: str = PARQUET,
+    ruc: Optional[str] = None,
+    flujo: Optional[str] = None
+):
+    error = _validar(desde, hasta, formato)
+    if error:
+        return {"status": 0, "message": error}
+
+    condiciones = ["fecha_carga >= ?", "fecha_carga <= ?"]
+    parametros = [desde, hasta]
+    if ruc:
+        condiciones.append("RUC = ?")
+        parametros.append(ruc)
+    if flujo:
+        condiciones.append("flujo = ?")
+        parametros.append(flujo)
+    sql = f"""
+        SELECT * FROM apl_imperio.APP_SALESFORCE_Personal
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY id_carga
+    """
+    try:
+        ruta, total = await run_db(exportar_consulta, sql, parametros, formato, timeout=DB_TIMEOUT_CARGA)
+    except Exception as e:
+        return {"status": 0, "error": str(e)}
+    return _archivo(ruta, total, f"personal_{desde}_{hasta}", formato)
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from db import get_db_connection
+from bitacora import obtener_logger
+from metricas import historial_filas_purgadas
+
+TABLA_HISTORIAL = "apl_imperio.APP_SALESFORCE_HISTORIAL"
+
+# Días de Historial que se conservan; 0 lo guarda para siempre
+HISTORIAL_RETENCION_DIAS = int(os.getenv("HISTORIAL_RETENCION_DIAS", "0"))
+# Filas por DELETE; cada lote se confirma aparte para no crecer el log ni bloquear la tabla
+HISTORIAL_TAMANO_LOTE = int(os.getenv("HISTORIAL_TAMANO_LOTE", "5000"))
+# Pausa entre lotes (segundos) para dejar pasar a las cargas y lecturas
+HISTORIAL_PAUSA_LOTE = float(os.getenv("HISTORIAL_PAUSA_LOTE", "0"))
+# Depuraciones recientes que se informan en /mantenimiento/historial
+HISTORIAL_DEPURACIONES_MAX = int(os.getenv("HISTORIAL_DEPURACIONES_MAX", "50"))
+
+log = obtener_logger(__name__)
+
+_depuraciones = deque(maxlen=HISTORIAL_DEPURACIONES_MAX)
+_lock = threading.Lock()
+_ultima_retencion = None
+
+
+def rango_dia(dia):
+    """
+    Rango semiabierto [dia 00:00, dia siguiente 00:00) para comparar fecha_backup.
+
+    A diferencia de CONVERT(DATE, fecha_backup) = ?, la comparación directa
+    con la columna puede usar el índice sobre fecha_backup.
+    """
+    inicio = datetime.combine(dia, datetime.min.time())
+    return inicio, inicio + timedelta(days=1)
+
+
+def hora_servidor(cursor):
+    # fecha_backup la pone el DEFAULT de la tabla con el reloj de SQL Server, no el de la API
+    cursor.execute("SELECT GETDATE()")
+    return cursor.fetchone()[0]
+
+
+def _borrar_por_lotes(session, condicion, parametros, motivo, tamano_lote=None):
+    """
+    Borra con DELETE TOP (n) hasta que no queden filas, confirmando cada lote.
+
+    Debe llamarse fuera de la transacción de una carga: hace commit de la sesión.
+
+    Returns:
+        dict: Filas borradas, lotes y duración
+    """
+    tamano_lote = max(1, tamano_lote or HISTORIAL_TAMANO_LOTE)
+    inicio = time.perf_counter()
+    filas = lotes = 0
+    cursor = session.cursor()
+    try:
+        while True:
+            cursor.execute(f"DELETE TOP (?) FROM {TABLA_HISTORIAL} WHERE {condicion}", (tamano_lote, *parametros))
+            borradas = max(cursor.rowcount, 0)
+            session.commit()
+            filas += borradas
+            lotes += 1
+            if borradas < tamano_lote:
+                break
+            if HISTORIAL_PAUSA_LOTE > 0:
+                time.sleep(HISTORIAL_PAUSA_LOTE)
+    finally:
+        cursor.close()
+
+    resumen = {
+        "motivo": motivo,
+        "filas_purgadas": filas,
+        "lotes": lotes,
+        "duracion_segundos": round(time.perf_counter() - inicio, 3),
+        "momento": time.time(),
+    }
+    historial_filas_purgadas.inc(filas, motivo=motivo)
+    with _lock:
+        _depuraciones.append(resumen)
+    log.info("Historial depurado: %d filas en %d lotes", filas, lotes, extra=resumen)
+    return resumen
+
+
+def reemplazar_dia(session, dia, hasta):
+    """
+    Borra las copias anteriores del día, después de confirmar la copia nueva.
+
+    Args:
+        dia: Día de fecha_backup
+        hasta: Hora del servidor tomada antes de insertar la copia nueva; lo
+            anterior a esa hora dentro del día es de cargas previas
+    """
+    desde, _ = rango_dia(dia)
+    return _borrar_por_lotes(session, "fecha_backup >= ? AND fecha_backup < ?", (desde, hasta), "reemplazo_dia")
+
+
+def purgar_historial(retencion_dias=None, session=None):
+    """
+    Borra el Historial anterior a los últimos retencion_dias días.
+
+    Args:
+        retencion_dias: Días que se conservan (HISTORIAL_RETENCION_DIAS por defecto)
+        session: Conexión a usar; si no se pasa se abre y se cierra una
+
+    Returns:
+        dict: Filas purgadas, lotes, duración y fecha límite, o None si la retención está deshabilitada
+    """
+    global _ultima_retencion
+    retencion_dias = HISTORIAL_RETENCION_DIAS if retencion_dias is None else retencion_dias
+    if retencion_dias <= 0:
+        return None
+    limite, _ = rango_dia(date.today() - timedelta(days=retencion_dias))
+    propia = session is None
+    if propia:
+        session = get_db_connection()
+    try:
+        resumen = _borrar_por_lotes(session, "fecha_backup < ?", (limite,), "retencion")
+    finally:
+        if propia:
+            session.close()
+    _ultima_retencion = date.today()
+    return {**resumen, "retencion_dias": retencion_dias, "limite": limite.isoformat()}
+
+
+def purgar_si_corresponde(session=None):
+    """Aplica la retención una vez por día; las cargas del Dataframe la llaman al terminar."""
+    if HISTORIAL_RETENCION_DIAS <= 0 or _ultima_retencion == date.today():
+        return None
+    return purgar_historial(session=session)
+
+
+def depuraciones():
+    """Últimas depuraciones, la más reciente primero."""
+    with _lock:
+        return list(_depuraciones)[::-1]
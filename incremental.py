@@ -0,0 +1,197 @@
+import datetime
+import decimal
+import hashlib
+import math
+import os
+from carga_masiva import insertar_en_lotes, ErrorFilaCarga
+
+# Si los cambios superan esta fracción de las filas actuales se reemplaza todo el alcance
+CARGA_INCREMENTAL_MAX_CAMBIOS = float(os.getenv("CARGA_INCREMENTAL_MAX_CAMBIOS", "0.5"))
+# Filas por fetchmany al leer las filas actuales
+CARGA_INCREMENTAL_TAMANO_LECTURA = int(os.getenv("CARGA_INCREMENTAL_TAMANO_LECTURA", "20000"))
+
+# "completo" borra y reinserta todo; "incremental" solo escribe lo que cambió
+MODO_COMPLETO = "completo"
+MODO_INCREMENTAL = "incremental"
+MODOS_CARGA = (MODO_COMPLETO, MODO_INCREMENTAL)
+
+_SEPARADOR = "\x1f"
+_NULO = "\x00"
+
+
+def _normalizar(valor):
+    # Lo que llega del archivo (ya validado) y lo que devuelve el driver tienen que dar el mismo texto
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+        return _NULO
+    if isinstance(valor, datetime.datetime) and valor.time() == datetime.time():
+        valor = valor.date()
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, (float, decimal.Decimal)) and valor == int(valor):
+        valor = int(valor)
+    # SQL Server ignora los espacios finales al comparar textos
+    return str(valor).rstrip()
+
+
+def _clave(fila, posiciones):
+    return tuple(_normalizar(fila[posicion]) for posicion in posiciones)
+
+
+def _huella(fila, ignorar):
+    texto = _SEPARADOR.join(_normalizar(valor) for posicion, valor in enumerate(fila) if posicion not in ignorar)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).digest()
+
+
+class Diferencias:
+    """
+    Resultado de comparar una carga con las filas que ya están en la tabla.
+
+    Attributes:
+        inserciones: Posiciones de las filas nuevas que no existían
+        actualizaciones: Pares (id_carga, posición) de filas que cambiaron
+        borrados: id_carga de filas que ya no vienen en el archivo
+        sin_cambios: Cantidad de filas idénticas
+        filas_actuales: Filas que había en la tabla
+        reemplazo: Si conviene borrar todo e insertar el archivo completo
+    """
+
+    def __init__(self):
+        self.inserciones = []
+        self.actualizaciones = []
+        self.borrados = []
+        self.sin_cambios = 0
+        self.filas_actuales = 0
+        self.reemplazo = False
+
+    @property
+    def cambios(self):
+        return len(self.inserciones) + len(self.actualizaciones) + len(self.borrados)
+
+    def resumen(self):
+        return {
+            "insertadas": len(self.inserciones),
+            "actualizadas": len(self.actualizaciones),
+            "borradas": len(self.borrados),
+            "sin_cambios": self.sin_cambios,
+            "reemplazo": self.reemplazo,
+        }
+
+
+def leer_actuales(cursor, tabla, columnas, condicion=None, parametros=()):
+    """
+    Lee (id_carga, *valores) de las filas actuales, ordenadas por id_carga.
+
+    Args:
+        columnas: Columnas de la tabla en el mismo orden que los parámetros del INSERT
+        condicion: WHERE que delimita el alcance de la carga (None = toda la tabla)
+    """
+    where = f" WHERE {condicion}" if condicion else ""
+    cursor.execute(f"SELECT id_carga, {', '.join(columnas)} FROM {tabla}{where} ORDER BY id_carga", *parametros)
+    filas = []
+    while True:
+        lote = cursor.fetchmany(CARGA_INCREMENTAL_TAMANO_LECTURA)
+        if not lote:
+            return filas
+        filas.extend(tuple(fila) for fila in lote)
+
+
+def calcular_diferencias(actuales, nuevas, clave, ignorar=()):
+    """
+    Compara las filas del archivo con las de la tabla por clave natural.
+
+    Una clave repetida se empareja por orden de aparición (la primera del
+    archivo con el id_carga más bajo, y así), así los duplicados legítimos
+    no se cuentan como cambios.
+
+    Args:
+        actuales: Filas (id_carga, *valores) de leer_actuales
+        nuevas: Tuplas de parámetros del INSERT, en el orden del archivo
+        clave: Posiciones de la clave natural dentro de las tuplas
+        ignorar: Posiciones que no cuentan como cambio (p. ej. hora_carga)
+
+    Returns:
+        Diferencias
+    """
+    ignorar = set(ignorar)
+    diferencias = Diferencias()
+    diferencias.filas_actuales = len(actuales)
+
+    existentes = {}
+    ocurrencias = {}
+    for fila in actuales:
+        valores = fila[1:]
+        clave_fila = _clave(valores, clave)
+        ordinal = ocurrencias.get(clave_fila, 0)
+        ocurrencias[clave_fila] = ordinal + 1
+        existentes[(clave_fila, ordinal)] = (fila[0], _huella(valores, ignorar))
+
+    ocurrencias.clear()
+    for posicion, fila in enumerate(nuevas):
+        clave_fila = _clave(fila, clave)
+        ordinal = ocurrencias.get(clave_fila, 0)
+        ocurrencias[clave_fila] = ordinal + 1
+        existente = existentes.pop((clave_fila, ordinal), None)
+        if existente is None:
+            diferencias.inserciones.append(posicion)
+        elif existente[1] != _huella(fila, ignorar):
+            diferencias.actualizaciones.append((existente[0], posicion))
+        else:
+            diferencias.sin_cambios += 1
+    diferencias.borrados = sorted(id_carga for id_carga, _ in existentes.values())
+
+    # Con muchos cambios (p. ej. la primera carga de otro día) reescribir fila por fila sale más caro
+    if diferencias.filas_actuales and diferencias.cambios > CARGA_INCREMENTAL_MAX_CAMBIOS * diferencias.filas_actuales:
+        diferencias.reemplazo = True
+    return diferencias
+
+
+def _reubicar(error, posiciones):
+    # La posición del error es dentro del lote enviado; se traduce a la posición en el archivo
+    return ErrorFilaCarga(posiciones[error.posicion], error.error)
+
+
+def aplicar_diferencias(cursor, diferencias, nuevas, tabla, columnas, sql_insert, sql_reemplazo,
+                        parametros_reemplazo=(), sql_tvp=None, tipo_tvp=None):
+    """
+    Escribe en la tabla solo los borrados, actualizaciones e inserciones.
+
+    Debe llamarse dentro de la transacción de la carga. Si diferencias.reemplazo
+    es True ejecuta sql_reemplazo (el DELETE/TRUNCATE del alcance) e inserta
+    todas las filas, igual que una carga completa.
+
+    Raises:
+        ErrorFilaCarga: Con la posición de la fila del archivo que falló
+    """
+    if diferencias.reemplazo:
+        cursor.execute(sql_reemplazo, *parametros_reemplazo)
+        insertar_en_lotes(cursor, sql_insert, nuevas, sql_tvp=sql_tvp, tipo_tvp=tipo_tvp)
+        return
+
+    if diferencias.borrados:
+        try:
+            insertar_en_lotes(
+                cursor, f"DELETE FROM {tabla} WHERE id_carga = ?", [(id_carga,) for id_carga in diferencias.borrados]
+            )
+        except ErrorFilaCarga as e:
+            # Son filas que ya no están en el archivo: no hay fila que señalar
+            raise e.error
+
+    if diferencias.actualizaciones:
+        asignaciones = ", ".join(f"{columna} = ?" for columna in columnas)
+        posiciones = [posicion for _, posicion in diferencias.actualizaciones]
+        try:
+            insertar_en_lotes(
+                cursor, f"UPDATE {tabla} SET {asignaciones} WHERE id_carga = ?",
+                [nuevas[posicion] + (id_carga,) for id_carga, posicion in diferencias.actualizaciones]
+            )
+        except ErrorFilaCarga as e:
+            raise _reubicar(e, posiciones)
+
+    if diferencias.inserciones:
+        try:
+            insertar_en_lotes(
+                cursor, sql_insert, [nuevas[posicion] for posicion in diferencias.inserciones],
+                sql_tvp=sql_tvp, tipo_tvp=tipo_tvp
+            )
+        except ErrorFilaCarga as e:
+            raise _reubicar(e, diferencias.inserciones)
@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+import numpy as np
+from db import get_db_connection
+from versiones import version_tabla
+from serializacion import COLUMNAR
+from paginacion import codificar_cursor, SIGUIENTE, ANTERIOR
+from bitacora import obtener_logger
+
+# Si es 0 las lecturas van siempre a la base
+INSTANTANEA_HABILITADA = os.getenv("INSTANTANEA_HABILITADA", "1").lower() in ("1", "true", "si", "yes")
+# Tablas más grandes que esto no se guardan en memoria y se leen de la base
+INSTANTANEA_MAX_FILAS = int(os.getenv("INSTANTANEA_MAX_FILAS", "500000"))
+# Filas por fetchmany al armar la instantánea
+INSTANTANEA_TAMANO_LOTE = int(os.getenv("INSTANTANEA_TAMANO_LOTE", "20000"))
+# Segundos que se usa una instantánea aunque la versión no cambie; acota lo que tarda en verse
+# una escritura que no pasa por estas cargas (api_upload, trabajos, correcciones a mano)
+INSTANTANEA_TTL_SEGUNDOS = float(os.getenv("INSTANTANEA_TTL_SEGUNDOS", "60"))
+
+log = obtener_logger(__name__)
+
+_VACIO = np.array([], dtype=np.int64)
+
+
+def _clave_fecha(valor):
+    # La consulta compara fecha_carga con 'YYYY-MM-DD' (también la de los cursores)
+    return valor.isoformat()[:10] if hasattr(valor, "isoformat") else str(valor)[:10]
+
+
+def _clave_texto(valor):
+    # SQL Server compara sin distinguir mayúsculas e ignora los espacios finales
+    return None if valor is None else str(valor).rstrip().lower()
+
+
+class Instantanea:
+    """
+    Copia en memoria, por columnas, de una tabla que se reemplaza completa en cada carga.
+
+    Las filas quedan ordenadas por id_carga, así las búsquedas por id y la
+    paginación por cursor son búsquedas binarias. Hay índices de posiciones
+    por fecha_carga y por (fecha_carga, Flujo). Es de solo lectura: una carga
+    nueva arma otra instancia y la reemplaza.
+    """
+
+    def __init__(self, version, columnas, filas):
+        self.version = version
+        self.armada = time.monotonic()
+        self.columnas = columnas
+        self.filas = len(filas)
+        valores = list(zip(*filas)) if filas else [()] * len(columnas)
+        self._columnas = []
+        for columna_valores in valores:
+            arreglo = np.empty(len(filas), dtype=object)
+            arreglo[:] = columna_valores
+            self._columnas.append(arreglo)
+
+        indice_id = columnas.index("id_carga")
+        self._ids = np.fromiter((fila[indice_id] for fila in filas), dtype=np.int64, count=len(filas))
+        fechas = self._columnas[columnas.index("fecha_carga")]
+        flujos = self._columnas[columnas.index("Flujo")]
+
+        self._fechas = {}
+        self._por_fecha = {}
+        self._por_flujo = {}
+        grupos_fecha = {}
+        grupos_flujo = {}
+        for posicion, (fecha, flujo) in enumerate(zip(fechas, flujos)):
+            clave = _clave_fecha(fecha)
+            if clave not in self._fechas:
+                self._fechas[clave] = fecha
+            grupos_fecha.setdefault(clave, []).append(posicion)
+            grupos_flujo.setdefault((clave, _clave_texto(flujo)), []).append(posicion)
+        # Las posiciones quedan en orden de id_carga porque las filas ya vienen ordenadas
+        self._por_fecha = {clave: np.array(posiciones, dtype=np.int64) for clave, posiciones in grupos_fecha.items()}
+        self._por_flujo = {clave: np.array(posiciones, dtype=np.int64) for clave, posiciones in grupos_flujo.items()}
+
+    def _datos(self, posiciones, formato=None):
+        if formato == COLUMNAR:
+            return {
+                columna: arreglo[posiciones].tolist() for columna, arreglo in zip(self.columnas, self._columnas)
+            }
+        return [
+            dict(zip(self.columnas, fila))
+            for fila in zip(*(arreglo[posiciones] for arreglo in self._columnas))
+        ] if len(posiciones) else []
+
+    def ultima_fecha(self):
+        """Mayor fecha_carga, con el mismo tipo que devuelve el driver."""
+        if not self._fechas:
+            return None
+        return self._fechas[max(self._fechas)]
+
+    def contar(self, fecha):
+        return len(self._por_fecha.get(_clave_fecha(fecha), _VACIO))
+
+    def por_flujos(self, fecha, flujos, formato=None):
+        """Filas de la fecha cuyo Flujo está en flujos (WHERE fecha_carga = ? AND Flujo IN (...))."""
+        clave = _clave_fecha(fecha)
+        grupos = [self._por_flujo.get((clave, flujo)) for flujo in {_clave_texto(flujo) for flujo in flujos}]
+        grupos = [grupo for grupo in grupos if grupo is not None]
+        posiciones = np.sort(np.concatenate(grupos)) if grupos else _VACIO
+        return self._datos(posiciones, formato), len(posiciones)
+
+    def por_id(self, fecha, id_carga, formato=None):
+        """Fila con ese id_carga si es de la fecha (WHERE fecha_carga = ? AND id_carga = ?)."""
+        posicion = int(np.searchsorted(self._ids, id_carga))
+        if posicion >= self.filas or self._ids[posicion] != id_carga:
+            return self._datos(_VACIO, formato), 0
+        if _clave_fecha(self._columnas[self.columnas.index("fecha_carga")][posicion]) != _clave_fecha(fecha):
+            return self._datos(_VACIO, formato), 0
+        return self._datos(np.array([posicion]), formato), 1
+
+    def pagina(self, fecha, page, size, datos_cursor=None, formato=None):
+        """Igual que paginacion.consultar_pagina con condición fecha_carga = ?, sin ir a la base."""
+        posiciones = self._por_fecha.get(_clave_fecha(fecha), _VACIO)
+        ids = self._ids[posiciones]
+        if datos_cursor:
+            page = datos_cursor["p"]
+            if datos_cursor["d"] == SIGUIENTE:
+                inicio = int(np.searchsorted(ids, int(datos_cursor["id"]), side="right"))
+                elegidas = posiciones[inicio:inicio + size]
+                hay_anterior, hay_siguiente = True, len(posiciones) - inicio > size
+            else:
+                fin = int(np.searchsorted(ids, int(datos_cursor["id"]), side="left"))
+                inicio = max(0, fin - size)
+                elegidas = posiciones[inicio:fin]
+                hay_anterior, hay_siguiente = inicio > 0, True
+        else:
+            inicio = max(0, (page - 1) * size)
+            elegidas = posiciones[inicio:inicio + size]
+            hay_anterior, hay_siguiente = page > 1, len(posiciones) - inicio > size
+
+        siguiente = anterior = None
+        if len(elegidas) and hay_siguiente:
+            siguiente = codificar_cursor({"d": SIGUIENTE, "id": int(self._ids[elegidas[-1]]), "p": page + 1, "f": fecha})
+        if len(elegidas) and hay_anterior:
+            anterior = codificar_cursor({"d": ANTERIOR, "id": int(self._ids[elegidas[0]]), "p": page - 1, "f": fecha})
+        return {
+            "datos": self._datos(elegidas, formato),
+            "cantidad": len(elegidas),
+            "page": page,
+            "next_cursor": siguiente,
+            "prev_cursor": anterior,
+        }
+
+
+class GestorInstantanea:
+    """
+    Mantiene la instantánea vigente de una tabla.
+
+    Cada intento de armarla recuerda la versión de la tabla que leyó; si otro
+    proceso confirma una carga la versión cambia, las lecturas vuelven a la
+    base y se arma una nueva en segundo plano. Lo mismo pasa cuando la
+    instantánea tiene más de INSTANTANEA_TTL_SEGUNDOS.
+    """
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        # (versión del último intento, instantánea o None); versión None fuerza a reintentar.
+        # Se reemplaza la tupla entera, así los lectores nunca ven una versión con otra instantánea
+        self._estado = (None, None)
+        self._lock = threading.Lock()
+        self._recargando = False
+
+    def construir(self, session, version):
+        """Lee la tabla completa y arma la instantánea, o None si supera INSTANTANEA_MAX_FILAS."""
+        cursor = session.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {self.tabla} ORDER BY id_carga")
+            columnas = [column[0] for column in cursor.description]
+            filas = []
+            while True:
+                lote = cursor.fetchmany(INSTANTANEA_TAMANO_LOTE)
+                if not lote:
+                    break
+                filas.extend(tuple(fila) for fila in lote)
+                if len(filas) > INSTANTANEA_MAX_FILAS:
+                    log.info("La tabla %s supera %d filas; se lee de la base", self.tabla, INSTANTANEA_MAX_FILAS)
+                    return None
+        finally:
+            cursor.close()
+        return Instantanea(version, columnas, filas)
+
+    def recargar(self, session=None):
+        """
+        Arma una instantánea nueva y la publica; si no se puede, las lecturas van a la base.
+
+        La versión se lee antes que las filas: si una carga termina en el medio,
+        la instantánea queda con la versión vieja y se descarta en la próxima lectura.
+        """
+        if not INSTANTANEA_HABILITADA:
+            return None
+        version = version_tabla(self.tabla)
+        propia = session is None
+        try:
+            if propia:
+                session = get_db_connection()
+            instantanea = self.construir(session, version)
+        except Exception:
+            log.warning("No se pudo armar la instantánea de %s", self.tabla, exc_info=True)
+            instantanea, version = None, None
+        finally:
+            if propia and session is not None:
+                session.close()
+        self._estado = (version, instantanea)
+        if instantanea is not None:
+            log.info("Instantánea de %s lista: %d filas", self.tabla, instantanea.filas,
+                     extra={"version": version})
+        return instantanea
+
+    def recargar_en_segundo_plano(self):
+        """Arma la instantánea en un hilo aparte; si ya hay uno armándola no hace nada."""
+        if not INSTANTANEA_HABILITADA:
+            return
+        with self._lock:
+            if self._recargando:
+                return
+            self._recargando = True
+
+        def recargar():
+            try:
+                self.recargar()
+            finally:
+                self._recargando = False
+
+        threading.Thread(target=recargar, name="instantanea", daemon=True).start()
+
+    def vigente(self):
+        """La instantánea si está al día con la versión de la tabla y no venció, si no None."""
+        if not INSTANTANEA_HABILITADA:
+            return None
+        version, instantanea = self._estado
+        if version != version_tabla(self.tabla):
+            self.recargar_en_segundo_plano()
+            return None
+        if instantanea is not None and time.monotonic() - instantanea.armada > INSTANTANEA_TTL_SEGUNDOS:
+            self.recargar_en_segundo_plano()
+            return None
+        return instantanea
+
+    def stats(self):
+        version, instantanea = self._estado
+        return {
+            "habilitada": INSTANTANEA_HABILITADA,
+            "filas": instantanea.filas if instantanea else None,
+            "version": version,
+            "edad_segundos": round(time.monotonic() - instantanea.armada, 1) if instantanea else None,
+            "ttl_segundos": INSTANTANEA_TTL_SEGUNDOS,
+            "recargando": self._recargando,
+        }
@@ -0,0 +1,654 @@
+import csv
+import datetime
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow es opcional para CSV
+    pa = pa_csv = pa_ipc = pq = None
+
+# Límites de las cargas, se validan antes de procesar filas
+CARGA_MAX_BYTES = int(os.getenv("CARGA_MAX_BYTES", str(50 * 1024 * 1024)))
+CARGA_MAX_FILAS = int(os.getenv("CARGA_MAX_FILAS", "1000000"))
+# Filas por bloque que se validan e insertan de una vez
+CARGA_TAMANO_CHUNK = int(os.getenv("CARGA_TAMANO_CHUNK", "5000"))
+# Bytes que se leen del request en cada vuelta al copiar a disco
+CARGA_BLOQUE_LECTURA = 1024 * 1024
+# Procesos que leen las hojas de Excel (0 = se leen en el hilo de la carga). Se crean con
+# spawn: cada proceso vuelve a importar el script de entrada, así que un script que importe
+# la app y cargue archivos necesita if __name__ == "__main__": (uvicorn main:app ya lo cumple)
+CARGA_PROCESOS_EXCEL = int(os.getenv("CARGA_PROCESOS_EXCEL", str(min(4, os.cpu_count() or 1))))
+
+XLSX = "xlsx"
+CSV = "csv"
+PARQUET = "parquet"
+
+# Firmas de los formatos binarios
+_FIRMA_ZIP = b"PK\x03\x04"
+_FIRMA_PARQUET = b"PAR1"
+_FIRMA_OLE = b"\xd0\xcf\x11\xe0"
+# Separadores que se prueban en los CSV
+_SEPARADORES = ",;\t|"
+
+
+class ArchivoRechazado(Exception):
+    """El archivo supera los límites configurados o no se puede leer."""
+
+
+async def guardar_en_temporal(file, max_bytes=CARGA_MAX_BYTES, huella=None):
+    """
+    Copia el archivo subido a un temporal en disco, por bloques.
+
+    Args:
+        file: UploadFile recibido por el endpoint
+        max_bytes: Tamaño máximo permitido
+        huella: Objeto de hashlib que se actualiza con cada bloque (opcional)
+
+    Returns:
+        str: Ruta del temporal; quien llama debe borrarlo
+
+    Raises:
+        ArchivoRechazado: Si el archivo supera max_bytes
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise ArchivoRechazado(f"El archivo pesa {file.size} bytes y el máximo es {max_bytes}")
+
+    _, extension = os.path.splitext(file.filename or "")
+    fd, ruta = tempfile.mkstemp(prefix="carga_", suffix=extension or ".xlsx")
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while True:
+                bloque = await file.read(CARGA_BLOQUE_LECTURA)
+                if not bloque:
+                    break
+                total += len(bloque)
+                if total > max_bytes:
+                    raise ArchivoRechazado(f"El archivo supera el máximo de {max_bytes} bytes")
+                destino.write(bloque)
+                if huella is not None:
+                    huella.update(bloque)
+    except BaseException:
+        borrar_temporal(ruta)
+        raise
+    return ruta
+
+
+async def recibir_archivo(file, max_bytes=CARGA_MAX_BYTES, huella=None):
+    """
+    Guarda el archivo subido en disco y detecta su formato.
+
+    Si se pasa huella (p. ej. hashlib.sha256()), se calcula mientras se copia.
+
+    Returns:
+        tuple: (ruta del temporal, formato)
+
+    Raises:
+        ArchivoRechazado: Si supera el tamaño o el formato no es soportado
+    """
+    ruta = await guardar_en_temporal(file, max_bytes, huella)
+    try:
+        return ruta, detectar_formato(ruta, file.content_type)
+    except BaseException:
+        borrar_temporal(ruta)
+        raise
+
+
+def borrar_temporal(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def _normalizar_encabezado(encabezado):
+    # Igual que pd.read_excel: sin columnas vacías al final, "Unnamed: n" y duplicados con sufijo
+    encabezado = list(encabezado)
+    while encabezado and encabezado[-1] is None:
+        encabezado.pop()
+    columnas = []
+    vistos = {}
+    for i, nombre in enumerate(encabezado):
+        nombre = f"Unnamed: {i}" if nombre is None else nombre
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f"{nombre}.{vistos[nombre]}"
+        else:
+            vistos[nombre] = 0
+        columnas.append(nombre)
+    return columnas
+
+
+def _a_dataframe(filas, numeros_fila, columnas):
+    # El índice es la fila de Excel menos 2, así "index + 2" sigue siendo la fila real
+    indice = pd.Index([numero - 2 for numero in numeros_fila])
+    return pd.DataFrame.from_records(filas, columns=columnas, index=indice)
+
+
+def _bloques_hoja(hoja, tamano_chunk, max_filas):
+    """
+    Recorre una hoja por bloques.
+
+    Yields:
+        tuple: (columnas, filas, números de fila de Excel) de cada bloque
+    """
+    # La dimensión declarada permite rechazar archivos enormes sin recorrerlos
+    if max_filas and hoja.max_row and hoja.max_row - 1 > max_filas:
+        raise ArchivoRechazado(f"La hoja tiene {hoja.max_row - 1} filas y el máximo es {max_filas}")
+
+    filas = hoja.iter_rows(values_only=True)
+    encabezado = next(filas, None)
+    if encabezado is None:
+        return
+    columnas = _normalizar_encabezado(encabezado)
+    ancho = len(columnas)
+
+    bloque, numeros_fila = [], []
+    total = 0
+    for numero_fila, valores in enumerate(filas, start=2):
+        valores = tuple(None if valor == "" else valor for valor in valores[:ancho])
+        if all(valor is None for valor in valores):
+            continue
+        total += 1
+        if max_filas and total > max_filas:
+            raise ArchivoRechazado(f"El archivo supera el máximo de {max_filas} filas")
+        bloque.append(valores + (None,) * (ancho - len(valores)))
+        numeros_fila.append(numero_fila)
+        if len(bloque) >= tamano_chunk:
+            yield columnas, bloque, numeros_fila
+            bloque, numeros_fila = [], []
+    if bloque:
+        yield columnas, bloque, numeros_fila
+
+
+def _abrir_libro(ruta):
+    try:
+        return openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    except Exception as e:
+        raise ArchivoRechazado(f"No se pudo leer el archivo como Excel: {e}")
+
+
+def _con_hoja(df, hoja):
+    # Con varias hojas cada bloque dice de qué hoja viene, para los errores y los encabezados
+    if hoja is not None:
+        df.attrs["hoja"] = hoja
+    return df
+
+
+def leer_excel_por_bloques(ruta, tamano_chunk=CARGA_TAMANO_CHUNK, max_filas=CARGA_MAX_FILAS, todas_las_hojas=False):
+    """
+    Recorre la primera hoja del libro (o todas, en orden) en modo solo lectura, por bloques.
+
+    Args:
+        ruta: Ruta del .xlsx en disco
+        tamano_chunk: Filas por bloque
+        max_filas: Máximo de filas de datos permitidas, sumando todas las hojas
+        todas_las_hojas: Si es True recorre todas las hojas y marca cada bloque
+            con df.attrs["hoja"]
+
+    Yields:
+        pd.DataFrame: Bloque de filas con índice = fila de Excel - 2
+
+    Raises:
+        ArchivoRechazado: Si el libro supera max_filas o el archivo no es un libro válido
+    """
+    libro = _abrir_libro(ruta)
+    try:
+        hojas = libro.worksheets if todas_las_hojas else libro.worksheets[:1]
+        total = 0
+        for hoja in hojas:
+            nombre = hoja.title if todas_las_hojas else None
+            try:
+                for columnas, filas, numeros_fila in _bloques_hoja(hoja, tamano_chunk, max_filas):
+                    total += len(filas)
+                    if max_filas and total > max_filas:
+                        raise ArchivoRechazado(f"El archivo supera el máximo de {max_filas} filas")
+                    yield _con_hoja(_a_dataframe(filas, numeros_fila, columnas), nombre)
+            except ArchivoRechazado as e:
+                if nombre is not None:
+                    raise ArchivoRechazado(f"Hoja '{nombre}': {e}")
+                raise
+    finally:
+        libro.close()
+
+
+# Tipos de celda que se pasan a Arrow tal cual; las columnas con otros tipos
+# o con tipos mezclados viajan como texto con una etiqueta del tipo original
+_TIPOS_ARROW = {
+    str: "string",
+    int: "int64",
+    float: "float64",
+    bool: "bool_",
+    datetime.datetime: "timestamp",
+}
+_COLUMNA_FILA = "__fila"
+
+
+def _etiquetar(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, bool):
+        return "b1" if valor else "b0"
+    if isinstance(valor, int):
+        return f"i{valor}"
+    if isinstance(valor, float):
+        return f"f{valor!r}"
+    if isinstance(valor, datetime.datetime):
+        return f"d{valor.isoformat()}"
+    if isinstance(valor, datetime.date):
+        return f"D{valor.isoformat()}"
+    if isinstance(valor, datetime.time):
+        return f"t{valor.isoformat()}"
+    if isinstance(valor, datetime.timedelta):
+        return f"r{valor.total_seconds()!r}"
+    return f"s{valor}"
+
+
+_DESETIQUETAR = {
+    "b": lambda texto: texto == "1",
+    "i": int,
+    "f": float,
+    "d": datetime.datetime.fromisoformat,
+    "D": datetime.date.fromisoformat,
+    "t": datetime.time.fromisoformat,
+    "r": lambda texto: datetime.timedelta(seconds=float(texto)),
+    "s": str,
+}
+
+
+def _desetiquetar(texto):
+    if texto is None:
+        return None
+    return _DESETIQUETAR[texto[0]](texto[1:])
+
+
+def _arreglo_arrow(valores):
+    # None si la columna no tiene un único tipo representable en Arrow
+    tipos = {type(valor) for valor in valores if valor is not None}
+    if not tipos:
+        return pa.nulls(len(valores))
+    if len(tipos) > 1 or next(iter(tipos)) not in _TIPOS_ARROW:
+        return None
+    nombre = _TIPOS_ARROW[tipos.pop()]
+    tipo = pa.timestamp("us") if nombre == "timestamp" else getattr(pa, nombre)()
+    try:
+        return pa.array(valores, type=tipo)
+    except (pa.ArrowInvalid, OverflowError):
+        # Enteros fuera de int64
+        return None
+
+
+def _escribir_bloque_arrow(archivo, filas, numeros_fila, ancho):
+    arreglos, mixtas = [], []
+    for posicion, valores in enumerate(zip(*filas)):
+        arreglo = _arreglo_arrow(valores)
+        if arreglo is None:
+            arreglo = pa.array([_etiquetar(valor) for valor in valores], type=pa.string())
+            mixtas.append(str(posicion))
+        arreglos.append(arreglo)
+    arreglos.append(pa.array(numeros_fila, type=pa.int64()))
+    nombres = [f"c{posicion}" for posicion in range(ancho)] + [_COLUMNA_FILA]
+    lote = pa.RecordBatch.from_arrays(arreglos, names=nombres)
+    lote = lote.replace_schema_metadata({"mixtas": ",".join(mixtas)})
+    # Se escribe con otro nombre y se renombra, así el proceso de la API nunca ve un archivo a medias
+    parcial = f"{archivo}.parcial"
+    with pa.OSFile(parcial, "wb") as destino, pa_ipc.new_file(destino, lote.schema) as escritor:
+        escritor.write_batch(lote)
+    os.replace(parcial, archivo)
+
+
+def _leer_hoja_a_arrow(ruta, indice, tamano_chunk, max_filas, directorio, cola, cancelar):
+    """
+    Lee una hoja en un proceso del pool y deja cada bloque en un archivo Arrow.
+
+    Cada bloque se avisa por la cola apenas está escrito, así el proceso de la
+    API lo valida e inserta mientras este sigue leyendo la hoja. Los bloques
+    viajan como archivos IPC de Arrow que se mapean en memoria, en lugar de
+    DataFrames serializados con pickle. Al terminar (también con error) se
+    manda None. Si la carga deja de leer (p. ej. el primer bloque no pasa la
+    validación) marca cancelar y la hoja se deja de leer en el bloque siguiente.
+
+    Returns:
+        dict: Nombre de la hoja y filas leídas
+    """
+    try:
+        libro = _abrir_libro(ruta)
+        try:
+            hoja = libro.worksheets[indice]
+            resultado = {"hoja": hoja.title, "filas": 0}
+            for numero, (columnas, filas, numeros_fila) in enumerate(_bloques_hoja(hoja, tamano_chunk, max_filas)):
+                if cancelar.is_set():
+                    resultado["cancelada"] = True
+                    break
+                archivo = os.path.join(directorio, f"{indice:04d}_{numero:06d}.arrow")
+                _escribir_bloque_arrow(archivo, filas, numeros_fila, len(columnas))
+                cola.put((archivo, columnas))
+                resultado["filas"] += len(filas)
+            return resultado
+        finally:
+            libro.close()
+    finally:
+        cola.put(None)
+
+
+def _leer_bloque_arrow(archivo, columnas):
+    with pa.memory_map(archivo) as fuente:
+        tabla = pa_ipc.open_file(fuente).read_all()
+        mixtas = {int(posicion) for posicion in tabla.schema.metadata[b"mixtas"].decode().split(",") if posicion}
+        # Las columnas mixtas se reconstruyen valor por valor; el resto pasa directo a pandas
+        decodificadas = {
+            f"c{posicion}": [_desetiquetar(valor) for valor in tabla.column(posicion).to_pylist()]
+            for posicion in mixtas
+        }
+        # to_pandas copia los datos, así el archivo se puede borrar al salir
+        df = tabla.drop_columns(list(decodificadas)).to_pandas()
+    for nombre, valores in decodificadas.items():
+        # Lo que from_records hubiera deducido de los valores originales (p. ej. int + float = float64)
+        df[nombre] = pd.Series(valores, index=df.index, dtype=object).infer_objects()
+    df = df[[f"c{posicion}" for posicion in range(len(columnas))] + [_COLUMNA_FILA]]
+    df.index = pd.Index(df.pop(_COLUMNA_FILA).to_numpy() - 2)
+    df.columns = columnas
+    return df
+
+
+_pool_excel = None
+_gestor_excel = None
+_pool_lock = threading.Lock()
+
+
+def _pool():
+    global _pool_excel, _gestor_excel
+    with _pool_lock:
+        if _pool_excel is None:
+            # spawn: el proceso de la API tiene hilos y conexiones que no deben heredarse con fork
+            contexto = multiprocessing.get_context("spawn")
+            _pool_excel = ProcessPoolExecutor(max_workers=CARGA_PROCESOS_EXCEL, mp_context=contexto)
+            # Las colas del gestor se pueden pasar como argumento a las tareas del pool
+            _gestor_excel = contexto.Manager()
+        return _pool_excel, _gestor_excel
+
+
+def _descartar_pool(pool):
+    global _pool_excel, _gestor_excel
+    with _pool_lock:
+        if _pool_excel is not pool:
+            return
+        gestor, _pool_excel, _gestor_excel = _gestor_excel, None, None
+    pool.shutdown(wait=False, cancel_futures=True)
+    gestor.shutdown()
+
+
+def procesos_excel_stats():
+    pool = _pool_excel
+    return {
+        "procesos": CARGA_PROCESOS_EXCEL,
+        "pendientes": len(pool._pending_work_items) if pool is not None else 0,
+    }
+
+
+def _avisos_hoja(futuro, cola):
+    # Bloques de una hoja a medida que el proceso los escribe
+    while True:
+        try:
+            aviso = cola.get(timeout=1)
+        except queue.Empty:
+            # Si el proceso murió nunca llega el None final
+            if futuro.done() and futuro.exception() is not None:
+                futuro.result()
+            continue
+        if aviso is None:
+            break
+        yield aviso
+    # Propaga el error de la hoja, si lo hubo, después de sus bloques buenos
+    futuro.result()
+
+
+def leer_excel_en_procesos(ruta, tamano_chunk=CARGA_TAMANO_CHUNK, max_filas=CARGA_MAX_FILAS, todas_las_hojas=False):
+    """
+    Igual que leer_excel_por_bloques, pero cada hoja se lee en un proceso del pool.
+
+    Los bloques se entregan a medida que el proceso los escribe. Con
+    todas_las_hojas las hojas se leen en paralelo y los bloques se entregan en
+    el orden de las hojas. Sin pyarrow o con CARGA_PROCESOS_EXCEL = 0 lee en el
+    mismo hilo.
+
+    Si quien consume deja de pedir bloques (cierra el generador o sale con
+    error), los procesos dejan de leer sus hojas en el siguiente bloque.
+    """
+    if pa_ipc is None or CARGA_PROCESOS_EXCEL <= 0:
+        yield from leer_excel_por_bloques(ruta, tamano_chunk, max_filas, todas_las_hojas)
+        return
+
+    if todas_las_hojas:
+        libro = _abrir_libro(ruta)
+        try:
+            nombres = [hoja.title for hoja in libro.worksheets]
+        finally:
+            libro.close()
+    else:
+        nombres = [None]
+
+    pool, gestor = _pool()
+    directorio = tempfile.mkdtemp(prefix="hojas_")
+    futuros = []
+    cancelar = None
+    try:
+        try:
+            cancelar = gestor.Event()
+            for indice in range(len(nombres)):
+                cola = gestor.Queue()
+                futuros.append((
+                    pool.submit(_leer_hoja_a_arrow, ruta, indice, tamano_chunk, max_filas, directorio, cola, cancelar),
+                    cola
+                ))
+        except (BrokenProcessPool, RuntimeError, OSError, EOFError):
+            _descartar_pool(pool)
+            raise ArchivoRechazado("No se pudo leer el archivo: el pool de lectura de Excel no está disponible")
+        total = 0
+        for nombre, (futuro, cola) in zip(nombres, futuros):
+            try:
+                for archivo, columnas in _avisos_hoja(futuro, cola):
+                    df = _leer_bloque_arrow(archivo, columnas)
+                    borrar_temporal(archivo)
+                    total += len(df)
+                    if max_filas and total > max_filas:
+                        raise ArchivoRechazado(f"El archivo supera el máximo de {max_filas} filas")
+                    yield _con_hoja(df, nombre)
+            except BrokenProcessPool:
+                # Un proceso murió (p. ej. sin memoria); el próximo uso crea un pool nuevo
+                _descartar_pool(pool)
+                raise ArchivoRechazado("No se pudo leer el archivo: el proceso de lectura terminó inesperadamente")
+            except ArchivoRechazado as e:
+                if nombre is not None:
+                    raise ArchivoRechazado(f"Hoja '{nombre}': {e}")
+                raise
+    finally:
+        # Las hojas que no arrancaron se cancelan; las que se están leyendo ven la señal
+        for futuro, _ in futuros:
+            futuro.cancel()
+        if cancelar is not None:
+            try:
+                cancelar.set()
+            except (OSError, EOFError):
+                # El gestor ya no está (pool descartado): sus procesos tampoco
+                pass
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def detectar_formato(ruta, content_type=None):
+    """
+    Detecta el formato del archivo por sus primeros bytes.
+
+    El content type solo se usa para confirmar los archivos de texto; la firma
+    del archivo manda sobre el nombre y el content type declarados.
+
+    Returns:
+        str: XLSX, CSV o PARQUET
+
+    Raises:
+        ArchivoRechazado: Si el formato no es soportado
+    """
+    with open(ruta, "rb") as archivo:
+        inicio = archivo.read(4096)
+    content_type = (content_type or "").lower()
+
+    if inicio.startswith(_FIRMA_ZIP):
+        return XLSX
+    if inicio.startswith(_FIRMA_PARQUET):
+        return PARQUET
+    if inicio.startswith(_FIRMA_OLE):
+        raise ArchivoRechazado("El formato .xls no es soportado, guarde el archivo como .xlsx o .csv")
+    if "parquet" in content_type or "spreadsheetml" in content_type:
+        raise ArchivoRechazado(f"El contenido del archivo no corresponde al tipo declarado ({content_type})")
+    # Cualquier otro contenido de texto se trata como CSV
+    if b"\x00" not in inicio:
+        return CSV
+    raise ArchivoRechazado("Formato de archivo no soportado, use .xlsx, .csv o .parquet")
+
+
+def leer_por_bloques(ruta, formato=None, tamano_chunk=CARGA_TAMANO_CHUNK, max_filas=CARGA_MAX_FILAS,
+                     todas_las_hojas=False):
+    """
+    Recorre el archivo por bloques según su formato.
+
+    Todos los lectores entregan bloques con índice = fila del archivo - 2, para
+    que la validación y los errores funcionen igual con cualquier formato.
+    todas_las_hojas solo aplica a los .xlsx.
+    """
+    formato = formato or detectar_formato(ruta)
+    if formato == CSV:
+        return leer_csv_por_bloques(ruta, tamano_chunk, max_filas)
+    if formato == PARQUET:
+        return leer_parquet_por_bloques(ruta, tamano_chunk, max_filas)
+    return leer_excel_en_procesos(ruta, tamano_chunk, max_filas, todas_las_hojas)
+
+
+def _dialecto_csv(ruta):
+    # Codificación, separador y encabezado a partir del inicio del archivo
+    with open(ruta, "rb") as archivo:
+        muestra = archivo.read(64 * 1024)
+        if archivo.read(1):
+            # Se corta en el último salto de línea para no partir caracteres ni filas
+            muestra = muestra[:muestra.rfind(b"\n") + 1] or muestra
+    for codificacion in ("utf-8-sig", "cp1252", "latin-1"):
+        try:
+            texto = muestra.decode(codificacion)
+            break
+        except UnicodeDecodeError:
+            continue
+    lineas = texto.splitlines()
+    if not lineas:
+        return codificacion, ",", []
+    try:
+        separador = csv.Sniffer().sniff("\n".join(lineas[:20]), delimiters=_SEPARADORES).delimiter
+    except csv.Error:
+        separador = ","
+    encabezado = next(csv.reader([lineas[0]], delimiter=separador), [])
+    return codificacion, separador, encabezado
+
+
+def _numerar_bloque(df, leidas):
+    # Numera como si la fila 1 fuera el encabezado y descarta las filas vacías
+    df.index = pd.RangeIndex(leidas, leidas + len(df))
+    return df.dropna(how="all")
+
+
+def leer_csv_por_bloques(ruta, tamano_chunk=CARGA_TAMANO_CHUNK, max_filas=CARGA_MAX_FILAS):
+    """
+    Recorre un CSV por bloques con el lector de pyarrow (o el motor C de pandas).
+
+    Todas las columnas se leen como texto para no perder ceros a la izquierda;
+    la validación hace las conversiones.
+    """
+    codificacion, separador, encabezado = _dialecto_csv(ruta)
+    if not encabezado:
+        return
+    columnas = _normalizar_encabezado([nombre.strip() or None for nombre in encabezado])
+    # Las columnas vacías al final se mantienen para que cada fila calce con el encabezado
+    columnas += [f"Unnamed: {i}" for i in range(len(columnas), len(encabezado))]
+
+    leidas = total = 0
+    for df in _bloques_csv(ruta, codificacion, separador, columnas, tamano_chunk):
+        cantidad = len(df)
+        df = _numerar_bloque(df, leidas)
+        leidas += cantidad
+        total += len(df)
+        if max_filas and total > max_filas:
+            raise ArchivoRechazado(f"El archivo supera el máximo de {max_filas} filas")
+        if not df.empty:
+            yield df
+
+
+def _bloques_csv(ruta, codificacion, separador, columnas, tamano_chunk):
+    try:
+        if pa_csv is not None:
+            lector = pa_csv.open_csv(
+                ruta,
+                read_options=pa_csv.ReadOptions(
+                    # pyarrow lee UTF-8 (con o sin BOM) de forma nativa
+                    encoding="utf8" if codificacion == "utf-8-sig" else codificacion, column_names=columnas, skip_rows=1,
+                    block_size=max(1 << 20, tamano_chunk * 256)
+                ),
+                parse_options=pa_csv.ParseOptions(delimiter=separador),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={nombre: pa.string() for nombre in columnas},
+                    null_values=[""], strings_can_be_null=True
+                ),
+            )
+            pendiente = None
+            for lote in lector:
+                tabla = pa.Table.from_batches([lote])
+                pendiente = tabla if pendiente is None else pa.concat_tables([pendiente, tabla])
+                while pendiente.num_rows >= tamano_chunk:
+                    yield pendiente.slice(0, tamano_chunk).to_pandas()
+                    pendiente = pendiente.slice(tamano_chunk)
+            if pendiente is not None and pendiente.num_rows:
+                yield pendiente.to_pandas()
+        else:
+            with pd.read_csv(
+                ruta, sep=separador, encoding=codificacion, names=columnas, header=None, skiprows=1,
+                dtype=str, keep_default_na=False, na_values=[""], chunksize=tamano_chunk, engine="c"
+            ) as lector:
+                yield from lector
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        # pyarrow.ArrowInvalid hereda de ValueError
+        raise ArchivoRechazado(f"No se pudo leer el archivo como CSV: {e}")
+
+
+def leer_parquet_por_bloques(ruta, tamano_chunk=CARGA_TAMANO_CHUNK, max_filas=CARGA_MAX_FILAS):
+    """Recorre un Parquet por lotes de filas con pyarrow."""
+    if pq is None:
+        raise ArchivoRechazado("El servidor no tiene soporte para Parquet (falta pyarrow)")
+    try:
+        archivo = pq.ParquetFile(ruta)
+    except Exception as e:
+        raise ArchivoRechazado(f"No se pudo leer el archivo como Parquet: {e}")
+    # Los metadatos traen el total de filas, así se rechaza sin leer los datos
+    if max_filas and archivo.metadata.num_rows > max_filas:
+        raise ArchivoRechazado(f"El archivo tiene {archivo.metadata.num_rows} filas y el máximo es {max_filas}")
+
+    columnas = _normalizar_encabezado(archivo.schema_arrow.names)
+    total = 0
+    try:
+        for lote in archivo.iter_batches(batch_size=tamano_chunk):
+            df = lote.to_pandas()
+            df.columns = columnas
+            cantidad = len(df)
+            df = _numerar_bloque(df, total)
+            total += cantidad
+            if not df.empty:
+                yield df
+    finally:
+        archivo.close()
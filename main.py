@@ -1,8 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ejecutor import TiempoAgotado
+from db import ErrorConexion
+from compresion import CompresionMiddleware
+from metricas import MetricasMiddleware, registro as registro_metricas
+from bitacora import CorrelacionMiddleware
 # Importar los routers (planificacion y recoleccion)
-from planificacion.routes import reco_router as planificacion_router
+from planificacion.routes import reco_router as planificacion_router, instantanea_dataframe
 from recoleccion.routes import reco_router as recoleccion_router
+from diagnostico.routes import diag_router
+from trabajos.routes import trab_router
+from exportacion.routes import expo_router
+from mantenimiento.routes import mant_router
+from trabajos.registro import marcar_interrumpidos
 
 # Crear instancia
 app = FastAPI()
@@ -15,7 +26,39 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Comprimir respuestas (gzip o Brotli) a partir de COMPRESION_MINIMO bytes
+app.add_middleware(CompresionMiddleware)
+# Latencia por ruta; va por fuera de todo para medir también la compresión
+app.add_middleware(MetricasMiddleware)
+# Id de correlación de los logs (X-Request-ID)
+app.add_middleware(CorrelacionMiddleware)
 
 # Incluir routers
 app.include_router(planificacion_router, prefix="/planificacion")
 app.include_router(recoleccion_router, prefix="/recoleccion")
+app.include_router(diag_router, prefix="/diagnostico")
+app.include_router(trab_router, prefix="/jobs")
+app.include_router(expo_router, prefix="/exportacion")
+app.include_router(mant_router, prefix="/mantenimiento")
+
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registro_metricas.exponer(), media_type="text/plain; version=0.0.4")
+
+# Las cargas que quedaron a medias en el proceso anterior no se van a terminar;
+# la copia en memoria del Dataframe se arma en segundo plano
+@app.on_event("startup")
+async def al_iniciar():
+    marcar_interrumpidos()
+    instantanea_dataframe.recargar_en_segundo_plano()
+
+# Las operaciones que superan su tiempo máximo responden igual que los demás errores
+@app.exception_handler(TiempoAgotado)
+async def tiempo_agotado(request: Request, exc: TiempoAgotado):
+    return JSONResponse(status_code=504, content={"status": 0, "error": str(exc)})
+
+# Sin conexión a la base (pool agotado o SQL Server caído) se responde 503
+@app.exception_handler(ErrorConexion)
+async def error_conexion(request: Request, exc: ErrorConexion):
+    return JSONResponse(status_code=503, content={"status": 0, "error": str(exc)})
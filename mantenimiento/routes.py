@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Query
+from ejecutor import run_db, DB_TIMEOUT_CARGA
+from historial import purgar_historial, depuraciones, HISTORIAL_RETENCION_DIAS, HISTORIAL_TAMANO_LOTE
+
+mant_router = APIRouter()
+
+@mant_router.get("/historial")
+def estado_historial():
+    return {
+        "status": 1,
+        "retencion_dias": HISTORIAL_RETENCION_DIAS,
+        "tamano_lote": HISTORIAL_TAMANO_LOTE,
+        "depuraciones": depuraciones()
+    }
+
+@mant_router.post("/historial/purga")
+async def purgar(
+    # Días que se conservan; por defecto HISTORIAL_RETENCION_DIAS
+    retencion_dias: Optional[int] = Query(None, ge=1)
+):
+    try:
+        resumen = await run_db(purgar_historial, retencion_dias, timeout=DB_TIMEOUT_CARGA, escritura=True)
+    except Exception as e:
+        return {"status": 0, "error": str(e)}
+    if resumen is None:
+        return {"status": 0, "message": "La retención del Historial está deshabilitada (HISTORIAL_RETENCION_DIAS=0)"}
+    return {"status": 1, "purga": resumen}
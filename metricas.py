@@ -0,0 +1,283 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from db import pool_stats
+from estadisticas_sql import observador
+from bitacora import obtener_logger
+
+log = obtener_logger(__name__)
+
+# Buckets en segundos para requests y consultas, y para etapas de carga (más largas)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_ETAPA = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BUCKETS_BYTES = (10_000, 100_000, 1_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000)
+BUCKETS_FILAS_SEGUNDO = (100, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000)
+# Sentencias normalizadas con serie propia en /metrics; las que aparecen después van a "<otras>"
+METRICAS_SQL_MAX = int(os.getenv("METRICAS_SQL_MAX", "50"))
+# Largo máximo de la sentencia usada como etiqueta
+METRICAS_SQL_LARGO = int(os.getenv("METRICAS_SQL_LARGO", "200"))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=""):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            valores = list(self._valores.items())
+        for clave, valor in sorted(valores):
+            lineas.extend(self._lineas(clave, valor))
+        return lineas
+
+    def _lineas(self, clave, valor):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+
+class Indicador(_Metrica):
+    tipo = "gauge"
+
+    def set(self, valor, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                serie = self._valores[clave] = {"buckets": [0] * len(self.buckets), "suma": 0.0, "cuenta": 0}
+            posicion = bisect.bisect_left(self.buckets, valor)
+            if posicion < len(self.buckets):
+                serie["buckets"][posicion] += 1
+            serie["suma"] += valor
+            serie["cuenta"] += 1
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **etiquetas)
+
+    def _lineas(self, clave, serie):
+        lineas = []
+        acumulado = 0
+        limites = [*self.buckets, float("inf")]
+        cantidades = [*serie["buckets"], serie["cuenta"] - sum(serie["buckets"])]
+        for limite, cantidad in zip(limites, cantidades):
+            acumulado += cantidad
+            le = 'le="' + _numero(limite) + '"'
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+        lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(serie['suma'])}")
+        lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie['cuenta']}")
+        return lineas
+
+
+class Registro:
+    """
+    Registro de métricas en formato de texto de Prometheus.
+
+    Los recolectores son funciones que se llaman en cada scrape para
+    actualizar indicadores que se leen de otro lado (p. ej. el pool).
+    """
+
+    def __init__(self):
+        self._metricas = []
+        self._recolectores = []
+
+    def _agregar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Contador(nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Indicador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._agregar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def recolector(self, funcion):
+        self._recolectores.append(funcion)
+        return funcion
+
+    def exponer(self):
+        for recolector in self._recolectores:
+            try:
+                recolector()
+            except Exception:
+                log.warning("Error en recolector de métricas", exc_info=True)
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+http_duracion = registro.histograma(
+    "http_request_duration_seconds", "Duración de los requests HTTP por ruta", ("metodo", "ruta", "estado")
+)
+db_operacion_duracion = registro.histograma(
+    "db_operacion_duracion_seconds", "Duración de las funciones ejecutadas en el executor de base de datos",
+    ("operacion",)
+)
+carga_etapa_duracion = registro.histograma(
+    "carga_etapa_duracion_seconds", "Duración de cada etapa de una carga", ("carga", "etapa"), buckets=BUCKETS_ETAPA
+)
+carga_filas = registro.contador("carga_filas_insertadas_total", "Filas insertadas por tipo de carga", ("carga",))
+carga_filas_por_segundo = registro.histograma(
+    "carga_filas_por_segundo", "Filas insertadas por segundo en cada carga", ("carga",), buckets=BUCKETS_FILAS_SEGUNDO
+)
+carga_bytes = registro.histograma(
+    "carga_archivo_bytes", "Tamaño de los archivos subidos", ("carga",), buckets=BUCKETS_BYTES
+)
+cargas_total = registro.contador("cargas_total", "Cargas terminadas por resultado", ("carga", "resultado"))
+carga_espera_cola = registro.histograma(
+    "carga_espera_cola_seconds", "Espera de cada carga hasta tener turno para su clave", ("carga",),
+    buckets=BUCKETS_ETAPA
+)
+carga_cola = registro.indicador("carga_cola_pendientes", "Cargas esperando turno por tipo", ("carga",))
+cargas_deduplicadas = registro.contador(
+    "cargas_deduplicadas_total", "Cargas repetidas que no se ejecutaron de nuevo", ("carga", "motivo")
+)
+historial_filas_purgadas = registro.contador(
+    "historial_filas_purgadas_total", "Filas borradas de APP_SALESFORCE_HISTORIAL", ("motivo",)
+)
+db_sentencia_duracion = registro.histograma(
+    "db_sentencia_duracion_seconds", "Duración de cada sentencia SQL (execute y fetch), por sentencia normalizada",
+    ("sentencia",)
+)
+db_sentencia_errores = registro.contador(
+    "db_sentencia_errores_total", "Sentencias SQL que terminaron en error, por sentencia normalizada", ("sentencia",)
+)
+db_sentencia_filas = registro.contador(
+    "db_sentencia_filas_total", "Filas leídas o afectadas, por sentencia normalizada", ("sentencia",)
+)
+pool_conexiones = registro.indicador("db_pool_conexiones", "Conexiones del pool por estado", ("estado",))
+pool_eventos = registro.indicador(
+    "db_pool_eventos", "Contadores acumulados del pool (préstamos, conexiones creadas, timeouts...)", ("evento",)
+)
+
+
+@registro.recolector
+def _recolectar_pool():
+    datos = pool_stats()
+    for estado in ("abiertas", "libres", "en_uso", "minimo", "maximo"):
+        pool_conexiones.set(datos.pop(estado), estado=estado)
+    for evento, valor in datos.items():
+        pool_eventos.set(valor, evento=evento)
+
+
+# sentencia normalizada -> etiqueta; se llena hasta METRICAS_SQL_MAX y no se vacía,
+# así cada sentencia conserva su serie aunque se reinicien las estadísticas de /diagnostico/sql
+_etiquetas_sql = {}
+_etiquetas_sql_lock = threading.Lock()
+
+
+def _etiqueta_sql(sentencia):
+    etiqueta = _etiquetas_sql.get(sentencia)
+    if etiqueta is not None:
+        return etiqueta
+    with _etiquetas_sql_lock:
+        if sentencia not in _etiquetas_sql:
+            if len(_etiquetas_sql) >= METRICAS_SQL_MAX:
+                return "<otras>"
+            etiqueta = sentencia
+            if len(etiqueta) > METRICAS_SQL_LARGO:
+                # El resumen evita que dos sentencias con el mismo comienzo compartan serie
+                resumen = hashlib.sha1(sentencia.encode()).hexdigest()[:8]
+                etiqueta = f"{etiqueta[:METRICAS_SQL_LARGO]}... #{resumen}"
+            _etiquetas_sql[sentencia] = etiqueta
+        return _etiquetas_sql[sentencia]
+
+
+@observador
+def _observar_sentencia(sentencia, duracion, filas, error):
+    etiqueta = _etiqueta_sql(sentencia)
+    db_sentencia_duracion.observe(duracion, sentencia=etiqueta)
+    if filas:
+        db_sentencia_filas.inc(max(filas, 0), sentencia=etiqueta)
+    if error is not None:
+        db_sentencia_errores.inc(sentencia=etiqueta)
+
+
+class MetricasMiddleware:
+    """
+    Middleware ASGI que mide la duración de cada request.
+
+    La ruta se toma de la plantilla del endpoint (p. ej. /datos_actualizados/{id_carga})
+    para no crear una serie por cada valor de los parámetros.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        estado = {"codigo": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path", None) or "sin_ruta"
+            http_duracion.observe(
+                time.perf_counter() - inicio, metodo=scope["method"], ruta=plantilla, estado=estado["codigo"]
+            )
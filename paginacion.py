@@ -0,0 +1,144 @@
+import base64
+import json
+import os
+from serializacion import armar_datos
+
+# Páginas que se muestran a cada lado de la actual en los enlaces
+PAGINACION_VENTANA = int(os.getenv("PAGINACION_VENTANA", "2"))
+
+SIGUIENTE = "sig"
+ANTERIOR = "ant"
+
+
+class CursorInvalido(Exception):
+    """El cursor de paginación no es válido o no corresponde a la consulta."""
+
+
+def codificar_cursor(datos):
+    texto = json.dumps(datos, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(token):
+    try:
+        relleno = "=" * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno))
+        if not isinstance(datos, dict) or datos.get("d") not in (SIGUIENTE, ANTERIOR):
+            raise ValueError(token)
+        int(datos["id"])
+        int(datos["p"])
+        return datos
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorInvalido("El cursor de paginación no es válido") from e
+
+
+def consultar_pagina(cursor, tabla, condicion, parametros, page, size, datos_cursor=None, fecha=None, formato=None):
+    """
+    Lee una página ordenada por id_carga.
+
+    Con cursor busca por clave (id_carga > último / < primero), así el costo no
+    depende de qué tan profunda sea la página. Sin cursor usa OFFSET, que para
+    las primeras páginas es igual de barato.
+
+    Args:
+        cursor: Cursor de pyodbc
+        tabla: Tabla a consultar
+        condicion: Filtro SQL sin el id_carga (p. ej. "fecha_carga = ? AND RUC = ?")
+        parametros: Parámetros del filtro
+        page: Página pedida cuando no hay cursor
+        size: Filas por página
+        datos_cursor: Cursor recibido del cliente, ya decodificado
+        fecha: fecha_carga consultada, se guarda en los cursores generados
+        formato: "columnar" para devolver los datos como {columna: [valores]}
+
+    Returns:
+        dict: datos, cantidad (filas leídas), page, next_cursor y prev_cursor
+    """
+    if datos_cursor:
+        page = datos_cursor["p"]
+        if datos_cursor["d"] == SIGUIENTE:
+            cursor.execute(f"""
+                SELECT TOP (?) * FROM {tabla}
+                WHERE {condicion} AND id_carga > ?
+                ORDER BY id_carga
+            """, (size + 1, *parametros, datos_cursor["id"]))
+            filas = cursor.fetchall()
+            hay_anterior, hay_siguiente = True, len(filas) > size
+            filas = filas[:size]
+        else:
+            cursor.execute(f"""
+                SELECT TOP (?) * FROM {tabla}
+                WHERE {condicion} AND id_carga < ?
+                ORDER BY id_carga DESC
+            """, (size + 1, *parametros, datos_cursor["id"]))
+            filas = cursor.fetchall()
+            hay_anterior, hay_siguiente = len(filas) > size, True
+            filas = list(reversed(filas[:size]))
+    else:
+        cursor.execute(f"""
+            SELECT * FROM {tabla}
+            WHERE {condicion}
+            ORDER BY id_carga
+            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+        """, (*parametros, (page - 1) * size, size + 1))
+        filas = cursor.fetchall()
+        hay_anterior, hay_siguiente = page > 1, len(filas) > size
+        filas = filas[:size]
+
+    columnas = [column[0] for column in cursor.description]
+    datos = armar_datos(columnas, filas, formato)
+    posicion_id = columnas.index("id_carga")
+    siguiente = anterior = None
+    if filas and hay_siguiente:
+        siguiente = codificar_cursor({"d": SIGUIENTE, "id": filas[-1][posicion_id], "p": page + 1, "f": fecha})
+    if filas and hay_anterior:
+        anterior = codificar_cursor({"d": ANTERIOR, "id": filas[0][posicion_id], "p": page - 1, "f": fecha})
+    return {"datos": datos, "cantidad": len(filas), "page": page, "next_cursor": siguiente, "prev_cursor": anterior}
+
+
+def armar_links(base_url, page, size, total, next_cursor=None, prev_cursor=None, ventana=PAGINACION_VENTANA):
+    """
+    Arma los enlaces de paginación con una ventana alrededor de la página actual.
+
+    Muestra la primera y la última página, las `ventana` páginas a cada lado de
+    la actual y "..." en los huecos. « y » usan el cursor cuando lo hay.
+    Sin total (contar=false) solo se arman « y ».
+    """
+    separador = "&" if "?" in base_url else "?"
+
+    def url_pagina(numero):
+        return f"{base_url}{separador}page={numero}&size={size}"
+
+    def url_cursor(token):
+        return f"{base_url}{separador}cursor={token}&size={size}"
+
+    links = []
+    if prev_cursor:
+        links.append({"url": url_cursor(prev_cursor), "label": "«", "active": False})
+    elif page > 1:
+        links.append({"url": url_pagina(page - 1), "label": "«", "active": False})
+    else:
+        links.append({"url": None, "label": "«", "active": False})
+
+    if total is not None:
+        total_pages = (total + size - 1) // size
+        desde = max(1, page - ventana)
+        hasta = min(total_pages, page + ventana)
+        numeros = sorted({1, total_pages, *range(desde, hasta + 1)}) if total_pages else []
+        anterior = 0
+        for numero in numeros:
+            if numero - anterior > 1:
+                links.append({"url": None, "label": "...", "active": False})
+            links.append({"url": url_pagina(numero), "label": str(numero), "active": numero == page})
+            anterior = numero
+        hay_siguiente = next_cursor is not None or page < total_pages
+    else:
+        hay_siguiente = next_cursor is not None
+
+    if next_cursor:
+        links.append({"url": url_cursor(next_cursor), "label": "»", "active": False})
+    elif hay_siguiente:
+        links.append({"url": url_pagina(page + 1), "label": "»", "active": False})
+    else:
+        links.append({"url": None, "label": "»", "active": False})
+    return links
@@ -1,16 +1,70 @@
 from fastapi import File, UploadFile, Form
-import pandas as pd
 from typing import List, Optional
-from fastapi import Query
+from fastapi import Query, Request
 from datetime import date, time,datetime
-from io import BytesIO
-from difflib import SequenceMatcher
 import traceback
 from db import get_db_connection
-import re
+from carga_masiva import insertar_en_lotes, columnas_a_parametros, fila_a_dict, ErrorFilaCarga
+from lectura import recibir_archivo, leer_por_bloques, ArchivoRechazado
+from trabajos.registro import despachar_carga
+from deduplicacion import nueva_huella, clave_carga
+from planificador import CLAVE_COLA_DATAFRAME
+from cache import leer_cacheado, invalidar_lecturas
+from versiones import consulta_condicional, incrementar_version
+from respuestas import stream_condicional, FORMATOS_STREAM
+from serializacion import armar_datos
+from columnar import archivar_historial, ARCHIVO_HISTORIAL_DIR
+from historial import TABLA_HISTORIAL, hora_servidor, reemplazar_dia, purgar_si_corresponde
+from paginacion import consultar_pagina, armar_links, decodificar_cursor
+from validacion import Esquema, Columna, AcumuladorErrores, respuesta_validacion, en_hoja, VALORES_VACIOS
+from bitacora import obtener_logger, Muestreo
+from instantanea import GestorInstantanea
+from incremental import (
+    MODO_COMPLETO, MODO_INCREMENTAL, MODOS_CARGA, leer_actuales, calcular_diferencias, aplicar_diferencias
+)
+import os
 from fastapi import APIRouter
 
 reco_router = APIRouter()
+log = obtener_logger(__name__)
+
+TABLA_DATAFRAME = "apl_imperio.APP_SALESFORCE_Dataframe"
+TABLA_STAGING = "apl_imperio.APP_SALESFORCE_Dataframe_Staging"
+TABLA_ANTERIOR = "apl_imperio.APP_SALESFORCE_Dataframe_Anterior"
+# "switch": carga en staging y publica con ALTER TABLE SWITCH; "truncate": carga directa
+CARGA_PUBLICACION = os.getenv("CARGA_PUBLICACION", "switch").lower()
+_tablas_staging_listas = False
+# Copia en memoria de la tabla publicada; las lecturas la usan mientras esté al día
+instantanea_dataframe = GestorInstantanea(TABLA_DATAFRAME)
+
+SQL_INSERT_DATAFRAME = """
+    INSERT INTO {tabla}
+    (fecha, Seller_ID, Seller, Placa, Flujo, Cita, nombre_flujo, fecha_carga, hora_carga)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Columnas de la tabla en el orden del INSERT; la clave natural es Placa + Seller_ID + fecha
+COLUMNAS_DATAFRAME = ["fecha", "Seller_ID", "Seller", "Placa", "Flujo", "Cita", "nombre_flujo", "fecha_carga", "hora_carga"]
+CLAVE_DATAFRAME = (3, 1, 0)
+# hora_carga cambia en cada subida: no cuenta como cambio de la fila
+IGNORAR_DATAFRAME = (8,)
+SQL_INSERT_DATAFRAME_TVP = """
+    INSERT INTO {tabla}
+    (fecha, Seller_ID, Seller, Placa, Flujo, Cita, nombre_flujo, fecha_carga, hora_carga)
+    SELECT * FROM ?
+"""
+# Tipo de tabla (esquema.tipo) para el modo "tvp"; vacío lo deshabilita
+CARGA_TVP_DATAFRAME = os.getenv("CARGA_TVP_DATAFRAME")
+
+# Columnas del archivo, en el orden del INSERT. max_longitud es el ancho de la columna
+# en APP_SALESFORCE_Dataframe: si cambia el DDL hay que ajustarlo aquí
+ESQUEMA_DATAFRAME = Esquema("Dataframe", [
+    Columna("Fecha", tipo="fecha"),
+    Columna("Seller_ID", max_longitud=50),
+    Columna("Seller", max_longitud=200),
+    Columna("Placa", max_longitud=10),
+    Columna("Flujo", max_longitud=50),
+    Columna("Cita", tipo="entero", requerido=False, similitud=0.75, vacios=VALORES_VACIOS),
+])
 
 @reco_router.get('/')
 def prueba():
@@ -21,124 +75,177 @@ async def upload_excel(
     file: UploadFile = File(...),
     fecha_carga: date = Form(...),
     hora_carga: time = Form(...),
-    nombre_flujo: str = Form(...)
+    nombre_flujo: str = Form(...),
+    # Si es True responde con el id del trabajo y la carga sigue en segundo plano
+    asincrono: bool = Form(False),
+    # "incremental" compara con la tabla y solo escribe las filas que cambiaron
+    modo_carga: str = Form(MODO_COMPLETO),
+    # Si es True carga todas las hojas del .xlsx (leídas en paralelo), no solo la primera
+    todas_las_hojas: bool = Form(False)
 ):
-    contents = await file.read()
-    df = pd.read_excel(BytesIO(contents))
-
-    # Limpieza de columna Cita
-    col_cita = encontrar_columna_similar(df, "Cita", 0.75)
-    if col_cita:
-        print(f"Columna detectada similar a 'Cita': '{col_cita}'")
-        # Renombrar la columna a "Cita" para trabajar con ella más fácil
-        df.rename(columns={col_cita: "Cita"}, inplace=True)
-    else:
-        print("No se encontró una columna similar a 'Cita'")
-    
-    
-    if 'Cita' in df.columns:
-        df['Cita'] = df['Cita'].apply(lambda x: "" if pd.isna(x) or str(x).strip() in ["", "-", " ", "'-"] else x)
-        df['Cita'] = df['Cita'].fillna('')
-    else:
-        pass
-    
-    df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce', dayfirst=True).dt.date
-
-    # Verificación de columnas vacías
-    empty_data = {}
-    for column in df.columns:
-        empty_rows = df[df[column].isnull()].index.tolist()
-        if empty_rows:
-            empty_data[column] = [i + 2 for i in empty_rows]
-
-    if empty_data:
-        return {
-            "status": 0,
-            "message": "El archivo contiene campos vacíos en las siguientes columnas:",
-            "empty_columns": list(empty_data.keys()),
-            "empty_cells": empty_data
-        }
+    if modo_carga not in MODOS_CARGA:
+        return {"status": 0, "message": f"modo_carga debe ser uno de: {', '.join(MODOS_CARGA)}"}
+    huella = nueva_huella()
+    try:
+        ruta, formato = await recibir_archivo(file, huella=huella)
+    except ArchivoRechazado as e:
+        return {"status": 0, "message": str(e)}
+    # Una subida repetida (mismo archivo y formulario) devuelve el resultado de la primera
+    clave = clave_carga(
+        "dataframe", huella, nombre_flujo=nombre_flujo, fecha_carga=fecha_carga, modo_carga=modo_carga,
+        todas_las_hojas=todas_las_hojas
+    )
 
+    # El temporal lo borra el trabajo al terminar
+    return await despachar_carga(
+        "dataframe", ruta, _cargar_dataframe, fecha_carga, hora_carga, nombre_flujo, formato, modo_carga,
+        todas_las_hojas,
+        asincrono=asincrono, deduplicar=("dataframe", clave),
+        cola=CLAVE_COLA_DATAFRAME
+    )
+
+def _cargar_dataframe(ruta, fecha_carga, hora_carga, nombre_flujo, formato=None, modo_carga=MODO_COMPLETO,
+                      todas_las_hojas=False, progreso=None):
     session = get_db_connection()
     errores = []
+    errores_validacion = AcumuladorErrores()
+    # Los mensajes por bloque y por lote se registran muestreados (LOG_MUESTREO_FILAS)
+    muestreo = Muestreo(log)
+    renombres = {}
+    # En modo incremental se junta todo el archivo y se escribe solo la diferencia al final
+    incremental = modo_carga == MODO_INCREMENTAL
+    nuevas = []
+    filas_archivo = []
+    diferencias = None
+    # Con "switch" la carga va a staging y los lectores siguen viendo la versión anterior
+    publicar_con_switch = CARGA_PUBLICACION == "switch" and not incremental
+    tabla_carga = TABLA_STAGING if publicar_con_switch else TABLA_DATAFRAME
 
     try:
         cursor = session.cursor()
-        hoy = datetime.now().strftime("%Y-%m-%d")
 
-        # Eliminar historial del día actual
-        cursor.execute("""
-            DELETE FROM apl_imperio.APP_SALESFORCE_Historial 
-            WHERE CONVERT(DATE, fecha_backup) = ?
-        """, (hoy,))
+        if publicar_con_switch:
+            _asegurar_tablas_staging(session)
+            cursor.execute(f"TRUNCATE TABLE {TABLA_STAGING}")
+        elif not incremental:
+            # Truncar tabla principal
+            cursor.execute(f"TRUNCATE TABLE {TABLA_DATAFRAME}")
 
-        # Truncar tabla principal
-        cursor.execute("TRUNCATE TABLE apl_imperio.APP_SALESFORCE_Dataframe")
+        if progreso:
+            progreso.etapa("cargando")
+        # Leer, validar e insertar el archivo por bloques
+        hoja_anterior = None
+        for numero_bloque, df in enumerate(leer_por_bloques(ruta, formato, todas_las_hojas=todas_las_hojas)):
+            # Cada hoja trae su propio encabezado
+            hoja = df.attrs.get("hoja")
+            if numero_bloque == 0 or hoja != hoja_anterior:
+                hoja_anterior = hoja
+                renombres, faltantes = ESQUEMA_DATAFRAME.resolver_encabezados(df.columns)
+                for encabezado, nombre in renombres.items():
+                    log.info("Columna detectada similar a '%s': '%s'", nombre, encabezado)
+                if faltantes:
+                    errores_validacion.agregar(en_hoja(faltantes, hoja))
+                    break
 
-        # Insertar cada fila del DataFrame
-        for index, row in df.iterrows():
-            try:
-                if pd.isna(row['Fecha']):
-                    raise ValueError("Fecha vacía")
-                row['Seller_ID'] = str(row['Seller_ID'])                
-                if 'Cita' in row.index:  # Verifica si 'Cita' está en las columnas
-                    cita_valor = row['Cita']
-                    if cita_valor is None or str(cita_valor).strip() in ["", "-", "'-", "nan", "None"]:
-                        cita_convertido = None
-                    else:
-                        try:
-                            cita_convertido = int(float(str(cita_valor).strip()))
-                        except Exception as cita_error:
-                            raise ValueError(f"Error en campo 'Cita' con valor '{cita_valor}': {cita_error}")
-                else:
-                    cita_convertido = None
-                valores = (
-                    row['Fecha'], row['Seller_ID'], row['Seller'], row['Placa'],
-                    row['Flujo'], cita_convertido, nombre_flujo, fecha_carga, hora_carga
+            df = df.rename(columns=renombres)
+            muestreo.debug("bloque", "Bloque %d: %d filas", numero_bloque + 1, len(df), extra={"hoja": hoja})
+            convertido, errores_bloque = ESQUEMA_DATAFRAME.validar(df)
+            errores_validacion.agregar(en_hoja(errores_bloque, hoja))
+            if errores_bloque:
+                muestreo.warning(
+                    "validacion", "Bloque %d con %d errores de validación", numero_bloque + 1, len(errores_bloque),
+                    extra={"hoja": hoja}
                 )
+            if progreso:
+                progreso.sumar_filas(len(df))
+            # Con errores ya no se inserta, solo se siguen revisando los bloques
+            if errores_validacion:
+                continue
 
-                cursor.execute("""
-                    INSERT INTO apl_imperio.APP_SALESFORCE_Dataframe
-                    (fecha, Seller_ID, Seller, Placa, Flujo, Cita, nombre_flujo, fecha_carga, hora_carga)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, valores)
-
-            except Exception as e:
+            try:
+                parametros = _parametros_dataframe(convertido, fecha_carga, hora_carga, nombre_flujo)
+                if incremental:
+                    nuevas.extend(parametros)
+                    filas_archivo.extend((int(index) + 2, hoja) for index in df.index)
+                    continue
+                insertar_en_lotes(
+                    cursor, SQL_INSERT_DATAFRAME.format(tabla=tabla_carga), parametros,
+                    sql_tvp=SQL_INSERT_DATAFRAME_TVP.format(tabla=tabla_carga), tipo_tvp=CARGA_TVP_DATAFRAME,
+                    muestreo=muestreo
+                )
+            except ErrorFilaCarga as e:
+                row = fila_a_dict(df.iloc[e.posicion])
+                index = int(df.index[e.posicion])
                 mensaje_error = str(e)
-                columna_error, valor_error = identificar_columna_y_valor_error(mensaje_error, row)
-                errores.append({
+                columna_error, valor_error = ESQUEMA_DATAFRAME.identificar_error(mensaje_error, row)
+                errores.extend(en_hoja([{
                     "fila": index + 2,
                     "detalle": mensaje_error,
-                    "fila_contenido": row.to_dict(),
+                    "fila_contenido": row,
                     "columna_problematica": columna_error,
                     "valor_problematico": valor_error
-                })
-                print("❌ Error en fila", index + 2, ":", mensaje_error)
+                }], hoja))
+                log.warning("Error en fila %d: %s", index + 2, mensaje_error)
                 raise
 
-        # Insertar en historial
-        cursor.execute("""
-            INSERT INTO apl_imperio.APP_SALESFORCE_HISTORIAL (
+        if errores_validacion:
+            session.rollback()
+            return respuesta_validacion(errores_validacion)
+
+        if incremental:
+            diferencias = _aplicar_incremental(cursor, nuevas, filas_archivo, errores, progreso)
+
+        if progreso:
+            progreso.etapa("historial")
+        if publicar_con_switch:
+            # La carga queda confirmada en staging; nadie la lee todavía
+            session.commit()
+
+        # Insertar en historial; las copias anteriores del día (fecha_backup antes de esta
+        # hora) se borran por lotes después del commit, fuera de esta transacción. El día
+        # sale del mismo reloj que fecha_backup (SQL Server), no del de la API
+        marca_historial = hora_servidor(cursor)
+        hoy = marca_historial.date()
+        cursor.execute(f"""
+            INSERT INTO {TABLA_HISTORIAL} (
                 fecha, Seller_ID, Seller, Placa, Flujo, Cita,
                 nombre_flujo, fecha_carga, hora_carga, id_carga
             )
             SELECT fecha, Seller_ID, Seller, Placa, Flujo, Cita,
                    nombre_flujo, fecha_carga, hora_carga, id_carga
-            FROM apl_imperio.APP_SALESFORCE_Dataframe
+            FROM {tabla_carga}
         """)
 
+        if publicar_con_switch:
+            if progreso:
+                progreso.etapa("publicando")
+            _publicar_staging(cursor)
+
         session.commit()
+        _depurar_historial(session, hoy, marca_historial, progreso)
+        # Una carga incremental sin cambios deja la tabla igual: los ETag y cachés siguen valiendo
+        if diferencias is None or diferencias.cambios:
+            invalidar_lecturas(TABLA_DATAFRAME)
+            incrementar_version(TABLA_DATAFRAME)
+            # Se arma en otro hilo y con su propia conexión; hasta que esté lista se lee de la base
+            instantanea_dataframe.recargar_en_segundo_plano()
+        _archivar(session, hoy, progreso)
 
-        return {
+        respuesta = {
             "status": 1,
             "message": "Todos los registros fueron insertados correctamente."
         }
+        if diferencias is not None:
+            respuesta["incremental"] = diferencias.resumen()
+        return respuesta
+
+    except ArchivoRechazado as e:
+        session.rollback()
+        return {"status": 0, "message": str(e)}
 
     except Exception as e:
         session.rollback()
-        print("❌ Error general:", str(e))
-        print("📛 Traceback:")
-        print(traceback.format_exc())
+        log.exception("Error general en la carga del Dataframe")
         return {
             "status": 0,
             "message": "❌ Ocurrió un error y no se insertó nada.",
@@ -150,162 +257,243 @@ async def upload_excel(
     finally:
         session.close()
 
-def encontrar_columna_similar(df, referencia="Cita", umbral=0.75):
-    for col in df.columns:
-        ratio = SequenceMatcher(None, referencia, col).ratio()
-        if ratio >= umbral:
-            return col
-    return None
-        
-def identificar_columna_y_valor_error(mensaje_error, fila):
+def _aplicar_incremental(cursor, nuevas, filas_archivo, errores, progreso):
+    """Escribe en la tabla solo lo que cambió respecto de la carga anterior."""
+    if progreso:
+        progreso.etapa("comparando")
+    actuales = leer_actuales(cursor, TABLA_DATAFRAME, COLUMNAS_DATAFRAME)
+    diferencias = calcular_diferencias(actuales, nuevas, CLAVE_DATAFRAME, IGNORAR_DATAFRAME)
+    del actuales
+    log.info("Carga incremental del Dataframe", extra=diferencias.resumen())
+
+    if progreso:
+        progreso.etapa("escribiendo")
+    try:
+        aplicar_diferencias(
+            cursor, diferencias, nuevas, TABLA_DATAFRAME, COLUMNAS_DATAFRAME,
+            SQL_INSERT_DATAFRAME.format(tabla=TABLA_DATAFRAME), f"TRUNCATE TABLE {TABLA_DATAFRAME}",
+            sql_tvp=SQL_INSERT_DATAFRAME_TVP.format(tabla=TABLA_DATAFRAME), tipo_tvp=CARGA_TVP_DATAFRAME
+        )
+    except ErrorFilaCarga as e:
+        row = dict(zip(ESQUEMA_DATAFRAME.nombres, nuevas[e.posicion]))
+        mensaje_error = str(e)
+        columna_error, valor_error = ESQUEMA_DATAFRAME.identificar_error(mensaje_error, row)
+        fila, hoja = filas_archivo[e.posicion]
+        errores.extend(en_hoja([{
+            "fila": fila,
+            "detalle": mensaje_error,
+            "fila_contenido": row,
+            "columna_problematica": columna_error,
+            "valor_problematico": valor_error
+        }], hoja))
+        log.warning("Error en fila %d: %s", fila, mensaje_error)
+        raise
+    return diferencias
+
+def _depurar_historial(session, hoy, marca_historial, progreso):
+    # La carga ya quedó confirmada: si la depuración falla se reintenta en la próxima
+    if progreso:
+        progreso.etapa("depurando_historial")
+    try:
+        reemplazar_dia(session, hoy, marca_historial)
+        purgar_si_corresponde(session)
+    except Exception:
+        session.rollback()
+        log.warning("No se pudo depurar el Historial", exc_info=True)
+
+def _archivar(session, dia, progreso):
+    # El archivo local es opcional: si falla, la carga ya quedó confirmada igual
+    if not ARCHIVO_HISTORIAL_DIR:
+        return
+    if progreso:
+        progreso.etapa("archivando")
+    try:
+        filas = archivar_historial(session, dia)
+        log.info("Historial archivado: %d filas", filas)
+    except Exception:
+        log.warning("No se pudo archivar el historial", exc_info=True)
+
+def _asegurar_tablas_staging(session):
     """
-    Identifica la columna y el valor que están causando el error.
-    
-    Args:
-        mensaje_error: Mensaje de error capturado
-        fila: Fila de datos que estaba siendo procesada cuando ocurrió el error
-        
-    Returns:
-        tuple: (columna_error, valor_error)
+    Crea las tablas de staging y de la versión anterior si no existen.
+
+    Se crean con la misma estructura de columnas que APP_SALESFORCE_Dataframe.
+    ALTER TABLE ... SWITCH exige además los mismos índices, así que si la tabla
+    principal tiene índices o PK deben replicarse en ambas tablas.
     """
-    # Columnas a verificar y sus valores en la fila
-    columnas = {'Seller_ID': fila['Seller_ID'], 
-                'Seller': fila['Seller'], 
-                'Placa': fila['Placa'], 
-                'Flujo': fila['Flujo'], 
-                'Cita': fila['Cita'],
-                'Fecha': fila['Fecha']}
-    
-    # Intentar extraer el valor problemático del mensaje de error
-    valor_problema = None
-    match = re.search(r"value '([^']+)'", mensaje_error)
-    if match:
-        valor_problema = match.group(1)
-        
-        # Si encontramos el valor problemático, buscamos en qué columna está
-        for columna, valor in columnas.items():
-            # Convertir ambos a string para comparación
-            if str(valor) == valor_problema:
-                return columna, valor_problema
-    
-    # Si no encontramos el valor, buscamos por nombre de columna en el mensaje
-    for columna in columnas.keys():
-        if columna in mensaje_error:
-            return columna, columnas[columna]
-    
-    # Si aún no encontramos, intentamos con otros patrones
-    if "Seller_ID" in mensaje_error or "SellerID" in mensaje_error:
-        return "Seller_ID", columnas["Seller_ID"]
-    elif "Placa" in mensaje_error:
-        return "Placa", columnas["Placa"]
-    elif "fecha" in mensaje_error.lower() or "date" in mensaje_error.lower():
-        return "Fecha", columnas["Fecha"]
-    elif "Cita" in mensaje_error:
-        return "Cita", columnas["Cita"]
-    
-    # No se identifica la columna específica
-    return "No identificada", valor_problema if valor_problema else "Desconocido"
+    global _tablas_staging_listas
+    if _tablas_staging_listas:
+        return
+    cursor = session.cursor()
+    for tabla in (TABLA_STAGING, TABLA_ANTERIOR):
+        cursor.execute(f"""
+            IF OBJECT_ID(N'{tabla}', N'U') IS NULL
+                SELECT TOP (0) * INTO {tabla} FROM {TABLA_DATAFRAME}
+        """)
+    session.commit()
+    _tablas_staging_listas = True
+
+def _publicar_staging(cursor):
+    """
+    Publica staging como la nueva APP_SALESFORCE_Dataframe.
+
+    Los dos SWITCH solo cambian metadatos, así que el bloqueo sobre la tabla
+    que leen /datos y /datos-actualizados dura milisegundos.
+    """
+    cursor.execute(f"TRUNCATE TABLE {TABLA_ANTERIOR}")
+    cursor.execute(f"ALTER TABLE {TABLA_DATAFRAME} SWITCH TO {TABLA_ANTERIOR}")
+    cursor.execute(f"ALTER TABLE {TABLA_STAGING} SWITCH TO {TABLA_DATAFRAME}")
+
+def _parametros_dataframe(convertido, fecha_carga, hora_carga, nombre_flujo):
+    # Construye los parámetros del INSERT a partir de las columnas ya validadas
+    columnas = [convertido[nombre].tolist() for nombre in ESQUEMA_DATAFRAME.nombres]
+    return columnas_a_parametros(columnas, (nombre_flujo, fecha_carga, hora_carga))
 
 @reco_router.get("/datos-actualizados")
 async def actualizarDatos(
+    request: Request,
     page: int = 1,
-    size: int = 10
+    size: int = 10,
+    # Cursor opaco de next_cursor/prev_cursor; tiene prioridad sobre page
+    cursor: Optional[str] = None,
+    # Con contar=false no se ejecuta el COUNT(*) y los links solo traen « y »
+    contar: bool = True,
+    # "columnar" devuelve data como {columna: [valores]}
+    formato: Optional[str] = Query(None, alias="format")
 ):
+    return await consulta_condicional(
+        request, TABLA_DATAFRAME, _consultar_datos_actualizados, page, size, cursor, contar, formato
+    )
+
+def _consultar_datos_actualizados(page, size, token=None, contar=True, formato=None):
+    instantanea = instantanea_dataframe.vigente()
+    if instantanea is not None:
+        return _datos_actualizados_instantanea(instantanea, page, size, token, contar, formato)
     session = get_db_connection()
     try:
+        datos_cursor = decodificar_cursor(token) if token else None
         with session.cursor() as cursor:
-            # Obtener la última fecha disponible con datos
-            cursor.execute("""
-                SELECT TOP 1 fecha_carga 
-                FROM apl_imperio.APP_SALESFORCE_Dataframe 
-                ORDER BY fecha_carga DESC
-            """)
-            row = cursor.fetchone()
-            if not row:
-                return {"status": 0, "message": "No hay datos disponibles"}
-
-            fecha_consulta = row[0]
-            print("Usando fecha:", fecha_consulta)
-
-            # Query para contar el total de registros
-            cursor.execute("""
-                SELECT COUNT(*) as total 
-                FROM apl_imperio.APP_SALESFORCE_Dataframe 
-                WHERE fecha_carga = ?
-            """, (fecha_consulta,))
-            total = cursor.fetchone()[0]
-
-            # Query paginada
-            offset = (page - 1) * size
-            cursor.execute("""
-                SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe 
-                WHERE fecha_carga = ?
-                ORDER BY id_carga 
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """, (fecha_consulta, offset, size))
-
-            resultados = cursor.fetchall()
-            columnas = [column[0] for column in cursor.description]
-            datos = [dict(zip(columnas, fila)) for fila in resultados]
-
-            total_pages = (total + size - 1) // size
-
-            links = []
-            if page > 1:
-                links.append({"url": f"/datos-actualizados?page={page-1}&size={size}", "label": "«", "active": False})
+            if datos_cursor and datos_cursor.get("f"):
+                # El cursor sigue recorriendo la misma carga aunque haya una nueva
+                fecha_consulta = datos_cursor["f"]
             else:
-                links.append({"url": None, "label": "«", "active": False})
+                # Última fecha disponible con datos; solo cambia cuando se confirma una carga
+                fecha_consulta = leer_cacheado(
+                    TABLA_DATAFRAME, ("ultima_fecha",), lambda: _ultima_fecha_carga(cursor)
+                )
+                if fecha_consulta is None:
+                    return {"status": 0, "message": "No hay datos disponibles"}
+            log.debug("Usando fecha: %s", fecha_consulta)
 
-            for i in range(1, total_pages + 1):
-                links.append({
-                    "url": f"/datos-actualizados?page={i}&size={size}",
-                    "label": str(i),
-                    "active": i == page
-                })
+            # Total de registros de la fecha
+            total = None
+            if contar:
+                total = leer_cacheado(
+                    TABLA_DATAFRAME, ("total", str(fecha_consulta)), lambda: _contar_por_fecha(cursor, fecha_consulta)
+                )
 
-            if page < total_pages:
-                links.append({"url": f"/datos-actualizados?page={page+1}&size={size}", "label": "»", "active": False})
-            else:
-                links.append({"url": None, "label": "»", "active": False})
-
-            return {
-                "status": 1,
-                "fecha": fecha_consulta,
-                "datos": {
-                    "data": datos,
-                    "current_page": page,
-                    "per_page": size,
-                    "total": total,
-                    "links": links
-                }
-            }
+            # Página por id_carga (con cursor) o por OFFSET
+            pagina = consultar_pagina(
+                cursor, "apl_imperio.APP_SALESFORCE_Dataframe", "fecha_carga = ?", (fecha_consulta,),
+                page, size, datos_cursor, fecha_consulta, formato
+            )
+            return _respuesta_pagina(fecha_consulta, pagina, size, total)
 
     except Exception as e:
         return {"status": 0, "error": str(e)}
     finally:
         session.close()
-        
+
+def _datos_actualizados_instantanea(instantanea, page, size, token, contar, formato):
+    # Misma respuesta que la consulta a la base, leyendo la copia en memoria
+    try:
+        datos_cursor = decodificar_cursor(token) if token else None
+        if datos_cursor and datos_cursor.get("f"):
+            fecha_consulta = datos_cursor["f"]
+        else:
+            fecha_consulta = instantanea.ultima_fecha()
+            if fecha_consulta is None:
+                return {"status": 0, "message": "No hay datos disponibles"}
+        total = instantanea.contar(fecha_consulta) if contar else None
+        pagina = instantanea.pagina(fecha_consulta, page, size, datos_cursor, formato)
+        return _respuesta_pagina(fecha_consulta, pagina, size, total)
+    except Exception as e:
+        return {"status": 0, "error": str(e)}
+
+def _respuesta_pagina(fecha_consulta, pagina, size, total):
+    links = armar_links(
+        "/datos-actualizados", pagina["page"], size, total, pagina["next_cursor"], pagina["prev_cursor"]
+    )
+    return {
+        "status": 1,
+        "fecha": fecha_consulta,
+        "datos": {
+            "data": pagina["datos"],
+            "current_page": pagina["page"],
+            "per_page": size,
+            "total": total,
+            "links": links,
+            "next_cursor": pagina["next_cursor"],
+            "prev_cursor": pagina["prev_cursor"]
+        }
+    }
+
+def _ultima_fecha_carga(cursor):
+    cursor.execute("""
+        SELECT TOP 1 fecha_carga 
+        FROM apl_imperio.APP_SALESFORCE_Dataframe 
+        ORDER BY fecha_carga DESC
+    """)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _contar_por_fecha(cursor, fecha_consulta):
+    cursor.execute("""
+        SELECT COUNT(*) as total 
+        FROM apl_imperio.APP_SALESFORCE_Dataframe 
+        WHERE fecha_carga = ?
+    """, (fecha_consulta,))
+    return cursor.fetchone()[0]
+
 @reco_router.get("/datos")
-async def datos(flujos: Optional[List[str]] = Query(None)):
-    print("flujos recibidos:", flujos)
+async def datos(
+    request: Request,
+    flujos: Optional[List[str]] = Query(None),
+    # "ndjson" o "stream" transmiten las filas por partes en lugar de armar la lista completa;
+    # "columnar" devuelve datos como {columna: [valores]}
+    formato: Optional[str] = Query(None, alias="format")
+):
+    log.debug("Flujos recibidos: %s", flujos)
     placeholders = ','.join(['?'] * len(flujos))
     fecha_hoy = datetime.today().strftime('%Y-%m-%d') if flujos else ''
+    if formato in FORMATOS_STREAM:
+        query, params = _sql_datos(flujos, placeholders, fecha_hoy)
+        return await stream_condicional(request, TABLA_DATAFRAME, formato, query, params)
+    return await consulta_condicional(request, TABLA_DATAFRAME, _consultar_datos, flujos, placeholders, fecha_hoy, formato)
+
+def _sql_datos(flujos, placeholders, fecha_hoy):
+    if flujos and len(flujos) > 0:
+        query = f"""SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe where fecha_carga = ? AND Flujo IN ({placeholders})"""
+        fecha_hoy = date.today().isoformat()
+        params = [fecha_hoy] + flujos
+    else:
+        query = f"""SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe where fecha_carga = ? """
+        params = [fecha_hoy]
+    return query, params
+
+def _consultar_datos(flujos, placeholders, fecha_hoy, formato=None):
+    instantanea = instantanea_dataframe.vigente() if flujos else None
+    if instantanea is not None:
+        datos, cantidad = instantanea.por_flujos(date.today().isoformat(), flujos, formato)
+        return {"datos": datos} if cantidad else {"flujos": flujos}
     session = get_db_connection()
-    print('Session es', session)
     try:
         with session.cursor() as cursor:
-            if flujos and len(flujos) > 0:
-                query = f"""SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe where fecha_carga = ? AND Flujo IN ({placeholders})"""
-                fecha_hoy = date.today().isoformat()
-                params = [fecha_hoy] + flujos
-                print("params is: ", params)
-            else:
-                query = f"""SELECT * FROM apl_imperio.APP_SALESFORCE_Dataframe where fecha_carga = ? """
-                params = [fecha_hoy]
+            query, params = _sql_datos(flujos, placeholders, fecha_hoy)
             cursor.execute(query,params)
             resultados = cursor.fetchall()
             columnas = [column[0] for column in cursor.description]  # Obtener los nombres de las columnas
-            datos = [dict(zip(columnas, fila)) for fila in resultados]  # Convertir filas a diccionarios
+            datos = armar_datos(columnas, resultados, formato)  # Filas a diccionarios (o columnas)
             if resultados:
                 return{"datos":datos}
             else:
@@ -316,7 +504,14 @@ async def datos(flujos: Optional[List[str]] = Query(None)):
         session.close()
 
 @reco_router.get("/datos_actualizados/{id_carga}")
-async def actualizarDatos(id_carga:int):
+async def actualizarDatos(id_carga:int, request: Request):
+    return await consulta_condicional(request, TABLA_DATAFRAME, _consultar_por_id_carga, id_carga)
+
+def _consultar_por_id_carga(id_carga):
+    instantanea = instantanea_dataframe.vigente()
+    if instantanea is not None:
+        datos, cantidad = instantanea.por_id(datetime.today().strftime('%Y-%m-%d'), id_carga)
+        return {"status": 1, "datos": datos} if cantidad else {"status": 0, "message": "No hay datos"}
     session = get_db_connection()
     try:
         with session.cursor() as cursor:
@@ -330,7 +525,7 @@ async def actualizarDatos(id_carga:int):
             else:
                 return{"status":0,"message":"No hay datos"}
     except Exception as e:
-        print("Entro aqui")
+        log.warning("Error al consultar id_carga %s", id_carga, exc_info=True)
         return{"status":0,"error":str(e)}
     finally:
         session.close()
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from metricas import registro, carga_espera_cola, carga_cola
+
+
+class _Cola:
+    __slots__ = ("tipo", "ocupada", "esperando", "desde")
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.ocupada = False
+        self.esperando = deque()
+        self.desde = time.time()
+
+
+class Planificador:
+    """
+    Turnos de carga por clave, en orden de llegada.
+
+    Las cargas con la misma clave (p. ej. el mismo flujo y RUC de Personal)
+    corren de a una y en el orden en que llegaron; las de claves distintas
+    corren en paralelo. Solo ordena las cargas de este proceso.
+
+    Quien tiene el turno debe soltarlo recién cuando su trabajo terminó de
+    verdad, no cuando dejó de esperarlo; si no, la carga siguiente se solapa.
+    """
+
+    def __init__(self):
+        # Solo las claves con una carga en curso o en espera
+        self._colas = {}
+        # Por tipo de carga: turnos dados, espera total y máxima
+        self._esperas = {}
+
+    def ocupada(self, clave):
+        """Si una carga nueva con esta clave tendría que esperar."""
+        cola = self._colas.get(clave)
+        return cola is not None and (cola.ocupada or bool(cola.esperando))
+
+    @asynccontextmanager
+    async def turno(self, clave, tipo=None):
+        """
+        Espera el turno de la clave y lo libera al salir.
+
+        Args:
+            clave: Alcance de la carga; las cargas con la misma clave no se solapan
+            tipo: Tipo de carga, para las métricas
+
+        Yields:
+            float: Segundos de espera en la cola
+        """
+        cola = self._colas.get(clave)
+        if cola is None:
+            cola = self._colas[clave] = _Cola(tipo)
+        inicio = time.perf_counter()
+        if cola.ocupada or cola.esperando:
+            turno = asyncio.get_running_loop().create_future()
+            cola.esperando.append(turno)
+            try:
+                await turno
+            except asyncio.CancelledError:
+                if turno.done() and not turno.cancelled():
+                    # Se canceló justo después de recibir el turno: pasa al siguiente
+                    self._liberar(clave, cola)
+                else:
+                    cola.esperando.remove(turno)
+                    self._descartar_si_vacia(clave, cola)
+                raise
+        cola.ocupada = True
+
+        espera = time.perf_counter() - inicio
+        esperas = self._esperas.setdefault(tipo, {"turnos": 0, "espera_total": 0.0, "espera_maxima": 0.0})
+        esperas["turnos"] += 1
+        esperas["espera_total"] += espera
+        esperas["espera_maxima"] = max(esperas["espera_maxima"], espera)
+        carga_espera_cola.observe(espera, carga=tipo)
+        try:
+            yield espera
+        finally:
+            self._liberar(clave, cola)
+
+    def _liberar(self, clave, cola):
+        # El turno pasa directo al siguiente, así nadie que llegue después se adelanta
+        while cola.esperando:
+            siguiente = cola.esperando.popleft()
+            if not siguiente.done():
+                siguiente.set_result(None)
+                return
+        cola.ocupada = False
+        self._descartar_si_vacia(clave, cola)
+
+    def _descartar_si_vacia(self, clave, cola):
+        if not cola.ocupada and not cola.esperando and self._colas.get(clave) is cola:
+            del self._colas[clave]
+
+    def stats(self):
+        """Cargas en curso y en espera por clave, y esperas acumuladas por tipo."""
+        colas = [
+            {
+                "clave": list(clave),
+                "tipo": cola.tipo,
+                "en_curso": cola.ocupada,
+                "en_espera": len(cola.esperando),
+                "activa_desde": cola.desde,
+            }
+            for clave, cola in list(self._colas.items())
+        ]
+        esperas = {
+            tipo: {
+                "turnos": datos["turnos"],
+                "espera_promedio_segundos": round(datos["espera_total"] / datos["turnos"], 3),
+                "espera_maxima_segundos": round(datos["espera_maxima"], 3),
+            }
+            for tipo, datos in list(self._esperas.items())
+        }
+        return {
+            "claves_activas": len(colas),
+            "en_curso": sum(cola["en_curso"] for cola in colas),
+            "en_espera": sum(cola["en_espera"] for cola in colas),
+            "colas": colas,
+            "esperas": esperas,
+        }
+
+
+planificador = Planificador()
+
+
+def clave_cola_personal(flujo, ruc):
+    # SQL Server compara Flujo y RUC sin distinguir mayúsculas ni espacios finales
+    return ("personal", str(flujo).rstrip().lower(), str(ruc).rstrip().lower())
+
+
+# Todas las cargas del Dataframe reemplazan la misma tabla
+CLAVE_COLA_DATAFRAME = ("dataframe",)
+
+
+@registro.recolector
+def _recolectar_colas():
+    pendientes = {"dataframe": 0, "personal": 0}
+    for cola in list(planificador._colas.values()):
+        pendientes[cola.tipo] = pendientes.get(cola.tipo, 0) + len(cola.esperando)
+    for tipo, cantidad in pendientes.items():
+        carga_cola.set(cantidad, carga=tipo)
@@ -1,13 +1,63 @@
-from fastapi import File, UploadFile, Form
-import pandas as pd
+from fastapi import File, UploadFile, Form, Request, Query
 from datetime import date, time,datetime
-from io import BytesIO
+from typing import Optional
 import traceback
-from sqlalchemy import text
 from db import get_db_connection
-import re
+from carga_masiva import insertar_en_lotes, columnas_a_parametros, fila_a_dict, ErrorFilaCarga
+from lectura import recibir_archivo, leer_por_bloques, ArchivoRechazado
+from trabajos.registro import despachar_carga
+from deduplicacion import nueva_huella, clave_carga
+from planificador import clave_cola_personal
+from cache import leer_cacheado, invalidar_lecturas
+from versiones import consulta_condicional, incrementar_version
+from respuestas import stream_condicional, FORMATOS_STREAM
+from serializacion import armar_datos
+from paginacion import consultar_pagina, armar_links, decodificar_cursor
+from validacion import Esquema, Columna, AcumuladorErrores, respuesta_validacion, en_hoja
+from bitacora import obtener_logger, Muestreo
+from incremental import (
+    MODO_COMPLETO, MODO_INCREMENTAL, MODOS_CARGA, leer_actuales, calcular_diferencias, aplicar_diferencias
+)
+import os
 from fastapi import APIRouter
 reco_router = APIRouter()
+log = obtener_logger(__name__)
+
+TABLA_PERSONAL = "apl_imperio.APP_SALESFORCE_Personal"
+
+# Columnas del archivo, en el orden del INSERT. max_longitud es el ancho de la columna
+# en APP_SALESFORCE_Personal: si cambia el DDL hay que ajustarlo aquí
+ESQUEMA_PERSONAL = Esquema("Personal", [
+    Columna("PICKUP", max_longitud=50),
+    Columna("TIPO", max_longitud=50),
+    Columna("PLACA", max_longitud=10),
+    Columna("NOMBRES", max_longitud=200),
+    Columna("DOCUMENTO", max_longitud=20),
+    Columna("CARGO", max_longitud=100),
+    Columna("EMPRESA", max_longitud=200),
+    Columna("RUC", max_longitud=11),
+])
+SQL_INSERT_PERSONAL = """
+    INSERT INTO apl_imperio.APP_SALESFORCE_Personal
+    (PICKUP,TIPO,placa, nombre, documento,cargo,empresa,RUC, fecha_carga, hora_carga, flujo)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,?,?)
+"""
+# Columnas de la tabla en el orden del INSERT; la clave natural es documento + placa
+COLUMNAS_PERSONAL = ["PICKUP", "TIPO", "placa", "nombre", "documento", "cargo", "empresa", "RUC",
+                     "fecha_carga", "hora_carga", "flujo"]
+CLAVE_PERSONAL = (4, 2)
+# hora_carga cambia en cada subida: no cuenta como cambio de la fila
+IGNORAR_PERSONAL = (9,)
+SQL_BORRAR_PERSONAL = "DELETE FROM apl_imperio.APP_SALESFORCE_personal WHERE Flujo = ? AND RUC = ? "
+SQL_INSERT_PERSONAL_TVP = """
+    INSERT INTO apl_imperio.APP_SALESFORCE_Personal
+    (PICKUP,TIPO,placa, nombre, documento,cargo,empresa,RUC, fecha_carga, hora_carga, flujo)
+    SELECT * FROM ?
+"""
+# Tipo de tabla (esquema.tipo) para el modo "tvp"; vacío lo deshabilita
+CARGA_TVP_PERSONAL = os.getenv("CARGA_TVP_PERSONAL")
+
+SQL_PERSONAL_POR_FLUJO = """SELECT * FROM apl_imperio.APP_SALESFORCE_Personal where fecha_carga = ? and flujo = ? """
 
 
 @reco_router.post("/personal_excel")
@@ -16,65 +66,128 @@ async def personal_excel(
     fecha_carga: date = Form(...),
     hora_carga: time = Form(...),
     flujo: str = Form(...),
-    ruc: str = Form(...)
+    ruc: str = Form(...),
+    # Si es True responde con el id del trabajo y la carga sigue en segundo plano
+    asincrono: bool = Form(False),
+    # "incremental" compara con lo cargado para el flujo y RUC y solo escribe lo que cambió
+    modo_carga: str = Form(MODO_COMPLETO),
+    # Si es True carga todas las hojas del .xlsx (leídas en paralelo), no solo la primera
+    todas_las_hojas: bool = Form(False)
 ):
-    contents = await file.read()
-    df = pd.read_excel(BytesIO(contents))
-    # Verificación de columnas vacías
-    empty_data = {}
-    for column in df.columns:
-        empty_rows = df[df[column].isnull()].index.tolist()
-        if empty_rows:
-            empty_data[column] = [i + 2 for i in empty_rows]
+    if modo_carga not in MODOS_CARGA:
+        return {"status": 0, "message": f"modo_carga debe ser uno de: {', '.join(MODOS_CARGA)}"}
+    huella = nueva_huella()
+    try:
+        ruta, formato = await recibir_archivo(file, huella=huella)
+    except ArchivoRechazado as e:
+        return {"status": 0, "message": str(e)}
+    # Una subida repetida (mismo archivo y formulario) devuelve el resultado de la primera
+    clave = clave_carga(
+        "personal", huella, flujo=flujo, ruc=ruc, fecha_carga=fecha_carga, modo_carga=modo_carga,
+        todas_las_hojas=todas_las_hojas
+    )
 
-    if empty_data:
-        return {
-            "status": 0,
-            "message": "El archivo contiene campos vacíos en las siguientes columnas:",
-            "empty_columns": list(empty_data.keys()),
-            "empty_cells": empty_data
-        }
+    # El temporal lo borra el trabajo al terminar
+    return await despachar_carga(
+        "personal", ruta, _cargar_personal, fecha_carga, hora_carga, flujo, ruc, formato, modo_carga, todas_las_hojas,
+        asincrono=asincrono, deduplicar=(f"personal:{flujo}:{ruc}", clave),
+        cola=clave_cola_personal(flujo, ruc)
+    )
+
+def _cargar_personal(ruta, fecha_carga, hora_carga, flujo, ruc, formato=None, modo_carga=MODO_COMPLETO,
+                     todas_las_hojas=False, progreso=None):
     session = get_db_connection()
     errores = []
+    errores_validacion = AcumuladorErrores()
+    # Los mensajes por bloque y por lote se registran muestreados (LOG_MUESTREO_FILAS)
+    muestreo = Muestreo(log)
+    # En modo incremental se junta todo el archivo y se escribe solo la diferencia al final
+    incremental = modo_carga == MODO_INCREMENTAL
+    nuevas = []
+    filas_archivo = []
+    diferencias = None
     try:
         cursor = session.cursor()
-        # Eliminar anterior de flujo
-        cursor.execute("DELETE FROM apl_imperio.APP_SALESFORCE_personal WHERE Flujo = ? AND RUC = ? ",(flujo,ruc))
-        # Insertar cada fila del DataFrame
-        for index, row in df.iterrows():
+        if not incremental:
+            # Eliminar anterior de flujo
+            cursor.execute(SQL_BORRAR_PERSONAL,(flujo,ruc))
+        if progreso:
+            progreso.etapa("cargando")
+        # Leer, validar e insertar el archivo por bloques
+        hoja_anterior = None
+        for numero_bloque, df in enumerate(leer_por_bloques(ruta, formato, todas_las_hojas=todas_las_hojas)):
+            # Cada hoja trae su propio encabezado
+            hoja = df.attrs.get("hoja")
+            if numero_bloque == 0 or hoja != hoja_anterior:
+                hoja_anterior = hoja
+                _, faltantes = ESQUEMA_PERSONAL.resolver_encabezados(df.columns)
+                if faltantes:
+                    errores_validacion.agregar(en_hoja(faltantes, hoja))
+                    break
+
+            muestreo.debug("bloque", "Bloque %d: %d filas", numero_bloque + 1, len(df), extra={"hoja": hoja})
+            convertido, errores_bloque = ESQUEMA_PERSONAL.validar(df)
+            errores_validacion.agregar(en_hoja(errores_bloque, hoja))
+            if errores_bloque:
+                muestreo.warning(
+                    "validacion", "Bloque %d con %d errores de validación", numero_bloque + 1, len(errores_bloque),
+                    extra={"hoja": hoja}
+                )
+            if progreso:
+                progreso.sumar_filas(len(df))
+            # Con errores ya no se inserta, solo se siguen revisando los bloques
+            if errores_validacion:
+                continue
+
             try:
-                print("Ingreso aqui")
-                valores = (
-                    row['PICKUP'], row['TIPO'], row['PLACA'], row['NOMBRES'], row['DOCUMENTO'],row['CARGO'],
-                    row['EMPRESA'], row['RUC'],fecha_carga, hora_carga, flujo
+                columnas = [convertido[nombre].tolist() for nombre in ESQUEMA_PERSONAL.nombres]
+                parametros = columnas_a_parametros(columnas, (fecha_carga, hora_carga, flujo))
+                if incremental:
+                    nuevas.extend(parametros)
+                    filas_archivo.extend((int(index) + 2, hoja) for index in df.index)
+                    continue
+                insertar_en_lotes(
+                    cursor, SQL_INSERT_PERSONAL, parametros,
+                    sql_tvp=SQL_INSERT_PERSONAL_TVP, tipo_tvp=CARGA_TVP_PERSONAL, muestreo=muestreo
                 )
-                cursor.execute("""
-                    INSERT INTO apl_imperio.APP_SALESFORCE_Personal
-                    (PICKUP,TIPO,placa, nombre, documento,cargo,empresa,RUC, fecha_carga, hora_carga, flujo)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,?,?)
-                """, valores)
-            except Exception as e:
+            except ErrorFilaCarga as e:
+                row = fila_a_dict(df.iloc[e.posicion])
+                index = int(df.index[e.posicion])
                 mensaje_error = str(e)
-                columna_error, valor_error = identificar_columna_y_valor_error(mensaje_error, row)
-                errores.append({
+                columna_error, valor_error = ESQUEMA_PERSONAL.identificar_error(mensaje_error, row)
+                errores.extend(en_hoja([{
                     "fila": index + 2,
                     "detalle": mensaje_error,
-                    "fila_contenido": row.to_dict(),
+                    "fila_contenido": row,
                     "columna_problematica": columna_error,
                     "valor_problematico": valor_error
-                })
-                print("❌ Error en fila", index + 2, ":", mensaje_error)
+                }], hoja))
+                log.warning("Error en fila %d: %s", index + 2, mensaje_error)
                 raise
+
+        if errores_validacion:
+            session.rollback()
+            return respuesta_validacion(errores_validacion)
+        if incremental:
+            diferencias = _aplicar_incremental(cursor, nuevas, filas_archivo, flujo, ruc, errores, progreso)
         session.commit()
-        return {
+        # Una carga incremental sin cambios deja la tabla igual: los ETag y cachés siguen valiendo
+        if diferencias is None or diferencias.cambios:
+            invalidar_lecturas(TABLA_PERSONAL)
+            incrementar_version(TABLA_PERSONAL)
+        respuesta = {
             "status": 1,
             "message": "Todos los registros fueron insertados correctamente."
         }
+        if diferencias is not None:
+            respuesta["incremental"] = diferencias.resumen()
+        return respuesta
+    except ArchivoRechazado as e:
+        session.rollback()
+        return {"status": 0, "message": str(e)}
     except Exception as e:
         session.rollback()
-        print("❌ Error general:", str(e))
-        print("📛 Traceback:")
-        print(traceback.format_exc())
+        log.exception("Error general en la carga de Personal")
         return {
             "status": 0,
             "message": "❌ Ocurrió un error y no se insertó nada.",
@@ -86,75 +199,59 @@ async def personal_excel(
     finally:
         session.close()
         
-def identificar_columna_y_valor_error(mensaje_error, fila):
-    """
-    Identifica la columna y el valor que están causando el error.
-    
-    Args:
-        mensaje_error: Mensaje de error capturado
-        fila: Fila de datos que estaba siendo procesada cuando ocurrió el error
-        
-    Returns:
-        tuple: (columna_error, valor_error)
-    """
-    # Columnas a verificar y sus valores en la fila
-    columnas = {'PICKUP': fila['PICKUP'], 
-                'TIPO': fila['TIPO'], 
-                'PLACA': fila['PLACA'], 
-                'NOMBRES': fila['NOMBRES'], 
-                'DOCUMENTO': fila['DOCUMENTO'],
-                'CARGO': fila['CARGO'],
-                'EMPRESA': fila['EMPRESA'],
-                'RUC': fila['RUC']}
-    
-    # Intentar extraer el valor problemático del mensaje de error
-    valor_problema = None
-    match = re.search(r"value '([^']+)'", mensaje_error)
-    if match:
-        valor_problema = match.group(1)
-        
-        # Si encontramos el valor problemático, buscamos en qué columna está
-        for columna, valor in columnas.items():
-            # Convertir ambos a string para comparación
-            if str(valor) == valor_problema:
-                return columna, valor_problema
-    
-    # Si no encontramos el valor, buscamos por nombre de columna en el mensaje
-    for columna in columnas.keys():
-        if columna in mensaje_error:
-            return columna, columnas[columna]
-    
-    # Si aún no encontramos, intentamos con otros patrones
-    if "PICKUP" in mensaje_error:
-        return "PICKUP", columnas["PICKUP"]
-    elif "TIPO" in mensaje_error:
-        return "TIPO", columnas["TIPO"]
-    elif "PLACA" in mensaje_error.lower() or "date" in mensaje_error.lower():
-        return "PLACA", columnas["PLACA"]
-    elif "NOMBRES" in mensaje_error:
-        return "NOMBRES", columnas["NOMBRES"]
-    elif "DOCUMENTO" in mensaje_error:
-        return "DOCUMENTO", columnas['DOCUMENTO']
-    elif "CARGO" in mensaje_error:
-        return "CARGO", columnas['CARGO']
-    elif "EMPRESA" in mensaje_error:
-        return "EMPRESA", columnas["EMPRESA"]
-    elif "RUC" in mensaje_error:
-        return "RUC",columnas['RUC']
-    
-    # No se identifica la columna específica
-    return "No identificada", valor_problema if valor_problema else "Desconocido"
+def _aplicar_incremental(cursor, nuevas, filas_archivo, flujo, ruc, errores, progreso):
+    """Escribe solo lo que cambió respecto de lo cargado para el flujo y RUC."""
+    if progreso:
+        progreso.etapa("comparando")
+    actuales = leer_actuales(cursor, TABLA_PERSONAL, COLUMNAS_PERSONAL, "Flujo = ? AND RUC = ?", (flujo, ruc))
+    diferencias = calcular_diferencias(actuales, nuevas, CLAVE_PERSONAL, IGNORAR_PERSONAL)
+    del actuales
+    log.info("Carga incremental de Personal", extra={"flujo": flujo, "ruc": ruc, **diferencias.resumen()})
+
+    if progreso:
+        progreso.etapa("escribiendo")
+    try:
+        aplicar_diferencias(
+            cursor, diferencias, nuevas, TABLA_PERSONAL, COLUMNAS_PERSONAL, SQL_INSERT_PERSONAL,
+            SQL_BORRAR_PERSONAL, (flujo, ruc), sql_tvp=SQL_INSERT_PERSONAL_TVP, tipo_tvp=CARGA_TVP_PERSONAL
+        )
+    except ErrorFilaCarga as e:
+        row = dict(zip(ESQUEMA_PERSONAL.nombres, nuevas[e.posicion]))
+        mensaje_error = str(e)
+        columna_error, valor_error = ESQUEMA_PERSONAL.identificar_error(mensaje_error, row)
+        fila, hoja = filas_archivo[e.posicion]
+        errores.extend(en_hoja([{
+            "fila": fila,
+            "detalle": mensaje_error,
+            "fila_contenido": row,
+            "columna_problematica": columna_error,
+            "valor_problematico": valor_error
+        }], hoja))
+        log.warning("Error en fila %d: %s", fila, mensaje_error)
+        raise
+    return diferencias
 
 @reco_router.get("/datosPersonal/{flujo}")
-async def datos(flujo:str):
+async def datos(
+    flujo:str,
+    request: Request,
+    # "ndjson" o "stream" transmiten las filas por partes en lugar de armar la lista completa;
+    # "columnar" devuelve datos como {columna: [valores]}
+    formato: Optional[str] = Query(None, alias="format")
+):
+    fecha_hoy = datetime.today().strftime('%Y-%m-%d')
+    if formato in FORMATOS_STREAM:
+        return await stream_condicional(request, TABLA_PERSONAL, formato, SQL_PERSONAL_POR_FLUJO, (fecha_hoy, flujo))
+    return await consulta_condicional(request, TABLA_PERSONAL, _consultar_personal, flujo, fecha_hoy, formato)
+
+def _consultar_personal(flujo, fecha_hoy, formato=None):
     session = get_db_connection()
     try:
         with session.cursor() as cursor:
-            fecha_hoy = datetime.today().strftime('%Y-%m-%d')
-            cursor.execute("""SELECT * FROM apl_imperio.APP_SALESFORCE_Personal where fecha_carga = ? and flujo = ? """,(fecha_hoy,flujo))
+            cursor.execute(SQL_PERSONAL_POR_FLUJO,(fecha_hoy,flujo))
             resultados = cursor.fetchall()
             columnas = [column[0] for column in cursor.description]  # Obtener los nombres de las columnas
-            datos = [dict(zip(columnas, fila)) for fila in resultados]  # Convertir filas a diccionarios
+            datos = armar_datos(columnas, resultados, formato)  # Filas a diccionarios (o columnas)
             if resultados:
                 return{"datos":datos}
             else:
@@ -165,102 +262,107 @@ async def datos(flujo:str):
         session.close()
 
 @reco_router.get("/datos_actualizados_personal/{id_carga}/{RUC}")
-async def actualizarDatos(id_carga:int,RUC:str):
+async def actualizarDatos(
+    id_carga:int,
+    RUC:str,
+    request: Request,
+    formato: Optional[str] = Query(None, alias="format")  # "columnar": {columna: [valores]}
+):
+    return await consulta_condicional(request, TABLA_PERSONAL, _consultar_personal_por_id_carga, id_carga, RUC, formato)
+
+def _consultar_personal_por_id_carga(id_carga, RUC, formato=None):
     session = get_db_connection()
     try:
         with session.cursor() as cursor:
-            fecha_hoy = datetime.today().strftime('%Y-%m-%d')
             cursor.execute("""SELECT * FROM apl_imperio.APP_SALESFORCE_Personal where id_carga = ? AND ruc = ?""",(id_carga,RUC))
             resultados = cursor.fetchall()
             columnas = [column[0] for column in cursor.description]  # Obtener los nombres de las columnas
-            datos = [dict(zip(columnas, fila)) for fila in resultados]  # Convertir filas a diccionarios
+            datos = armar_datos(columnas, resultados, formato)  # Filas a diccionarios (o columnas)
             if resultados:
                 return{"status":1,"datos":datos}
             else:
                 return{"status":0,"message":"No hay datos"}
     except Exception as e:
-        print("Entro aqui")
+        log.warning("Error al consultar id_carga %s del RUC %s", id_carga, RUC, exc_info=True)
         return{"status":0,"error":str(e)}
     finally:
         session.close()
         
         
+def _fecha_personal(cursor, RUC, fecha_hoy):
+    #Comprabamos si hoy se subio data
+    cursor.execute("""SELECT TOP 1 1 FROM apl_imperio.APP_SALESFORCE_Personal
+    WHERE fecha_carga = ? AND RUC = ?""",(fecha_hoy,RUC))
+    if cursor.fetchone():
+        return fecha_hoy
+    #Obtenemos la ultima fecha
+    cursor.execute("""SELECT MAX(fecha_carga) AS ultima_fecha FROM apl_imperio.APP_SALESFORCE_Personal WHERE RUC = ?""",(RUC,))
+    return cursor.fetchone()[0]
+
+def _contar_personal(cursor, RUC, fecha):
+    # Query para contar el total de registros
+    cursor.execute("""
+        SELECT COUNT(*) as total FROM apl_imperio.APP_SALESFORCE_Personal 
+        WHERE fecha_carga = ? and RUC = ?
+    """, (fecha,RUC,))
+    return cursor.fetchone()[0]
+
 @reco_router.get("/datos-actualizados-personal/{RUC}")
 async def actualizarDatos(
+    request: Request,
     RUC: str,
     page: int = 1,  # Parámetro de consulta para la página actual
-    size: int = 10  # Parámetro de consulta para elementos por página
+    size: int = 10,  # Parámetro de consulta para elementos por página
+    cursor: Optional[str] = None,  # Cursor opaco de next_cursor/prev_cursor
+    contar: bool = True,  # Con contar=false no se ejecuta el COUNT(*)
+    formato: Optional[str] = Query(None, alias="format")  # "columnar": data como {columna: [valores]}
 ):
+    return await consulta_condicional(
+        request, TABLA_PERSONAL, _consultar_personal_actualizado, RUC, page, size, cursor, contar, formato
+    )
+
+def _consultar_personal_actualizado(RUC, page, size, token=None, contar=True, formato=None):
     session = get_db_connection()
     try:
+        datos_cursor = decodificar_cursor(token) if token else None
         with session.cursor() as cursor:
             fecha_hoy = datetime.today().strftime('%Y-%m-%d')
-            #Comprabamos si hoy se subio data
-            cursor.execute("""SELECT COUNT(*) as cantidad
-            FROM apl_imperio.APP_SALESFORCE_Personal
-            WHERE fecha_carga = ? AND RUC = ?""",(fecha_hoy,RUC))
-            result = cursor.fetchone()[0]
-            if result == 0:
-                #Obtenemos la ultima fecha
-                cursor.execute("""SELECT MAX(fecha_carga) AS ultima_fecha FROM apl_imperio.APP_SALESFORCE_Personal WHERE RUC = ?""",(RUC,))
-                ultima_fecha = cursor.fetchone()[0]
-                fecha_hoy = ultima_fecha
-            # Query para contar el total de registros
-            print("El ruc es",RUC)
-            cursor.execute("""
-                SELECT COUNT(*) as total FROM apl_imperio.APP_SALESFORCE_Personal 
-                WHERE fecha_carga = ? and RUC = ?
-            """, (fecha_hoy,RUC,))
-            total = cursor.fetchone()[0]
-            
-            # Query paginada
-            offset = (page - 1) * size
-            cursor.execute("""
-                SELECT * FROM apl_imperio.APP_SALESFORCE_Personal
-                WHERE fecha_carga = ? and RUC = ?
-                ORDER BY id_carga 
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """, (fecha_hoy,RUC, offset, size))
-            
-            resultados = cursor.fetchall()
-            columnas = [column[0] for column in cursor.description]
-            datos = [dict(zip(columnas, fila)) for fila in resultados]
+            if datos_cursor and datos_cursor.get("f"):
+                # El cursor sigue recorriendo la misma carga aunque haya una nueva
+                fecha_hoy = datos_cursor["f"]
+            else:
+                # Hoy si ya se subió data para el RUC, si no la última fecha con datos
+                fecha_hoy = leer_cacheado(
+                    TABLA_PERSONAL, ("fecha", RUC, fecha_hoy), lambda: _fecha_personal(cursor, RUC, fecha_hoy)
+                )
+            log.debug("Consultando personal del RUC %s", RUC)
+            total = None
+            if contar:
+                total = leer_cacheado(
+                    TABLA_PERSONAL, ("total", RUC, str(fecha_hoy)), lambda: _contar_personal(cursor, RUC, fecha_hoy)
+                )
             
-            # Calcular total de páginas
-            total_pages = (total + size - 1) // size
+            # Página por id_carga (con cursor) o por OFFSET
+            pagina = consultar_pagina(
+                cursor, "apl_imperio.APP_SALESFORCE_Personal", "fecha_carga = ? and RUC = ?", (fecha_hoy, RUC),
+                page, size, datos_cursor, fecha_hoy, formato
+            )
             
             # Crear enlaces de paginación
-            links = []
-            # Agregar enlace para la página anterior
             base_url = f"/datos-actualizados-personal/{RUC}"
-            if page > 1:
-                links.append({ "url": f"{base_url}?page={page - 1}&size={size}", "label": "«", "active": False})
-            else:
-                links.append({"url": None, "label": "«", "active": False})
+            links = armar_links(base_url, pagina["page"], size, total, pagina["next_cursor"], pagina["prev_cursor"])
             
-            # Agregar enlaces para cada página
-            for i in range(1, total_pages + 1):
-                links.append({
-                    "url": f"{base_url}?page={i}&size={size}",
-                    "label": str(i),
-                    "active": i == page
-                })
-            
-            # Agregar enlace para la página siguiente
-            if page < total_pages:
-                links.append({"url": f"{base_url}?page={i}&size={size}", "label": "»", "active": False})
-            else:
-                links.append({"url": None, "label": "»", "active": False})
-            
-            if resultados:
+            if pagina["cantidad"]:
                 return {
                     "status": 1,
                     "datos": {
-                        "data": datos,
-                        "current_page": page,
+                        "data": pagina["datos"],
+                        "current_page": pagina["page"],
                         "per_page": size,
                         "total": total,
-                        "links": links
+                        "links": links,
+                        "next_cursor": pagina["next_cursor"],
+                        "prev_cursor": pagina["prev_cursor"]
                     }
                 }
             else:
@@ -0,0 +1,109 @@
+import os
+from fastapi.responses import StreamingResponse
+from db import get_db_connection
+from ejecutor import run_db
+from versiones import etag_de_request, encabezados_etag
+from serializacion import dumps
+
+# Filas que se piden al driver en cada fetchmany al transmitir una respuesta
+RESPUESTA_TAMANO_LOTE = int(os.getenv("RESPUESTA_TAMANO_LOTE", "1000"))
+
+NDJSON = "ndjson"
+STREAM = "stream"
+FORMATOS_STREAM = (NDJSON, STREAM)
+
+
+def _abrir_consulta(sql, parametros):
+    session = get_db_connection()
+    try:
+        cursor = session.cursor()
+        cursor.execute(sql, parametros)
+        columnas = [column[0] for column in cursor.description]
+        return session, cursor, columnas
+    except Exception:
+        session.close()
+        raise
+
+
+def _cerrar_consulta(session, cursor):
+    try:
+        cursor.close()
+    finally:
+        session.close()
+
+
+async def _lotes(session, cursor, tamano_lote):
+    # La conexión queda prestada mientras dura la transmisión y se devuelve al final,
+    # también si el cliente corta la descarga. Un fetchmany que ya arrancó no se abandona
+    # (escritura=True): si se soltara por tiempo o cancelación, el cierre devolvería al pool
+    # una conexión que su hilo sigue usando
+    try:
+        while True:
+            filas = await run_db(cursor.fetchmany, tamano_lote, escritura=True)
+            if not filas:
+                break
+            yield filas
+    finally:
+        try:
+            await run_db(_cerrar_consulta, session, cursor)
+        except BaseException:
+            # Si la tarea se canceló igual hay que devolver la conexión
+            _cerrar_consulta(session, cursor)
+            raise
+
+
+async def _ndjson(session, cursor, columnas, tamano_lote):
+    try:
+        async for filas in _lotes(session, cursor, tamano_lote):
+            yield b"".join(dumps(dict(zip(columnas, fila))) + b"\n" for fila in filas)
+    except Exception as e:
+        # Los encabezados ya se enviaron: el error va como última línea
+        yield dumps({"status": 0, "error": str(e)}) + b"\n"
+
+
+async def _arreglo_json(session, cursor, columnas, tamano_lote):
+    yield b'{"datos":['
+    separador = b""
+    try:
+        async for filas in _lotes(session, cursor, tamano_lote):
+            bloque = b",".join(dumps(dict(zip(columnas, fila))) for fila in filas)
+            yield separador + bloque
+            separador = b","
+    except Exception as e:
+        # Se cierra el arreglo para que el JSON siga siendo válido e indique el error
+        yield b'],"status":0,"error":' + dumps(str(e)) + b"}"
+        return
+    yield b"]}"
+
+
+async def respuesta_stream(formato, sql, parametros, headers=None, tamano_lote=RESPUESTA_TAMANO_LOTE):
+    """
+    Transmite el resultado de una consulta sin cargarlo completo en memoria.
+
+    La consulta se ejecuta antes de responder, así los errores de SQL llegan como
+    {"status": 0, "error": ...}; después las filas se leen con fetchmany.
+
+    Args:
+        formato: "ndjson" (un objeto por línea) o "stream" ({"datos": [...]} por partes)
+        sql: Consulta parametrizada
+        parametros: Parámetros de la consulta
+        headers: Encabezados extra (p. ej. ETag)
+    """
+    try:
+        session, cursor, columnas = await run_db(_abrir_consulta, sql, parametros)
+    except Exception as e:
+        return {"status": 0, "error": str(e)}
+
+    if formato == NDJSON:
+        contenido, tipo = _ndjson(session, cursor, columnas, tamano_lote), "application/x-ndjson"
+    else:
+        contenido, tipo = _arreglo_json(session, cursor, columnas, tamano_lote), "application/json"
+    return StreamingResponse(contenido, media_type=tipo, headers=headers)
+
+
+async def stream_condicional(request, tabla, formato, sql, parametros):
+    """respuesta_stream con el mismo ETag / 304 que las respuestas normales."""
+    etag, no_modificado = await etag_de_request(request, tabla)
+    if no_modificado is not None:
+        return no_modificado
+    return await respuesta_stream(formato, sql, parametros, headers=encabezados_etag(etag))
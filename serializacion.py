@@ -0,0 +1,56 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - sin orjson se usa json de la librería estándar
+    orjson = None
+
+# Formato de respuesta con los nombres de columna una sola vez: {"col": [valores...]}
+COLUMNAR = "columnar"
+
+
+def a_json(valor):
+    # Mismo resultado que el encoder de FastAPI para los tipos que devuelve pyodbc
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        # Como decimal_encoder de FastAPI: entero solo sin decimales en la escala (Decimal('1.0') -> 1.0)
+        return int(valor) if valor.as_tuple().exponent >= 0 else float(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode(errors="replace")
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def dumps(contenido):
+    """Serializa a bytes JSON; con orjson las fechas y horas se codifican en C."""
+    if orjson is not None:
+        return orjson.dumps(contenido, default=a_json, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(contenido, default=a_json, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def armar_datos(columnas, filas, formato=None):
+    """
+    Convierte las filas de pyodbc al formato de la respuesta.
+
+    Returns:
+        list de dicts (una por fila) o, con formato "columnar", dict columna -> lista
+    """
+    if formato == COLUMNAR:
+        valores = list(zip(*filas)) if filas else [()] * len(columnas)
+        return {columna: list(columna_valores) for columna, columna_valores in zip(columnas, valores)}
+    return [dict(zip(columnas, fila)) for fila in filas]
+
+
+class RespuestaRapida(JSONResponse):
+    """
+    JSONResponse que serializa con orjson.
+
+    Se devuelve directamente desde los endpoints, así FastAPI no pasa el
+    contenido por jsonable_encoder.
+    """
+
+    def render(self, content):
+        return dumps(content)
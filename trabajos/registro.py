@@ -0,0 +1,399 @@
+import asyncio
+import json
+import os
+import time
+import traceback
+import uuid
+from estado_local import conexion_local, registrar_tabla, registrar_columna
+from ejecutor import run_db, run_cpu, DB_TIMEOUT_CARGA, DB_TIMEOUT_LECTURA
+from lectura import borrar_temporal
+from bitacora import obtener_logger, trabajo_en_curso
+from metricas import (
+    carga_bytes, carga_etapa_duracion, carga_filas, carga_filas_por_segundo, cargas_total, cargas_deduplicadas
+)
+from deduplicacion import CARGA_DEDUP_HABILITADA, resultado_confirmado, guardar_confirmada
+from planificador import planificador
+
+# Segundos mínimos entre escrituras de progreso (los cambios de etapa se guardan siempre)
+TRABAJOS_INTERVALO_PROGRESO = float(os.getenv("TRABAJOS_INTERVALO_PROGRESO", "1"))
+# Días que se conservan los trabajos terminados
+TRABAJOS_RETENCION_DIAS = float(os.getenv("TRABAJOS_RETENCION_DIAS", "7"))
+
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+INTERRUMPIDO = "interrumpido"
+
+registrar_tabla("""
+    CREATE TABLE IF NOT EXISTS trabajos (
+        id TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        estado TEXT NOT NULL,
+        etapa TEXT,
+        filas_procesadas INTEGER NOT NULL DEFAULT 0,
+        archivo TEXT,
+        creado REAL NOT NULL,
+        iniciado REAL,
+        actualizado REAL,
+        terminado REAL,
+        resultado TEXT,
+        error TEXT
+    );
+""")
+# Proceso dueño del trabajo ("arranque:pid:inicio"); ver _dueno_actual
+registrar_columna("trabajos", "dueno", "TEXT")
+
+log = obtener_logger(__name__)
+
+# Referencias a las tareas en curso para que el recolector no las descarte
+_tareas = set()
+# Cargas en curso por clave de deduplicación, para que una subida idéntica espere a la primera
+_en_curso = {}
+
+
+class _CargaEnCurso:
+    def __init__(self):
+        bucle = asyncio.get_running_loop()
+        self.id_trabajo = bucle.create_future()
+        # (resultado, excepción): los que se suman a la carga reciben lo mismo que quien la inició
+        self.resultado = bucle.create_future()
+
+
+def _id_arranque():
+    # Cambia en cada arranque de la máquina: ningún dueño de un arranque anterior sigue vivo
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as archivo:
+            return archivo.read().strip()
+    except OSError:
+        return ""
+
+
+def _inicio_proceso(pid):
+    # Momento de inicio según el kernel, para no confundir un PID reutilizado con el dueño
+    try:
+        with open(f"/proc/{pid}/stat") as archivo:
+            return archivo.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+
+
+def _proceso_vivo(pid):
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        # SYNCHRONIZE; WaitForSingleObject devuelve WAIT_TIMEOUT mientras el proceso corre
+        manejador = kernel32.OpenProcess(0x00100000, False, pid)
+        if not manejador:
+            return False
+        try:
+            return kernel32.WaitForSingleObject(manejador, 0) == 0x102
+        finally:
+            kernel32.CloseHandle(manejador)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_duenos = {}
+
+
+def _dueno_actual():
+    # Se calcula por PID: los workers de uvicorn pueden crearse con fork después de importar
+    pid = os.getpid()
+    if pid not in _duenos:
+        _duenos[pid] = f"{_id_arranque()}:{pid}:{_inicio_proceso(pid)}"
+    return _duenos[pid]
+
+
+def _dueno_vivo(dueno):
+    """Si el proceso que registró el trabajo sigue corriendo (en esta máquina y arranque)."""
+    if not dueno:
+        # Trabajos creados antes de registrar el dueño
+        return False
+    arranque, pid, inicio = dueno.split(":")
+    if arranque != _id_arranque() or not _proceso_vivo(int(pid)):
+        return False
+    return not inicio or _inicio_proceso(int(pid)) == inicio
+
+
+def crear_trabajo(tipo, archivo=None):
+    id_trabajo = uuid.uuid4().hex
+    ahora = time.time()
+    with conexion_local() as conexion:
+        conexion.execute(
+            "INSERT INTO trabajos (id, tipo, estado, archivo, creado, actualizado, dueno) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (id_trabajo, tipo, PENDIENTE, archivo, ahora, ahora, _dueno_actual())
+        )
+    return id_trabajo
+
+
+def actualizar_trabajo(id_trabajo, **campos):
+    campos["actualizado"] = time.time()
+    asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+    with conexion_local() as conexion:
+        conexion.execute(f"UPDATE trabajos SET {asignaciones} WHERE id = ?", (*campos.values(), id_trabajo))
+
+
+def obtener_trabajo(id_trabajo):
+    """
+    Devuelve el estado de un trabajo con su velocidad en filas por segundo.
+
+    Returns:
+        dict o None si el trabajo no existe
+    """
+    with conexion_local() as conexion:
+        fila = conexion.execute("SELECT * FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+    if fila is None:
+        return None
+
+    trabajo = dict(fila)
+    trabajo.pop("archivo")
+    trabajo["resultado"] = json.loads(trabajo["resultado"]) if trabajo["resultado"] else None
+    fin = trabajo["terminado"] or (time.time() if trabajo["estado"] == EN_PROCESO else trabajo["actualizado"])
+    duracion = fin - trabajo["iniciado"] if trabajo["iniciado"] else 0
+    trabajo["duracion_segundos"] = round(duracion, 3)
+    trabajo["filas_por_segundo"] = round(trabajo["filas_procesadas"] / duracion, 1) if duracion > 0 else None
+    return trabajo
+
+
+def marcar_interrumpidos():
+    """
+    Al iniciar, los trabajos que quedaron a medias en un proceso que ya no existe
+    se marcan como interrumpidos, se borran sus temporales y se depuran los trabajos viejos.
+
+    El estado local es compartido por todos los workers: los trabajos de un
+    worker que sigue vivo no se tocan.
+    """
+    ahora = time.time()
+    with conexion_local() as conexion:
+        filas = conexion.execute(
+            "SELECT id, archivo, dueno FROM trabajos WHERE estado IN (?, ?)", (PENDIENTE, EN_PROCESO)
+        ).fetchall()
+        filas = [fila for fila in filas if not _dueno_vivo(fila["dueno"])]
+        conexion.executemany(
+            "UPDATE trabajos SET estado = ?, error = ?, terminado = ?, actualizado = ? "
+            "WHERE id = ? AND estado IN (?, ?)",
+            [
+                (INTERRUMPIDO, "El proceso que hacía la carga terminó antes de completarla", ahora, ahora,
+                 fila["id"], PENDIENTE, EN_PROCESO)
+                for fila in filas
+            ]
+        )
+        conexion.execute(
+            "DELETE FROM trabajos WHERE terminado IS NOT NULL AND terminado < ?",
+            (ahora - TRABAJOS_RETENCION_DIAS * 86400,)
+        )
+    for fila in filas:
+        if fila["archivo"]:
+            borrar_temporal(fila["archivo"])
+    if filas:
+        log.warning("Trabajos interrumpidos por el reinicio: %d", len(filas))
+    return len(filas)
+
+
+class Progreso:
+    """
+    Reporta la etapa y las filas procesadas de un trabajo.
+
+    Lo llaman las funciones de carga desde el hilo del executor; las escrituras
+    de filas se espacian cada TRABAJOS_INTERVALO_PROGRESO segundos.
+    """
+
+    def __init__(self, id_trabajo, tipo=None):
+        self.id_trabajo = id_trabajo
+        self.tipo = tipo
+        self.filas = 0
+        self._guardado = 0.0
+        # Lo anterior a la primera etapa (tablas de staging, borrados) cuenta como "preparando"
+        self._etapa = "preparando"
+        self._inicio_etapa = time.perf_counter()
+
+    def cerrar_etapa(self):
+        ahora = time.perf_counter()
+        carga_etapa_duracion.observe(ahora - self._inicio_etapa, carga=self.tipo, etapa=self._etapa)
+        self._inicio_etapa = ahora
+
+    def etapa(self, nombre):
+        self.cerrar_etapa()
+        self._etapa = nombre
+        self._guardado = time.monotonic()
+        actualizar_trabajo(self.id_trabajo, etapa=nombre, filas_procesadas=self.filas)
+
+    def sumar_filas(self, cantidad):
+        self.filas += cantidad
+        if time.monotonic() - self._guardado >= TRABAJOS_INTERVALO_PROGRESO:
+            self._guardado = time.monotonic()
+            actualizar_trabajo(self.id_trabajo, filas_procesadas=self.filas)
+
+
+async def _correr(id_trabajo, tipo, ruta, func, args, timeout, relanzar, cola=None):
+    # Los logs de la carga (también los del hilo del executor) llevan el id del trabajo
+    token = trabajo_en_curso.set(id_trabajo)
+    try:
+        if cola is None:
+            return await _correr_trabajo(id_trabajo, tipo, ruta, func, args, timeout, relanzar)
+        # Las cargas con la misma clave esperan su turno en orden de llegada
+        if planificador.ocupada(cola):
+            log.info("Carga en espera de turno", extra={"tipo": tipo})
+            await run_cpu(actualizar_trabajo, id_trabajo, etapa="en_cola", timeout=DB_TIMEOUT_LECTURA)
+        # El turno se suelta recién cuando el hilo de la carga terminó: run_db(escritura=True)
+        # no vuelve antes, ni por tiempo agotado ni si cancelan a quien espera
+        async with planificador.turno(cola, tipo) as espera:
+            return await _correr_trabajo(id_trabajo, tipo, ruta, func, args, timeout, relanzar, espera)
+    except BaseException:
+        # Si se canceló mientras esperaba turno el temporal todavía existe
+        borrar_temporal(ruta)
+        raise
+    finally:
+        trabajo_en_curso.reset(token)
+
+
+async def _correr_trabajo(id_trabajo, tipo, ruta, func, args, timeout, relanzar, espera_cola=0.0):
+    progreso = Progreso(id_trabajo, tipo)
+    log.info("Carga iniciada", extra={"tipo": tipo, "espera_cola_segundos": round(espera_cola, 3)})
+    await run_cpu(actualizar_trabajo, id_trabajo, estado=EN_PROCESO, iniciado=time.time(), timeout=DB_TIMEOUT_LECTURA)
+    excepcion = None
+    inicio = time.perf_counter()
+    try:
+        # timeout solo limita la espera por un hilo: el temporal se borra cuando la carga terminó de verdad
+        resultado = await run_db(func, ruta, *args, progreso=progreso, timeout=timeout, escritura=True)
+    except Exception as e:
+        log.exception("La carga terminó con una excepción")
+        excepcion = e
+        resultado = {"status": 0, "message": str(e), "trace": traceback.format_exc()}
+    finally:
+        borrar_temporal(ruta)
+    duracion = time.perf_counter() - inicio
+
+    estado = COMPLETADO if resultado.get("status") == 1 else FALLIDO
+    log.info("Carga terminada", extra={
+        "tipo": tipo, "estado": estado, "filas": progreso.filas, "duracion_segundos": round(duracion, 3)
+    })
+    progreso.cerrar_etapa()
+    cargas_total.inc(carga=tipo, resultado=estado)
+    if estado == COMPLETADO:
+        carga_filas.inc(progreso.filas, carga=tipo)
+        if duracion > 0:
+            carga_filas_por_segundo.observe(progreso.filas / duracion, carga=tipo)
+    await run_cpu(
+        actualizar_trabajo, id_trabajo, estado=estado, etapa="terminado", filas_procesadas=progreso.filas,
+        terminado=time.time(), resultado=json.dumps(resultado, default=str),
+        error=None if estado == COMPLETADO else resultado.get("message") or resultado.get("error"),
+        timeout=DB_TIMEOUT_LECTURA
+    )
+    # En modo síncrono el error sigue llegando al cliente como antes (p. ej. 504 por tiempo)
+    if excepcion is not None and relanzar:
+        raise excepcion
+    return resultado
+
+
+def _respuesta_asincrona(id_trabajo):
+    return {
+        "status": 1,
+        "message": "La carga se está procesando.",
+        "job_id": id_trabajo,
+        "estado_url": f"/jobs/{id_trabajo}"
+    }
+
+
+async def _unirse(tipo, en_curso, asincrono):
+    cargas_deduplicadas.inc(carga=tipo, motivo="en_curso")
+    id_trabajo = await asyncio.shield(en_curso.id_trabajo)
+    log.info("Subida idéntica a una carga en curso", extra={"tipo": tipo, "id_trabajo_original": id_trabajo})
+    if asincrono and id_trabajo is not None:
+        return {**_respuesta_asincrona(id_trabajo), "deduplicado": True}
+    resultado, excepcion = await asyncio.shield(en_curso.resultado)
+    if excepcion is not None:
+        raise excepcion
+    return {**resultado, "deduplicado": True}
+
+
+async def _correr_deduplicado(en_curso, deduplicar, id_trabajo, tipo, ruta, func, args, timeout, relanzar, cola):
+    alcance, clave = deduplicar
+    try:
+        resultado = await _correr(id_trabajo, tipo, ruta, func, args, timeout, relanzar, cola)
+    except BaseException as e:
+        en_curso.resultado.set_result((None, e))
+        raise
+    else:
+        if resultado.get("status") == 1:
+            try:
+                await run_cpu(guardar_confirmada, alcance, clave, id_trabajo, resultado, timeout=DB_TIMEOUT_LECTURA)
+            except Exception:
+                log.warning("No se pudo registrar la carga confirmada", exc_info=True)
+        en_curso.resultado.set_result((resultado, None))
+        return resultado
+    finally:
+        if _en_curso.get(clave) is en_curso:
+            del _en_curso[clave]
+
+
+async def despachar_carga(tipo, ruta, func, *args, asincrono=False, timeout=DB_TIMEOUT_CARGA, deduplicar=None,
+                          cola=None):
+    """
+    Registra la carga como trabajo y la ejecuta.
+
+    Args:
+        tipo: Nombre del tipo de carga ("dataframe", "personal")
+        ruta: Temporal con el archivo; se borra al terminar el trabajo
+        func: Función de carga func(ruta, *args, progreso=...)
+        asincrono: Si es True responde enseguida con el id del trabajo
+        deduplicar: (alcance, clave) de la subida. Si la última carga confirmada del
+            alcance fue idéntica se devuelve su resultado, y si hay una idéntica en
+            curso se espera esa en lugar de procesar el archivo otra vez
+        cola: Clave del planificador; las cargas con la misma clave corren de a una,
+            en orden de llegada, y las de claves distintas en paralelo
+
+    Returns:
+        dict: El resultado de la carga, o el id del trabajo si es asíncrona
+    """
+    en_curso = None
+    if deduplicar is not None:
+        alcance, clave = deduplicar
+        try:
+            previo = await run_cpu(resultado_confirmado, alcance, clave, timeout=DB_TIMEOUT_LECTURA)
+        except BaseException:
+            borrar_temporal(ruta)
+            raise
+        if previo is not None:
+            borrar_temporal(ruta)
+            cargas_deduplicadas.inc(carga=tipo, motivo="confirmada")
+            log.info("Subida idéntica a la última carga confirmada", extra={"tipo": tipo, "alcance": alcance})
+            return previo
+        # Sin await entre la búsqueda y el registro, así dos subidas idénticas no arrancan las dos
+        if CARGA_DEDUP_HABILITADA and clave in _en_curso:
+            borrar_temporal(ruta)
+            return await _unirse(tipo, _en_curso[clave], asincrono)
+        en_curso = _en_curso[clave] = _CargaEnCurso()
+
+    try:
+        carga_bytes.observe(os.path.getsize(ruta), carga=tipo)
+        id_trabajo = await run_cpu(crear_trabajo, tipo, ruta, timeout=DB_TIMEOUT_LECTURA)
+    except BaseException as e:
+        borrar_temporal(ruta)
+        if en_curso is not None:
+            en_curso.id_trabajo.set_result(None)
+            en_curso.resultado.set_result((None, e))
+            del _en_curso[clave]
+        raise
+
+    if en_curso is None:
+        if not asincrono:
+            return await _correr(id_trabajo, tipo, ruta, func, args, timeout, True, cola)
+        tarea = asyncio.create_task(_correr(id_trabajo, tipo, ruta, func, args, timeout, False, cola))
+    else:
+        en_curso.id_trabajo.set_result(id_trabajo)
+        tarea = asyncio.create_task(_correr_deduplicado(
+            en_curso, deduplicar, id_trabajo, tipo, ruta, func, args, timeout, not asincrono, cola
+        ))
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+    if not asincrono:
+        # Si se cancela este request la carga sigue para los que la están esperando
+        return await asyncio.shield(tarea)
+    return _respuesta_asincrona(id_trabajo)
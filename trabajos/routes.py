@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from ejecutor import run_cpu, DB_TIMEOUT_LECTURA
+from trabajos.registro import obtener_trabajo
+
+trab_router = APIRouter()
+
+@trab_router.get("/{id_trabajo}")
+async def estado_trabajo(id_trabajo: str):
+    trabajo = await run_cpu(obtener_trabajo, id_trabajo, timeout=DB_TIMEOUT_LECTURA)
+    if trabajo is None:
+        return {"status": 0, "message": "No existe el trabajo"}
+    return {"status": 1, "trabajo": trabajo}
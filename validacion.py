@@ -0,0 +1,263 @@
+import os
+import re
+import warnings
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+# Máximo de errores que se devuelven en la respuesta (se informa el total igual)
+VALIDACION_MAX_ERRORES = int(os.getenv("VALIDACION_MAX_ERRORES", "1000"))
+
+# Textos que en las plantillas significan "sin valor"
+VALORES_VACIOS = ("", "-", "'-", "nan", "None")
+
+
+@dataclass(frozen=True)
+class Columna:
+    """
+    Regla de validación de una columna del archivo.
+
+    Args:
+        nombre: Encabezado esperado en el archivo
+        tipo: "texto", "entero" o "fecha"
+        requerido: Si la celda vacía es un error
+        max_longitud: Largo máximo del texto (None = sin límite)
+        similitud: Umbral para aceptar un encabezado parecido (p. ej. "Citas" por "Cita")
+        vacios: Textos que se consideran celda vacía
+    """
+    nombre: str
+    tipo: str = "texto"
+    requerido: bool = True
+    max_longitud: Optional[int] = None
+    similitud: Optional[float] = None
+    vacios: tuple = ()
+
+
+def _error(filas, columna, valores, detalle):
+    return [
+        {"fila": int(fila), "columna": columna, "valor": _nativo(valor), "detalle": detalle}
+        for fila, valor in zip(filas, valores)
+    ]
+
+
+def _nativo(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+def _a_texto(serie):
+    # Los números enteros que Excel guarda como 123.0 se escriben como "123"
+    texto = serie.astype(str).str.strip()
+    flotantes = serie.map(lambda valor: isinstance(valor, float))
+    if flotantes.any():
+        texto = texto.where(~flotantes, texto.str.replace(r"\.0$", "", regex=True))
+    return texto
+
+
+def _a_fechas(serie):
+    with warnings.catch_warnings():
+        # pandas avisa cuando no puede inferir un formato único; se resuelve abajo
+        warnings.simplefilter("ignore", UserWarning)
+        fechas = pd.to_datetime(serie, errors="coerce", dayfirst=True)
+        # Si el formato inferido no sirve para todas, se reintenta celda por celda
+        pendientes = serie.notna() & fechas.isna()
+        if pendientes.any():
+            fechas = fechas.where(~pendientes, pd.to_datetime(serie[pendientes], errors="coerce",
+                                                             dayfirst=True, format="mixed"))
+    return fechas
+
+
+class Esquema:
+    """
+    Esquema declarativo de un tipo de carga.
+
+    La validación se hace columna por columna con operaciones de pandas y
+    devuelve todas las celdas con error, no solo la primera.
+    """
+
+    def __init__(self, nombre, columnas):
+        self.nombre = nombre
+        self.columnas = list(columnas)
+
+    @property
+    def nombres(self):
+        return [columna.nombre for columna in self.columnas]
+
+    def resolver_encabezados(self, encabezados):
+        """
+        Empareja los encabezados del archivo con las columnas del esquema.
+
+        Returns:
+            tuple: (renombres {encabezado: nombre}, errores por columnas faltantes)
+        """
+        renombres = {}
+        errores = []
+        encabezados = [encabezado for encabezado in encabezados if isinstance(encabezado, str)]
+        for columna in self.columnas:
+            if columna.nombre in encabezados:
+                continue
+            similar = None
+            if columna.similitud:
+                for encabezado in encabezados:
+                    if SequenceMatcher(None, columna.nombre, encabezado).ratio() >= columna.similitud:
+                        similar = encabezado
+                        break
+            if similar is not None:
+                renombres[similar] = columna.nombre
+            elif columna.requerido:
+                errores.append({"fila": 1, "columna": columna.nombre, "valor": None,
+                                "detalle": "No se encontró la columna en el archivo"})
+        return renombres, errores
+
+    def validar(self, df):
+        """
+        Valida y convierte un bloque del archivo.
+
+        Args:
+            df: Bloque con índice = fila de Excel - 2 y encabezados ya resueltos
+
+        Returns:
+            tuple: (DataFrame con las columnas del esquema convertidas, lista de errores)
+        """
+        convertido = pd.DataFrame(index=df.index)
+        errores = []
+        filas_excel = df.index.to_numpy() + 2
+
+        for columna in self.columnas:
+            if columna.nombre not in df.columns:
+                convertido[columna.nombre] = None
+                continue
+            original = df[columna.nombre]
+            texto = _a_texto(original)
+            vacio = original.isna() | texto.eq("") | texto.isin(columna.vacios)
+
+            if columna.requerido and vacio.any():
+                errores += _error(filas_excel[vacio.to_numpy()], columna.nombre, original[vacio], "Campo vacío")
+
+            if columna.tipo == "entero":
+                numero = pd.to_numeric(texto.where(~vacio), errors="coerce")
+                invalido = ~vacio & (numero.isna() | np.isinf(numero))
+                valores = np.trunc(numero).astype(object).where(numero.notna() & ~invalido, None)
+            elif columna.tipo == "fecha":
+                fechas = _a_fechas(original.where(~vacio))
+                invalido = ~vacio & fechas.isna()
+                valores = fechas.dt.date.astype(object).where(fechas.notna(), None)
+            else:
+                invalido = pd.Series(False, index=df.index)
+                valores = texto.astype(object).where(~vacio, None)
+                if columna.max_longitud:
+                    largo = ~vacio & texto.str.len().gt(columna.max_longitud)
+                    if largo.any():
+                        errores += _error(filas_excel[largo.to_numpy()], columna.nombre, original[largo],
+                                          f"Supera los {columna.max_longitud} caracteres")
+
+            if invalido.any():
+                detalle = "No es un número entero" if columna.tipo == "entero" else "Fecha inválida"
+                errores += _error(filas_excel[invalido.to_numpy()], columna.nombre, original[invalido], detalle)
+
+            if columna.tipo == "entero":
+                valores = valores.map(lambda valor: None if valor is None else int(valor))
+            convertido[columna.nombre] = valores
+
+        errores.sort(key=lambda error: error["fila"])
+        return convertido, errores
+
+    def identificar_error(self, mensaje_error, fila):
+        return identificar_columna_y_valor_error(mensaje_error, fila, self.columnas)
+
+
+def identificar_columna_y_valor_error(mensaje_error, fila, columnas):
+    """
+    Identifica la columna y el valor que están causando el error.
+
+    Args:
+        mensaje_error: Mensaje de error capturado
+        fila: Fila de datos que estaba siendo procesada cuando ocurrió el error
+        columnas: Columnas del esquema de la carga
+
+    Returns:
+        tuple: (columna_error, valor_error)
+    """
+    valores = {columna.nombre: fila.get(columna.nombre) for columna in columnas}
+
+    # Intentar extraer el valor problemático del mensaje de error
+    valor_problema = None
+    match = re.search(r"value '([^']+)'", mensaje_error)
+    if match:
+        valor_problema = match.group(1)
+
+        # Si encontramos el valor problemático, buscamos en qué columna está
+        for columna, valor in valores.items():
+            if str(valor) == valor_problema:
+                return columna, valor_problema
+
+    # Si no encontramos el valor, buscamos por nombre de columna en el mensaje
+    mensaje = mensaje_error.lower()
+    for columna, valor in valores.items():
+        if columna.lower() in mensaje or columna.lower().replace("_", "") in mensaje:
+            return columna, valor
+
+    # Los errores de conversión de fechas no nombran la columna
+    if "fecha" in mensaje or "date" in mensaje:
+        for columna in columnas:
+            if columna.tipo == "fecha":
+                return columna.nombre, valores[columna.nombre]
+
+    # No se identifica la columna específica
+    return "No identificada", valor_problema if valor_problema else "Desconocido"
+
+
+class AcumuladorErrores:
+    """Junta los errores de todos los bloques guardando como máximo VALIDACION_MAX_ERRORES."""
+
+    def __init__(self, maximo=VALIDACION_MAX_ERRORES):
+        self.maximo = maximo
+        self.errores = []
+        self.total = 0
+
+    def __bool__(self):
+        return self.total > 0
+
+    def agregar(self, errores):
+        self.total += len(errores)
+        espacio = self.maximo - len(self.errores)
+        if espacio > 0:
+            self.errores.extend(errores[:espacio])
+
+
+def en_hoja(errores, hoja):
+    """Marca los errores con la hoja del libro cuando la carga lee todas las hojas."""
+    if hoja is not None:
+        for error in errores:
+            error["hoja"] = hoja
+    return errores
+
+
+def respuesta_validacion(acumulador):
+    """
+    Arma la respuesta de una carga rechazada por validación.
+
+    Mantiene empty_columns/empty_cells para los clientes existentes y agrega
+    el detalle de cada celda en errores_validacion.
+    """
+    errores = acumulador.errores
+    vacias = {}
+    for error in errores:
+        if error["detalle"] == "Campo vacío":
+            vacias.setdefault(error["columna"], []).append(error["fila"])
+    if all(error["detalle"] == "Campo vacío" for error in errores):
+        mensaje = "El archivo contiene campos vacíos en las siguientes columnas:"
+    else:
+        mensaje = "El archivo contiene valores inválidos en las siguientes columnas:"
+    return {
+        "status": 0,
+        "message": mensaje,
+        "empty_columns": list(vacias.keys()),
+        "empty_cells": vacias,
+        "invalid_columns": sorted({error["columna"] for error in errores}),
+        "total_errores": acumulador.total,
+        "errores_validacion": errores,
+    }
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+from fastapi import Response
+from estado_local import conexion_local, registrar_tabla
+from ejecutor import run_db, run_cpu, DB_TIMEOUT_LECTURA
+from serializacion import RespuestaRapida
+
+registrar_tabla("""
+    CREATE TABLE IF NOT EXISTS versiones (
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        actualizado REAL NOT NULL
+    );
+""")
+
+
+# Segundos que se reutiliza la versión leída del estado local; es lo que tarda como
+# máximo un worker en ver la carga que confirmó otro (las propias se ven enseguida)
+VERSIONES_TTL_SEGUNDOS = float(os.getenv("VERSIONES_TTL_SEGUNDOS", "1"))
+
+# tabla -> (versión, momento de la lectura)
+_versiones = {}
+_versiones_lock = threading.Lock()
+
+
+def _recordar(tabla, version):
+    with _versiones_lock:
+        anterior = _versiones.get(tabla)
+        # Las versiones solo crecen: una lectura vieja no pisa un incremento propio
+        if anterior is not None and anterior[0] > version:
+            version = anterior[0]
+        _versiones[tabla] = (version, time.monotonic())
+    return version
+
+
+def _en_memoria(tabla):
+    with _versiones_lock:
+        guardada = _versiones.get(tabla)
+    if guardada is not None and time.monotonic() - guardada[1] < VERSIONES_TTL_SEGUNDOS:
+        return guardada[0]
+    return None
+
+
+def version_tabla(tabla):
+    """
+    Versión de carga de la tabla; 0 si nunca se cargó desde este servidor.
+
+    Lee el estado local (SQLite) si la copia en memoria venció, así que desde
+    el event loop hay que usar version_actual.
+    """
+    version = _en_memoria(tabla)
+    if version is not None:
+        return version
+    with conexion_local() as conexion:
+        fila = conexion.execute("SELECT version FROM versiones WHERE tabla = ?", (tabla,)).fetchone()
+    return _recordar(tabla, fila["version"] if fila else 0)
+
+
+async def version_actual(tabla):
+    """version_tabla para el event loop: si hay que leer SQLite se hace en un hilo."""
+    version = _en_memoria(tabla)
+    if version is not None:
+        return version
+    return await run_cpu(version_tabla, tabla, timeout=DB_TIMEOUT_LECTURA)
+
+
+def incrementar_version(tabla):
+    """
+    Las cargas la llaman después del commit. Se guarda en el estado local, así
+    todos los procesos del servidor ven la misma versión.
+    """
+    ahora = time.time()
+    # La versión parte de la hora en milisegundos para no repetir ETags si se borra el estado local
+    with conexion_local() as conexion:
+        conexion.execute("""
+            INSERT INTO versiones (tabla, version, actualizado) VALUES (?, ?, ?)
+            ON CONFLICT (tabla) DO UPDATE SET
+                version = MAX(version + 1, excluded.version), actualizado = excluded.actualizado
+        """, (tabla, int(ahora * 1000), ahora))
+        fila = conexion.execute("SELECT version FROM versiones WHERE tabla = ?", (tabla,)).fetchone()
+    _recordar(tabla, fila["version"])
+
+
+def calcular_etag(version, *partes):
+    """
+    ETag débil a partir de la versión de la tabla, la fecha de hoy y los parámetros.
+
+    La fecha entra porque las consultas filtran por la fecha del día.
+    """
+    huella = json.dumps([date.today().isoformat(), *partes], default=str, sort_keys=True)
+    resumen = hashlib.sha1(huella.encode()).hexdigest()[:16]
+    return f'W/"{version}-{resumen}"'
+
+
+def _coincide(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(",")]
+    # La comparación de If-None-Match es débil: se ignora el prefijo W/
+    return "*" in candidatos or etag.removeprefix("W/") in [c.removeprefix("W/") for c in candidatos]
+
+
+async def etag_de_request(request, tabla):
+    """
+    Calcula el ETag de la consulta y si el cliente ya lo tiene.
+
+    La ruta y los parámetros del request forman parte del ETag.
+
+    Returns:
+        tuple: (etag, respuesta 304 o None)
+    """
+    version = await version_actual(tabla)
+    etag = calcular_etag(version, request.url.path, sorted(request.query_params.multi_items()))
+    if _coincide(request.headers.get("if-none-match"), etag):
+        return etag, Response(status_code=304, headers=encabezados_etag(etag))
+    return etag, None
+
+
+def encabezados_etag(etag):
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+async def consulta_condicional(request, tabla, func, *args):
+    """
+    Responde 304 si el cliente ya tiene la versión actual; si no, ejecuta la consulta.
+
+    Args:
+        request: Request del endpoint (para If-None-Match)
+        tabla: Tabla cuya versión de carga define el ETag
+        func: Consulta síncrona que se ejecuta con run_db
+
+    Returns:
+        RespuestaRapida con el resultado y el ETag, o la respuesta 304
+    """
+    etag, no_modificado = await etag_de_request(request, tabla)
+    if no_modificado is not None:
+        return no_modificado
+
+    resultado = await run_db(func, *args)
+    # Los errores no se etiquetan, así el siguiente sondeo vuelve a consultar
+    if isinstance(resultado, dict) and "error" in resultado:
+        return RespuestaRapida(resultado)
+    return RespuestaRapida(resultado, headers=encabezados_etag(etag))